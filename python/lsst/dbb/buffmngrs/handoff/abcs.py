@@ -23,7 +23,7 @@
 
 import abc
 
-__all__ = ["Command", "Macro"]
+__all__ = ["Command", "Macro", "Transport"]
 
 
 class Command(abc.ABC):
@@ -65,3 +65,204 @@ class Macro(Command):
         """
         for cmd in self.commands:
             cmd.run()
+
+
+class Transport(abc.ABC):
+    """Class representing a method of delivering files to the endpoint site.
+
+    Each operation returns a tuple consisting of the exit status (0 for
+    success, non-zero for failure), the output, the error message and the
+    duration of the operation.
+
+    Operations which are not abstract are optional.  Features relying on
+    them are not available if a transport does not implement them.
+    """
+
+    batch_mode = False
+    """Flag indicating if multiple files can be sent in a single batch.
+    """
+
+    def __str__(self):
+        return type(self).__name__
+
+    @abc.abstractmethod
+    async def prepare_dirs(self, paths):
+        """Create directories on the endpoint site.
+
+        Parameters
+        ----------
+        paths : `list` [`str`]
+            Directories to create, including any missing parents.
+        """
+        pass
+
+    @abc.abstractmethod
+    async def send_batch(self, sources, dest, msg=None):
+        """Send files to a directory on the endpoint site.
+
+        If only some of the files were sent successfully, the operation
+        should succeed and record errors of the remaining files in the
+        message.
+
+        Parameters
+        ----------
+        sources : `list` [`str`]
+            Files to send.
+        dest : `str`
+            Destination directory.
+        msg : `TransferMsg`, optional
+            Message describing the transfer where the transport may record
+            details about individual files.
+        """
+        pass
+
+    @abc.abstractmethod
+    async def commit_batch(self, sources, dest):
+        """Move files between directories on the endpoint site.
+
+        Parameters
+        ----------
+        sources : `list` [`str`]
+            Files to move.
+        dest : `str`
+            Destination directory.
+        """
+        pass
+
+    @abc.abstractmethod
+    async def cleanup(self, root, dirs=None):
+        """Remove empty directories on the endpoint site.
+
+        Parameters
+        ----------
+        root : `str`
+            Directory which subdirectories should be removed if empty.
+        dirs : `list` [`str`], optional
+            Subdirectories of the root to remove, if empty, in the given
+            order.  If None (default), all empty subdirectories are removed.
+        """
+        pass
+
+    async def allocate(self, path, size):
+        """Create a file of a given size on the endpoint site.
+
+        Parameters
+        ----------
+        path : `str`
+            Path to the file.
+        size : `int`
+            Size of the file in bytes.
+        """
+        raise NotImplementedError
+
+    async def send_range(self, src, dst, offset, length):
+        """Send a range of bytes of a file to the endpoint site.
+
+        The bytes are written at the same position in the destination file
+        which must already exist.
+
+        Parameters
+        ----------
+        src : `str`
+            Path to the source file.
+        dst : `str`
+            Path to the destination file on the endpoint site.
+        offset : `int`
+            Position of the first byte to send.
+        length : `int`
+            Number of bytes to send.
+        """
+        raise NotImplementedError
+
+    async def checksums(self, paths, method="blake2"):
+        """Calculate checksums of files on the endpoint site.
+
+        Unlike other operations, the output is a dictionary with checksums
+        keyed by paths.  Files for which checksums could not be calculated
+        are omitted.
+
+        Parameters
+        ----------
+        paths : `list` [`str`]
+            Paths to the files.
+        method : `str`, optional
+            Hashing algorithm to use, see `utils.get_checksum` for supported
+            ones.  Defaults to BLAKE2.
+        """
+        raise NotImplementedError
+
+    async def sizes(self, paths):
+        """Find out sizes of files on the endpoint site.
+
+        The output is a dictionary with sizes keyed by paths.  Files which
+        do not exist are omitted.
+
+        Parameters
+        ----------
+        paths : `list` [`str`]
+            Paths to the files.
+        """
+        raise NotImplementedError
+
+    async def range_checksum(self, path, offset, length, method="blake2"):
+        """Calculate checksum of a range of bytes of a file on the endpoint.
+
+        Unlike other operations, the output is the checksum.
+
+        Parameters
+        ----------
+        path : `str`
+            Path to the file.
+        offset : `int`
+            Position of the first byte of the range.
+        length : `int`
+            Number of bytes in the range.
+        method : `str`, optional
+            Hashing algorithm to use, defaults to BLAKE2.
+        """
+        raise NotImplementedError
+
+    async def inventory(self, dirs):
+        """List files in directories on the endpoint site.
+
+        The output is a dictionary with sizes and modification times of the
+        files keyed by their paths.  Subdirectories are not descended into,
+        missing directories are ignored.
+
+        Parameters
+        ----------
+        dirs : `list` [`str`]
+            Directories to list.
+        """
+        raise NotImplementedError
+
+    async def link(self, pairs):
+        """Create copies of files already present on the endpoint site.
+
+        Each copy is a hard link to the existing file if possible, a copy of
+        it otherwise.  Missing parent directories of the copies are created.
+        The output is a set of paths to the copies which were created (or
+        exist already, if a copy is the existing file itself).
+
+        Parameters
+        ----------
+        pairs : `list` [`tuple` [`str`, `str`]]
+            Paths to the existing files and their copies.
+        """
+        raise NotImplementedError
+
+    def supports(self, name):
+        """Check if an optional operation is implemented.
+
+        Parameters
+        ----------
+        name : `str`
+            Name of the operation.
+
+        Returns
+        -------
+        `bool`
+            True if the transport implements the operation, False otherwise.
+        """
+        impl = getattr(type(self), name, None)
+        return impl is not None and impl is not getattr(Transport, name, None)
@@ -0,0 +1,133 @@
+# This file is part of dbb_buffmngrs_handoff.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Protection against wasting transfer attempts on an unreachable endpoint.
+"""
+
+import logging
+import threading
+import time
+
+
+__all__ = ["CircuitBreaker"]
+
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Circuit breaker guarding transfers to an endpoint site.
+
+    The breaker is closed as long as transfers succeed.  Once the number of
+    consecutive failed transfers reaches the threshold, the breaker opens and
+    transfers should not be attempted.  While it is open, the endpoint can be
+    probed periodically with a cheap operation.  The delay between probes
+    starts at 'backoff' seconds and is multiplied by 'factor' after each
+    failed probe, but never exceeds 'max_backoff' seconds.  The first
+    successful probe closes the breaker.
+
+    Parameters
+    ----------
+    config : `dict`
+        Configuration of the circuit breaker.
+
+    Raises
+    ------
+    ValueError
+        If the settings are inconsistent.
+    """
+
+    def __init__(self, config):
+        settings = {
+            "threshold": 5,
+            "backoff": 30,
+            "max_backoff": 900,
+            "factor": 2,
+        }
+        settings.update(config)
+        if settings["backoff"] > settings["max_backoff"]:
+            msg = "Invalid configuration: backoff exceeds max_backoff."
+            logger.critical(msg)
+            raise ValueError(msg)
+        self.settings = settings
+
+        self.failures = 0
+        self.delay = settings["backoff"]
+        self.next_probe = None
+
+        self._lock = threading.Lock()
+
+    @property
+    def closed(self):
+        """True if transfers are allowed, False otherwise (`bool`).
+        """
+        return self.next_probe is None
+
+    def record(self, success):
+        """Record the outcome of a transfer attempt.
+
+        Parameters
+        ----------
+        success : `bool`
+            True if the transfer succeeded, False otherwise.
+        """
+        with self._lock:
+            if success:
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.closed and self.failures >= self.settings["threshold"]:
+                self.delay = self.settings["backoff"]
+                self.next_probe = time.monotonic() + self.delay
+                logger.warning(f"Circuit breaker opened after {self.failures} "
+                               f"consecutive failure(s), next probe in "
+                               f"{self.delay} sec.")
+
+    def due(self):
+        """Check if the endpoint should be probed.
+
+        Returns
+        -------
+        `bool`
+            True if the breaker is open and the time for the next probe has
+            come, False otherwise.
+        """
+        with self._lock:
+            return not self.closed and time.monotonic() >= self.next_probe
+
+    def probed(self, success):
+        """Record the outcome of a probe.
+
+        Parameters
+        ----------
+        success : `bool`
+            True if the endpoint responded, False otherwise.
+        """
+        with self._lock:
+            if success:
+                self.failures = 0
+                self.next_probe = None
+                logger.info("Circuit breaker closed, endpoint is reachable.")
+                return
+            opts = self.settings
+            self.delay = min(self.delay * opts["factor"], opts["max_backoff"])
+            self.next_probe = time.monotonic() + self.delay
+            logger.warning(f"Endpoint still unreachable, next probe in "
+                           f"{self.delay} sec.")
@@ -0,0 +1,331 @@
+# This file is part of dbb_buffmngrs_handoff.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Columnar in-memory catalog of pending files.
+"""
+
+import logging
+import math
+import queue
+import threading
+from array import array
+from .messages import FileMsg
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+__all__ = ["Catalog"]
+
+
+logger = logging.getLogger(__name__)
+
+
+PENDING = 0
+"""State of a file waiting for a transfer.
+"""
+
+TAKEN = 1
+"""State of a file taken for a transfer.
+"""
+
+
+class Catalog:
+    """Columnar catalog of pending files.
+
+    Instead of keeping a message for every file, the catalog stores their
+    attributes in parallel columns: directories and names are
+    dictionary-encoded, their codes, sizes, modification times, and states
+    are kept in arrays.  Files are taken in batches: each batch holds files
+    from a single directory, the directory with the oldest file first and
+    the oldest files first within the directory, and does not exceed
+    'max_bytes' bytes (unless it consists of a single file).  The order is
+    established for the whole backlog at once when files are taken after new
+    ones were added.  If NumPy is available, the bulk operations are
+    vectorized.
+
+    The catalog can be used in place of a `queue.Queue`.
+
+    Parameters
+    ----------
+    config : `dict`, optional
+        Configuration of the catalog.
+    """
+
+    def __init__(self, config=None):
+        settings = {
+            "max_bytes": None,
+        }
+        settings.update(config or {})
+        self.max_bytes = settings["max_bytes"]
+
+        self._lock = threading.Lock()
+        self._clear()
+
+    def put(self, item, block=True, timeout=None):
+        """Add a file to the catalog.
+
+        Parameters
+        ----------
+        item : `FileMsg`
+            The file to add.
+        block : `bool`, optional
+            Ignored, the catalog is unbounded.
+        timeout : `float`, optional
+            Ignored, the catalog is unbounded.
+        """
+        with self._lock:
+            code = self._codes.get(item.name)
+            if code is None:
+                code = len(self._names)
+                self._codes[item.name] = code
+                self._names.append(item.name)
+            self.name.append(code)
+            code = self._places.get(item.location)
+            if code is None:
+                code = len(self._locations)
+                self._places[item.location] = code
+                self._locations.append(item.location)
+            self.location.append(code)
+            self.size.append(-1 if item.size is None else item.size)
+            self.mtime.append(math.inf if item.timestamp is None
+                              else item.timestamp)
+            self.state.append(PENDING)
+            self.checksum.append(item.checksum)
+            self._pending += 1
+            self._order = None
+
+    def get(self, block=True, timeout=None):
+        """Remove and return the oldest file of the next batch.
+
+        Parameters
+        ----------
+        block : `bool`, optional
+            Ignored, the method never blocks.
+        timeout : `float`, optional
+            Ignored, the method never blocks.
+
+        Raises
+        ------
+        queue.Empty
+            If the catalog is empty.
+        """
+        files = self.take(size=1)
+        if not files:
+            raise queue.Empty
+        return files[0]
+
+    def get_nowait(self):
+        """Remove and return a file without blocking.
+
+        Equivalent to ``get(block=False)``.
+
+        Raises
+        ------
+        queue.Empty
+            If there are no files.
+        """
+        return self.get(block=False)
+
+    def empty(self):
+        """Check if there are no pending files in the catalog.
+
+        Returns
+        -------
+        `bool`
+            True if there are no pending files, False otherwise.
+        """
+        with self._lock:
+            return self._pending == 0
+
+    def qsize(self):
+        """Return the number of pending files in the catalog.
+
+        Returns
+        -------
+        `int`
+            Number of files.
+        """
+        with self._lock:
+            return self._pending
+
+    def total(self):
+        """Return the total size of pending files.
+
+        Returns
+        -------
+        `int`
+            Number of bytes.
+        """
+        with self._lock:
+            if numpy is not None:
+                size = numpy.frombuffer(self.size, dtype=numpy.int64)
+                state = numpy.frombuffer(self.state, dtype=numpy.int8)
+                mask = (state == PENDING) & (size > 0)
+                return int(size[mask].sum())
+            return sum(s for s, st in zip(self.size, self.state)
+                       if st == PENDING and s > 0)
+
+    def take(self, size=10):
+        """Take the next batch of files.
+
+        Parameters
+        ----------
+        size : `int`, optional
+            Maximal number of files in the batch, defaults to 10.
+
+        Returns
+        -------
+        `list` [`FileMsg`]
+            Files from a single directory, empty if there are no pending
+            files.
+        """
+        with self._lock:
+            if self._pending == 0:
+                return []
+            if self._order is None:
+                self._plan()
+            order = self._order
+            start = self._cursor
+            location = self.location[order[start]]
+            end, total = start, 0
+            while end < len(order) and end - start < size:
+                idx = order[end]
+                if self.location[idx] != location:
+                    break
+                total += max(self.size[idx], 0)
+                if self.max_bytes is not None and end > start and \
+                        total > self.max_bytes:
+                    break
+                end += 1
+            rows = order[start:end]
+            self._cursor = end
+            files = [self._message(idx) for idx in rows]
+            for idx in rows:
+                self.state[idx] = TAKEN
+            self._pending -= len(rows)
+            if self._pending == 0:
+                self._clear()
+        return files
+
+    def report(self, prefix=""):
+        """Log the size of the backlog.
+
+        Parameters
+        ----------
+        prefix : `str`, optional
+            Text preceding the statistics in the log message.
+        """
+        count, total = self.qsize(), self.total()
+        logger.info(f"{prefix}{count} file(s) pending "
+                    f"({total / pow(1024, 2):.2f} MB).")
+
+    def _clear(self):
+        """Remove all files from the catalog.
+        """
+        self.location = array("q")
+        self.name = array("q")
+        self.size = array("q")
+        self.mtime = array("d")
+        self.state = array("b")
+        self.checksum = []
+        self._names = []
+        self._codes = {}
+        self._locations = []
+        self._places = {}
+        self._pending = 0
+        self._order = None
+        self._cursor = 0
+
+    def _compact(self):
+        """Drop the files which were already taken.
+        """
+        if self._pending == len(self.state):
+            return
+        if numpy is not None:
+            state = numpy.frombuffer(self.state, dtype=numpy.int8)
+            mask = state == PENDING
+            del state
+            for column in ("location", "name", "size", "mtime", "state"):
+                values = getattr(self, column)
+                kept = numpy.frombuffer(values, dtype=values.typecode)[mask]
+                setattr(self, column, array(values.typecode, kept.tobytes()))
+            self.checksum = [c for c, m in zip(self.checksum, mask) if m]
+            return
+        rows = [i for i, st in enumerate(self.state) if st == PENDING]
+        self.location = array("q", (self.location[i] for i in rows))
+        self.name = array("q", (self.name[i] for i in rows))
+        self.size = array("q", (self.size[i] for i in rows))
+        self.mtime = array("d", (self.mtime[i] for i in rows))
+        self.state = array("b", bytes(len(rows)))
+        self.checksum = [self.checksum[i] for i in rows]
+
+    def _plan(self):
+        """Establish the order in which the pending files will be taken.
+
+        Pending files are grouped by their directories, the groups are
+        ordered by their oldest files, and the files within a group are
+        ordered by age.
+        """
+        self._compact()
+        if numpy is not None:
+            location = numpy.frombuffer(self.location, dtype=numpy.int64)
+            mtime = numpy.frombuffer(self.mtime, dtype=numpy.float64)
+            order = numpy.lexsort((mtime, location))
+            groups = location[order]
+            starts = numpy.flatnonzero(
+                numpy.concatenate(([True], groups[1:] != groups[:-1])))
+            counts = numpy.diff(numpy.append(starts, len(order)))
+            oldest = numpy.repeat(mtime[order][starts], counts)
+            order = order[numpy.argsort(oldest, kind="stable")]
+            self._order = array("q", order.astype(numpy.int64).tobytes())
+        else:
+            groups = {}
+            for idx, loc in enumerate(self.location):
+                groups.setdefault(loc, []).append(idx)
+            for rows in groups.values():
+                rows.sort(key=self.mtime.__getitem__)
+            ordered = sorted(groups.values(), key=lambda r: self.mtime[r[0]])
+            self._order = array("q", (idx for rows in ordered
+                                      for idx in rows))
+        self._cursor = 0
+
+    def _message(self, idx):
+        """Create the message describing a file in the catalog.
+
+        Parameters
+        ----------
+        idx : `int`
+            The index of the file.
+
+        Returns
+        -------
+        `FileMsg`
+            The message describing the file.
+        """
+        location = self._locations[self.location[idx]]
+        size, mtime = self.size[idx], self.mtime[idx]
+        return FileMsg(head=location.head, tail=location.tail,
+                       name=self._names[self.name[idx]],
+                       size=None if size < 0 else size,
+                       timestamp=None if math.isinf(mtime) else mtime,
+                       checksum=self.checksum[idx])
@@ -28,6 +28,7 @@ import yaml
 from sqlalchemy.exc import DBAPIError, SQLAlchemyError
 from .declaratives import Base
 from .manager import Manager
+from .schema import upgrade_schema
 from .utils import setup_db_conn, setup_logging
 from .validation import SCHEMA
 
@@ -104,6 +105,40 @@ def dropdb(filename, validate):
         raise RuntimeError(msg)
 
 
+@cli.command()
+@click.option("--validate/--no-validate", default=False,
+              help="Validate configuration before starting the service.")
+@click.argument("filename", type=click.Path(exists=True))
+def upgradedb(filename, validate):
+    """Add columns and indexes missing in existing database tables.
+    """
+    with open(filename) as f:
+        configuration = yaml.safe_load(f)
+    if validate:
+        schema = yaml.safe_load(SCHEMA)
+        try:
+            jsonschema.validate(instance=configuration, schema=schema)
+        except jsonschema.ValidationError as ex:
+            raise ValueError(f"configuration error: {ex}.")
+        except jsonschema.SchemaError as ex:
+            raise ValueError(f"schema error: {ex}.")
+        return
+
+    config = configuration.get("logging", None)
+    setup_logging(options=config)
+
+    config = configuration["database"]
+    engine = setup_db_conn(config)
+    try:
+        changes = upgrade_schema(engine)
+    except (DBAPIError, SQLAlchemyError) as ex:
+        msg = f"cannot upgrade tables: {ex}"
+        logger.error(msg)
+        raise RuntimeError(msg)
+    if not changes:
+        logger.info("Database schema is up to date.")
+
+
 @cli.command()
 @click.option("--validate/--no-validate", default=False,
               help="Validate configuration before starting the service.")
@@ -0,0 +1,194 @@
+# This file is part of dbb_buffmngrs_handoff.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Adaptive tuning of the transfer settings.
+"""
+
+import collections
+import logging
+import threading
+
+
+__all__ = ["Controller"]
+
+
+logger = logging.getLogger(__name__)
+
+
+class Controller:
+    """Controller adjusting transfer concurrency and batch size.
+
+    The controller follows the additive-increase/multiplicative-decrease
+    (AIMD) scheme.  After each transfer cycle it calculates the aggregate
+    throughput of successful transfers (goodput) and the error rate over
+    a rolling window of recent cycles.  As long as the error rate stays below
+    the threshold and the goodput does not drop, the number of transfer
+    workers and the batch size are increased additively.  If the error rate
+    exceeds the threshold or the goodput drops noticeably, both are decreased
+    multiplicatively and the window starts anew, so the failures which
+    caused the decrease do not cause further ones.  Values never leave the
+    configured bounds.
+
+    Parameters
+    ----------
+    config : `dict`
+        Configuration of the controller.
+    num_threads : `int`, optional
+        Initial number of transfer workers, defaults to 1.
+    chunk_size : `int`, optional
+        Initial batch size, defaults to 1.
+
+    Raises
+    ------
+    ValueError
+        If the bounds are inconsistent.
+    """
+
+    def __init__(self, config, num_threads=1, chunk_size=1):
+        settings = {
+            "min_threads": 1,
+            "max_threads": 4 * max(num_threads, 1),
+            "min_chunk_size": 1,
+            "max_chunk_size": 4 * max(chunk_size, 1),
+            "window": 5,
+            "error_threshold": 0.1,
+            "tolerance": 0.05,
+            "increase": 1,
+            "decrease": 0.5,
+        }
+        settings.update(config)
+        if settings["min_threads"] > settings["max_threads"]:
+            msg = "Invalid configuration: min_threads exceeds max_threads."
+            logger.critical(msg)
+            raise ValueError(msg)
+        if settings["min_chunk_size"] > settings["max_chunk_size"]:
+            msg = "Invalid configuration: min_chunk_size exceeds " \
+                  "max_chunk_size."
+            logger.critical(msg)
+            raise ValueError(msg)
+        self.settings = settings
+
+        self.num_threads = self._clamp(num_threads, "threads")
+        self.chunk_size = self._clamp(chunk_size, "chunk_size")
+
+        self.samples = collections.deque(maxlen=settings["window"])
+        self.goodput = None
+
+        self._lock = threading.Lock()
+        self._current = [0, 0, 0]
+
+    def observe(self, msg):
+        """Record the outcome of a transfer attempt.
+
+        Parameters
+        ----------
+        msg : `TransferMsg`
+            Message describing the transfer attempt.  Successful transfers
+            which sent no data, e.g., of files found on the endpoint site
+            already, are ignored.
+        """
+        if msg.status == 0 and msg.wire_size == 0:
+            return
+        with self._lock:
+            self._current[1] += 1
+            if msg.status == 0:
+                self._current[0] += msg.size or 0
+            else:
+                self._current[2] += 1
+
+    def update(self, duration):
+        """Adjust the settings based on the outcome of the last cycle.
+
+        Parameters
+        ----------
+        duration : `float`
+            Wall-clock duration (in seconds) of the last transfer cycle.
+
+        Returns
+        -------
+        `tuple` [`int`, `int`]
+            Number of transfer workers and batch size to use in the next
+            cycle.
+        """
+        with self._lock:
+            size, attempts, failures = self._current
+            self._current = [0, 0, 0]
+        if attempts == 0:
+            return self.num_threads, self.chunk_size
+        self.samples.append((size, duration, attempts, failures))
+
+        total_size = sum(s[0] for s in self.samples)
+        total_time = sum(s[1] for s in self.samples)
+        total_attempts = sum(s[2] for s in self.samples)
+        total_failures = sum(s[3] for s in self.samples)
+        goodput = total_size / total_time if total_time > 0 else 0.0
+        goodput /= pow(1024, 2)
+        error_rate = total_failures / total_attempts
+
+        opts = self.settings
+        previous = self.goodput
+        if error_rate > opts["error_threshold"]:
+            action = "decrease"
+            reason = f"error rate {error_rate:.2f} above threshold"
+        elif previous is not None and \
+                goodput < previous * (1.0 - opts["tolerance"]):
+            action = "decrease"
+            reason = f"goodput dropped from {previous:.2f} MB/s"
+        else:
+            action = "increase"
+            reason = "no congestion detected"
+        self.goodput = goodput
+
+        threads, chunk = self.num_threads, self.chunk_size
+        if action == "increase":
+            threads += opts["increase"]
+            chunk += opts["increase"]
+        else:
+            threads = int(threads * opts["decrease"])
+            chunk = int(chunk * opts["decrease"])
+            self.samples.clear()
+            self.goodput = None
+        self.num_threads = self._clamp(threads, "threads")
+        self.chunk_size = self._clamp(chunk, "chunk_size")
+
+        logger.info(f"Controller: goodput {goodput:.2f} MB/s, "
+                    f"error rate {error_rate:.2f}, {reason}; "
+                    f"{action} to {self.num_threads} worker(s), "
+                    f"batch size {self.chunk_size}.")
+        return self.num_threads, self.chunk_size
+
+    def _clamp(self, value, name):
+        """Keep a value within the configured bounds.
+
+        Parameters
+        ----------
+        value : `int`
+            The value to clamp.
+        name : `str`
+            Name of the setting, either 'threads' or 'chunk_size'.
+
+        Returns
+        -------
+        `int`
+            The value within the bounds.
+        """
+        lower = self.settings[f"min_{name}"]
+        upper = self.settings[f"max_{name}"]
+        return max(lower, min(upper, int(value)))
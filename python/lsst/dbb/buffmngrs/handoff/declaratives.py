@@ -36,12 +36,28 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
 
-__all__ = ["Base", "Batch", "File"]
+__all__ = ["Base", "Batch", "File", "IN_FLIGHT", "MOVED", "REGISTERED",
+           "TRANSFERRED", "TRANSITIONS"]
 
 
 Base = declarative_base()
 
 
+# States of a file in the pipeline.
+REGISTERED = "registered"
+IN_FLIGHT = "in_flight"
+TRANSFERRED = "transferred"
+MOVED = "moved"
+
+# States from which a file may enter a given state.
+TRANSITIONS = {
+    REGISTERED: {IN_FLIGHT},
+    IN_FLIGHT: {REGISTERED, MOVED},
+    TRANSFERRED: {REGISTERED, IN_FLIGHT},
+    MOVED: {TRANSFERRED},
+}
+
+
 # Association table establishing many-to-many relationship between files and
 # transfer batches.
 association_table = Table(
@@ -58,11 +74,14 @@ class File(Base):
     id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
     relpath = Column(String, nullable=False)
     filename = Column(String, nullable=False)
-    checksum = Column(String, nullable=False)
+    checksum = Column(String, nullable=False, index=True)
     size_bytes = Column(Integer, nullable=False)
     created_on = Column(DateTime, nullable=False)
-    held_on = Column(DateTime, nullable=True)
-    deleted_on = Column(DateTime, nullable=True)
+    held_on = Column(DateTime, nullable=True, index=True)
+    deleted_on = Column(DateTime, nullable=True, index=True)
+    state = Column(String, nullable=False, default=REGISTERED, index=True)
+    duplicate_of = Column(BigInteger().with_variant(Integer, "sqlite"),
+                          ForeignKey("files.id"), nullable=True)
     batches = relationship("Batch",
                            secondary=association_table,
                            back_populates="files")
@@ -80,6 +99,8 @@ class Batch(Base):
     post_start_time = Column(DateTime, nullable=True)
     post_duration = Column(Interval, nullable=True)
     size_bytes = Column(Integer, nullable=True)
+    wire_size_bytes = Column(Integer, nullable=True)
+    compression = Column(String, nullable=True)
     rate_mbytes_per_sec = Column(Numeric, nullable=True)
     status = Column(Integer, nullable=False)
     err_msg = Column(Text, nullable=True)
@@ -52,6 +52,61 @@ class Defaults:
     """Number of transfer threads to run concurrently.
     """
 
+    engine: str = "threads"
+    """Method of running concurrent transfers.
+
+    Supported methods include:
+    * _threads_: each transfer runs in a separate thread,
+    * _asyncio_: all transfers run in a single thread as coroutines of an
+      event loop, `num_threads` sets the number of concurrent transfers.
+    """
+
     expiration_time: int = 86400
     """Time (in sec.) after an empty directories in the buffer will be removed.
     """
+
+    autotune: dict = None
+    """Settings of the controller adjusting the number of transfer threads
+    and the chunk size based on measured transfer rates.
+
+    If None (default), the controller is disabled and the values of
+    `num_threads` and `chunk_size` remain fixed.
+    """
+
+    lanes: list = None
+    """Specifications of transfer lanes for files of different sizes.
+
+    Each lane is described by its name, the maximal size of files (in bytes)
+    it holds, its share of transfer workers, and, optionally, its chunk
+    size.  If None (default), all pending files are kept in a single queue.
+    """
+
+    priority: dict = None
+    """Settings of the scheduler ordering pending files by their priorities.
+
+    If None (default), pending files are transferred in the order they were
+    found.
+    """
+
+    pressure: dict = None
+    """Settings of the monitor of the buffer pressure.
+
+    If None (default), the manager does not react to the file system usage
+    of the buffer and the holding area.
+    """
+
+    budget: dict = None
+    """Limits of the work done in a single cycle.
+
+    It may limit the number of files and bytes found in the buffer during
+    a cycle, the duration of the scan, and the number of files waiting to be
+    registered.  If None (default), each cycle processes all files in the
+    buffer.
+    """
+
+    catalog: dict = None
+    """Settings of the columnar catalog of pending files.
+
+    If None (default), pending files are kept in a queue of messages.  It has
+    no effect if `priority` is set.
+    """
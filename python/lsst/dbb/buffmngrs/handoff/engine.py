@@ -0,0 +1,233 @@
+# This file is part of dbb_buffmngrs_handoff.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Execution engine for shell commands.
+"""
+
+import asyncio
+import datetime
+import errno
+import logging
+import os
+import shlex
+import signal
+import subprocess
+
+
+__all__ = ["execute", "execute_async"]
+
+
+logger = logging.getLogger(__name__)
+
+
+async def execute_async(cmd, timeout=None, stdin=None, callback=None,
+                        stall_timeout=None, progress=None):
+    """Run a shell command asynchronously.
+
+    The command is started in a new process group so that all processes it
+    spawns (e.g. ssh and the transfer tool it runs) are terminated together
+    when the timeout expires.
+
+    If the stall timeout is set, the process group is also terminated when
+    the command makes no progress for that long.  By default, any output of
+    the command counts as a progress.
+
+    Parameters
+    ----------
+    cmd : basestring
+        String representing the command, its options and arguments.
+    timeout : int, optional
+        Time (in seconds) after which the process group executing a bash
+        command will be terminated. If None (default), the command will wait
+        indefinitely for the child process to complete.
+    stdin : int or file object, optional
+        Standard input of the command.  If None (default), the command
+        will read from /dev/null.
+    callback : callable, optional
+        A function called with every chunk of text the command writes to its
+        stderr as soon as it becomes available.
+    stall_timeout : int, optional
+        Time (in seconds) without any progress after which the process group
+        executing the command will be terminated.  If None (default), the
+        progress is not monitored.
+    progress : callable, optional
+        A function without arguments returning a value which changes
+        whenever the command makes a progress, e.g., number of bytes sent.
+        If None (default), the amount of the command output is used.
+
+    Returns
+    -------
+    (int, str, str, datetime.timedelta)
+        Shell command exit status, stdout, stderr, and duration.  If the
+        command was terminated due to the lack of progress, the status is
+        ETIMEDOUT.
+    """
+    logger.debug(f"Executing {cmd}.")
+
+    start = datetime.datetime.now()
+    args = shlex.split(cmd)
+    opts = dict(stdin=subprocess.DEVNULL if stdin is None else stdin,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                start_new_session=True)
+    try:
+        proc = await asyncio.create_subprocess_exec(*args, **opts)
+    except OSError as ex:
+        duration = datetime.datetime.now() - start
+        logger.debug(f"Execution failed: {ex}.")
+        return ex.errno or errno.ENOEXEC, "", str(ex), duration
+
+    received = [0]
+
+    def count(text):
+        received[0] += len(text)
+
+    def notify(text):
+        count(text)
+        if callback is not None:
+            callback(text)
+
+    stdout, stderr = [], []
+    pumps = [_pump(proc.stdout, stdout, count),
+             _pump(proc.stderr, stderr, notify)]
+    watchdog = None
+    if stall_timeout is not None:
+        if progress is None:
+            def progress():
+                return received[0]
+        watchdog = asyncio.ensure_future(_watch(proc, stall_timeout,
+                                                progress))
+    try:
+        await asyncio.wait_for(asyncio.gather(*pumps, proc.wait()), timeout)
+    except asyncio.TimeoutError:
+        _kill(proc)
+        await proc.wait()
+        status = errno.ETIME
+    else:
+        status = errno.EREMOTEIO if proc.returncode != 0 else 0
+    finally:
+        if watchdog is not None and not watchdog.done():
+            watchdog.cancel()
+    if watchdog is not None and watchdog.done() and \
+            not watchdog.cancelled() and watchdog.result():
+        status = errno.ETIMEDOUT
+    stdout, stderr = "".join(stdout), "".join(stderr)
+    end = datetime.datetime.now()
+    duration = end - start
+
+    logger.debug(f"Execution completed in {duration.total_seconds()}: "
+                 f"(status: {status}, output: '{stdout}', error: '{stderr}').")
+    return status, stdout, stderr, duration
+
+
+def execute(cmd, timeout=None):
+    """Run a shell command.
+
+    A blocking counterpart of :func:`execute_async` for callers outside of
+    an event loop.
+
+    Parameters
+    ----------
+    cmd : basestring
+        String representing the command, its options and arguments.
+    timeout : int, optional
+        Time (in seconds) after which the child process executing a bash
+        command will be terminated. If None (default), the command will wait
+        indefinitely for the child process to complete.
+
+    Returns
+    -------
+    (int, str, str, datetime.timedelta)
+        Shell command exit status, stdout, stderr, and duration.
+    """
+    return asyncio.run(execute_async(cmd, timeout=timeout))
+
+
+async def _pump(stream, chunks, callback=None, size=4096):
+    """Read a stream of a child process incrementally.
+
+    Parameters
+    ----------
+    stream : asyncio.StreamReader
+        The stream to read from.
+    chunks : `list`
+        Container where decoded chunks of text will be stored.
+    callback : callable, optional
+        A function called with each chunk of text.
+    size : `int`, optional
+        Maximal number of bytes to read at once, defaults to 4096.
+    """
+    while True:
+        data = await stream.read(size)
+        if not data:
+            break
+        text = data.decode(errors="replace")
+        chunks.append(text)
+        if callback is not None:
+            callback(text)
+
+
+async def _watch(proc, stall_timeout, progress):
+    """Terminate a child process if it makes no progress.
+
+    Parameters
+    ----------
+    proc : asyncio.subprocess.Process
+        The child process.
+    stall_timeout : `float`
+        Time (in seconds) without any progress after which the process will
+        be terminated.
+    progress : callable
+        A function returning a value which changes whenever the process
+        makes a progress.
+
+    Returns
+    -------
+    `bool`
+        True if the process was terminated, False otherwise.
+    """
+    loop = asyncio.get_running_loop()
+    interval = min(stall_timeout, 1.0)
+    last, since = progress(), loop.time()
+    while proc.returncode is None:
+        await asyncio.sleep(interval)
+        value, now = progress(), loop.time()
+        if value != last:
+            last, since = value, now
+        elif now - since >= stall_timeout:
+            logger.warning(f"No progress in {stall_timeout} sec., "
+                           f"terminating process {proc.pid}.")
+            _kill(proc)
+            return True
+    return False
+
+
+def _kill(proc):
+    """Terminate the process group of a child process.
+
+    Parameters
+    ----------
+    proc : asyncio.subprocess.Process
+        The child process.
+    """
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
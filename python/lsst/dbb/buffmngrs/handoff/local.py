@@ -21,16 +21,20 @@
 """Definitions of command that need to be executed on the handoff site.
 """
 
+import errno
+import fnmatch
 import logging
 import os
 import shutil
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from .abcs import Command
 from .messages import FileMsg
+from .utils import copy_file
 
 
-__all__ = ["Finder", "Eraser", "Mover"]
+__all__ = ["Finder", "Eraser", "Mover", "Reaper"]
 
 
 logger = logging.getLogger(__name__)
@@ -39,12 +43,38 @@ logger = logging.getLogger(__name__)
 class Finder(Command):
     """Command finding out all files in the buffer on the handoff site.
 
+    Files which are not settled yet, i.e., may still be being written, are
+    deferred until a later scan.  A file is considered settled when it meets
+    all criteria of the settle policy:
+
+    * its name does not match any of the ignore patterns (e.g. ``*.part``),
+    * it is older than the minimum age,
+    * its size and modification time did not change since the previous scan
+      (if stability is required),
+    * a marker file, named after the file with the marker suffix appended,
+      exists next to it (if markers are used).
+
+    Marker files themselves are never reported.  Deferred files are not
+    reported either so they are neither hashed nor transferred before they
+    are settled.
+
+    A single run may be limited by a budget: the maximal number of files, the
+    maximal number of bytes, and the maximal duration.  The run also stops
+    when the output queue is full.  The next run resumes the scan where the
+    previous one stopped so each file in the buffer is eventually visited.
+
     Parameters
     ----------
     config : dict
         Configuration of the handoff site.
     queue : queue.Queue
         Container where the files found in the given directory will be stored.
+    dirs : queue.Queue, optional
+        Container where empty directories encountered during the scan will
+        be stored.  If None (default), they are not reported.
+    budget : dict, optional
+        Limits of a single run.  If None (default), each run scans the entire
+        buffer (unless the output queue becomes full).
 
     Raises
     ------
@@ -52,7 +82,7 @@ class Finder(Command):
         If buffer is not specified, does not exists, or is not a directory.
     """
 
-    def __init__(self, config, queue):
+    def __init__(self, config, queue, dirs=None, budget=None):
         try:
             path = config["buffer"]
         except KeyError:
@@ -61,32 +91,187 @@ class Finder(Command):
             raise ValueError(f"{path}: directory not found.")
         self.root = path
         self.queue = queue
+        self.dirs = dirs
+
+        settings = {
+            "min_age": 0,
+            "stable": False,
+            "ignore": [],
+            "marker": None,
+        }
+        settings.update(config.get("settle", None) or {})
+        self.min_age = settings["min_age"]
+        self.stable = settings["stable"]
+        self.ignore = list(settings["ignore"])
+        self.marker = settings["marker"]
+
+        settings = {
+            "max_files": None,
+            "max_bytes": None,
+            "max_time": None,
+        }
+        settings.update(budget or {})
+        self.max_files = settings["max_files"]
+        self.max_bytes = settings["max_bytes"]
+        self.max_time = settings["max_time"]
+
+        # Size and modification time of the files seen during the last
+        # complete scan, required to tell if a file is stable.
+        self.observed = {}
+
+        # The position in the buffer where the next run resumes the scan and
+        # the observations made so far during the current scan.
+        self.cursor = None
+        self.current = {}
 
     def run(self):
         """Scan recursively the directory to find all files it contains.
+
+        The scan stops as soon as the budget is exhausted and is resumed by
+        the next run.
+        """
+        if self.queue.full():
+            logger.info("Output queue is full, scan postponed.")
+            return
+        if self.cursor is None:
+            self.cursor = self._walk()
+            self.current = {}
+        start = time.time()
+        files, size, deferred = 0, 0, 0
+        for topdir, name, names in self.cursor:
+            if self._ignored(name, names):
+                continue
+            path = os.path.join(topdir, name)
+            tail = os.path.relpath(path, start=self.root)
+            dirname, basename = os.path.split(tail)
+            try:
+                status = os.stat(path)
+            except FileNotFoundError as ex:
+                logger.error(f"{ex}")
+                continue
+            if not self._settled(path, status, start):
+                deferred += 1
+                continue
+            msg = FileMsg(head=self.root, tail=dirname, name=basename,
+                          size=status.st_size, timestamp=status.st_mtime)
+            self.queue.put(msg)
+
+            files += 1
+            size += status.st_size
+            if self._exhausted(files, size, time.time() - start):
+                logger.info(f"Scan budget exhausted after {files} file(s), "
+                            f"resuming in the next run.")
+                break
+        else:
+            self.cursor = None
+            self.observed = self.current
+            self.current = {}
+        if deferred != 0:
+            logger.debug(f"{deferred} file(s) not settled yet, deferred.")
+
+    def _walk(self):
+        """Walk the buffer and report empty directories along the way.
+
+        Yields
+        ------
+        `tuple` [`str`, `str`, `set` [`str`]]
+            The directory, the name of a file in that directory, and names of
+            all files in the directory.
         """
-        for topdir, _, filenames in os.walk(self.root):
+        for topdir, subdirs, filenames in os.walk(self.root):
+            if self.dirs is not None and topdir != self.root and \
+                    not subdirs and not filenames:
+                self.dirs.put(topdir)
+            names = set(filenames)
             for name in filenames:
-                path = os.path.join(topdir, name)
-                tail = os.path.relpath(path, start=self.root)
-                dirname, basename = os.path.split(tail)
-                try:
-                    status = os.stat(path)
-                except FileNotFoundError as ex:
-                    logger.error(f"{ex}")
-                else:
-                    msg = FileMsg()
-                    msg.head = self.root
-                    msg.tail = dirname
-                    msg.name = basename
-                    msg.size = status.st_size
-                    msg.timestamp = status.st_mtime
-                    self.queue.put(msg)
+                yield topdir, name, names
+
+    def _exhausted(self, files, size, duration):
+        """Check if the budget of the run is exhausted.
+
+        Parameters
+        ----------
+        files : `int`
+            Number of files reported so far.
+        size : `int`
+            Total size (in bytes) of the files reported so far.
+        duration : `float`
+            Time (in seconds) elapsed since the start of the run.
+
+        Returns
+        -------
+        `bool`
+            True if the run should stop, False otherwise.
+        """
+        if self.queue.full():
+            return True
+        if self.max_files is not None and files >= self.max_files:
+            return True
+        if self.max_bytes is not None and size >= self.max_bytes:
+            return True
+        if self.max_time is not None and duration >= self.max_time:
+            return True
+        return False
+
+    def _ignored(self, name, names):
+        """Check if a file should be skipped regardless of its state.
+
+        Parameters
+        ----------
+        name : `str`
+            The name of the file.
+        names : `set` [`str`]
+            Names of all files in the same directory.
+
+        Returns
+        -------
+        `bool`
+            True if the file should be skipped, False otherwise.
+        """
+        if any(fnmatch.fnmatch(name, pattern) for pattern in self.ignore):
+            return True
+        if self.marker is not None:
+            if name.endswith(self.marker):
+                return True
+            if name + self.marker not in names:
+                return True
+        return False
+
+    def _settled(self, path, status, now):
+        """Check if a file is settled.
+
+        Parameters
+        ----------
+        path : `str`
+            The path to the file.
+        status : `os.stat_result`
+            The status of the file.
+        now : `float`
+            Time of the scan.
+
+        Returns
+        -------
+        `bool`
+            True if the file is settled, False otherwise.
+        """
+        if self.stable:
+            current = (status.st_size, status.st_mtime)
+            self.current[path] = current
+            if self.observed.get(path) != current:
+                return False
+        return now - status.st_mtime >= self.min_age
 
 
 class Mover(Command):
     """Command moving files between the buffer and the holding area.
 
+    Files are renamed into the holding area whenever possible.  If the buffer
+    and the holding area reside on different devices, files are copied by
+    a pool of 'move_workers' (defaults to 4) threads, without passing their
+    content through the user space, and removed from the buffer afterwards.
+    Directories known to exist in the holding area are cached so they are
+    not created again for every file.
+
     Parameters
     ----------
     config : dict
@@ -95,6 +280,9 @@ class Mover(Command):
         Input message queue with files to move.
     out : queue.Queue
         Output message queue with files that were moved.
+    dirs : queue.Queue, optional
+        Container where directories in the buffer which files were moved
+        from will be stored.  If None (default), they are not reported.
 
     Raises
     ------
@@ -102,7 +290,7 @@ class Mover(Command):
        If holding area is not specified, does not exist, or is not a directory.
     """
 
-    def __init__(self, config, inp, out):
+    def __init__(self, config, inp, out, dirs=None):
         try:
             path = config["holding"]
         except KeyError:
@@ -117,24 +305,117 @@ class Mover(Command):
         self.inp = inp
         self.out = out
 
+        self.num_workers = config.get("move_workers", 4)
+        self.emptied = dirs
+        self.dirs = set()
+        self.devices = {}
+
     def run(self):
         """Move files from the buffer to the holding area.
         """
-        while not self.inp.empty():
-            msg = self.inp.get(block=False)
-            os.makedirs(os.path.join(self.root, msg.tail), exist_ok=True)
-            src = os.path.join(msg.head, msg.tail, msg.name)
-            dst = os.path.join(self.root, msg.tail, msg.name)
-            logger.debug(f"Moving '{src}' to '{dst}'.")
-            try:
-                shutil.move(src, dst)
-            except OSError as ex:
-                logger.warning(f"Cannot move '{src}': {ex}.")
-                continue
-            else:
-                msg.head = self.root
-                msg.timestamp = datetime.now().timestamp()
-                self.out.put(msg)
+        start = time.time()
+        moved, copied, size = 0, 0, 0
+        sources = set()
+        device = os.stat(self.root).st_dev
+        with ThreadPoolExecutor(max_workers=self.num_workers) as pool:
+            futures = {}
+            while not self.inp.empty():
+                msg = self.inp.get(block=False)
+                src = os.path.join(msg.head, msg.tail, msg.name)
+                dst = os.path.join(self.root, msg.tail, msg.name)
+                logger.debug(f"Moving '{src}' to '{dst}'.")
+                try:
+                    if msg.head not in self.devices:
+                        same = os.stat(msg.head).st_dev == device
+                        self.devices[msg.head] = same
+                    if self.devices[msg.head]:
+                        self._rename(src, dst)
+                    else:
+                        self._makedirs(os.path.dirname(dst))
+                        futures[pool.submit(_copy, src, dst)] = msg
+                        continue
+                except OSError as ex:
+                    if ex.errno != errno.EXDEV:
+                        logger.warning(f"Cannot move '{src}': {ex}.")
+                        continue
+                    futures[pool.submit(_copy, src, dst)] = msg
+                    continue
+                moved += 1
+                self._done(msg)
+                sources.add(os.path.dirname(src))
+
+            for future in as_completed(futures):
+                msg = futures[future]
+                try:
+                    size += future.result()
+                except OSError as ex:
+                    logger.warning(f"Cannot move '{msg.name}': {ex}.")
+                    continue
+                copied += 1
+                src = os.path.join(msg.head, msg.tail, msg.name)
+                sources.add(os.path.dirname(src))
+                self._done(msg)
+
+        # Let the Eraser know which directories in the buffer may be empty
+        # now.
+        if self.emptied is not None:
+            for path in sorted(sources):
+                self.emptied.put(path)
+
+        duration = time.time() - start
+        total = moved + copied
+        if total:
+            rate = total / duration if duration > 0 else float("inf")
+            logger.info(f"Moved {total} file(s) in {duration:.2f} sec. "
+                        f"({rate:.2f} files/sec.), {copied} of them "
+                        f"({size / pow(1024, 2):.2f} MB) copied across "
+                        f"devices.")
+
+    def _done(self, msg):
+        """Report a file moved to the holding area.
+
+        Parameters
+        ----------
+        msg : `FileMsg`
+            Message describing the file.
+        """
+        msg.head = self.root
+        msg.timestamp = datetime.now().timestamp()
+        self.out.put(msg)
+
+    def _rename(self, src, dst):
+        """Rename a file, creating the destination directory if needed.
+
+        Parameters
+        ----------
+        src : `str`
+            Path to the file.
+        dst : `str`
+            Destination path.
+        """
+        path = os.path.dirname(dst)
+        self._makedirs(path)
+        try:
+            os.replace(src, dst)
+        except FileNotFoundError:
+            # The directory might have been removed since it was cached.
+            if not os.path.exists(src):
+                raise
+            self.dirs.discard(path)
+            self._makedirs(path)
+            os.replace(src, dst)
+
+    def _makedirs(self, path):
+        """Create a directory in the holding area, unless it is known to exist.
+
+        Parameters
+        ----------
+        path : `str`
+            The directory to create.
+        """
+        if path not in self.dirs:
+            os.makedirs(path, exist_ok=True)
+            self.dirs.add(path)
 
 
 class Eraser(Command):
@@ -144,6 +425,14 @@ class Eraser(Command):
     the buffer and the command itself, empty directories are removed only if
     they were not modified for a certain period of time.
 
+    If a queue with directories which could have become empty is provided,
+    e.g., by `Finder` and `Mover`, the command keeps track of them and
+    removes them once expired, without scanning the entire buffer.  The
+    parent of a removed directory is tracked as well.  The entire buffer is
+    scanned for empty directories only once per 'sweep_interval' seconds
+    (defaults to 86400), starting with the first run.  Otherwise, it is
+    scanned every time the command runs.
+
     Parameters
     ----------
     config : dict
@@ -151,6 +440,8 @@ class Eraser(Command):
     exp_time : int
         Time (in seconds) that need to pass from the last modification before
         an empty directory can be removed.
+    dirs : queue.Queue, optional
+        Directories in the buffer which could have become empty.
 
     Raises
     ------
@@ -158,7 +449,7 @@ class Eraser(Command):
        If holding area is not specified or it does not exist.
     """
 
-    def __init__(self, config, exp_time=86400):
+    def __init__(self, config, exp_time=86400, dirs=None):
         try:
             path = config["buffer"]
         except KeyError:
@@ -172,9 +463,50 @@ class Eraser(Command):
         self.root = path
         self.exp_time = exp_time
 
+        self.dirs = dirs
+        self.candidates = {}
+        self.sweep_interval = config.get("sweep_interval", 86400)
+        self.last_sweep = None
+
     def run(self):
         """Remove old, empty directories from the buffer.
         """
+        now = time.time()
+        if self.dirs is None or self.last_sweep is None or \
+                now - self.last_sweep >= self.sweep_interval:
+            self.last_sweep = now
+            self._sweep()
+        if self.dirs is None:
+            return
+
+        while not self.dirs.empty():
+            self._track(self.dirs.get(block=False))
+
+        for path, mod_time in list(self.candidates.items()):
+            if now - mod_time <= self.exp_time:
+                continue
+            try:
+                mod_time = os.stat(path).st_mtime
+            except FileNotFoundError:
+                del self.candidates[path]
+                continue
+            if now - mod_time <= self.exp_time:
+                self.candidates[path] = mod_time
+                continue
+            del self.candidates[path]
+            try:
+                os.rmdir(path)
+            except OSError as ex:
+                if ex.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+                    logger.warning(f"Cannot remove '{path}': {ex}")
+            else:
+                logger.debug(f"Directory '{path}' removed successfully.")
+                self._track(os.path.dirname(path))
+        logger.debug(f"Tracking {len(self.candidates)} directories.")
+
+    def _sweep(self):
+        """Remove old, empty directories from the entire buffer.
+        """
         empty_dirs = []
         for topdir, subdirs, _ in os.walk(self.root, topdown=False):
             for name in subdirs:
@@ -195,3 +527,187 @@ class Eraser(Command):
                     logger.warning(f"Cannot remove '{path}': {ex}")
                 else:
                     logger.debug(f"Directory '{path}' removed successfully.")
+            elif self.dirs is not None:
+                self.candidates[path] = mod_time
+
+    def _track(self, path):
+        """Start tracking a directory in the buffer.
+
+        Parameters
+        ----------
+        path : `str`
+            The directory.  It is ignored if it is the buffer itself or lies
+            outside of it.
+        """
+        root, path = os.path.normpath(self.root), os.path.normpath(path)
+        if path == root or os.path.commonpath([root, path]) != root:
+            return
+        try:
+            self.candidates[path] = os.stat(path).st_mtime
+        except FileNotFoundError:
+            self.candidates.pop(path, None)
+
+
+class Reaper(Command):
+    """Command removing files from the holding area.
+
+    The command decides how much data need to be removed from the holding
+    area to keep its file system usage in check.  Once the usage reaches the
+    high watermark, the data need to be removed until the usage drops to the
+    low watermark.  If the command is eager, e.g., when the buffer is under
+    pressure, the removal starts already at the low watermark.  Files are
+    removed in the order defined by the caller, usually the oldest first.
+
+    Parameters
+    ----------
+    config : dict
+        Configuration of the handoff site.
+    inp : queue.Queue
+        Input message queue with files to remove.
+    out : queue.Queue
+        Output message queue with files that were removed.
+
+    Raises
+    ------
+    ValueError
+       If holding area is not specified, does not exist, or the watermarks are
+       inconsistent.
+    """
+
+    def __init__(self, config, inp, out):
+        try:
+            path = config["holding"]
+        except KeyError:
+            msg = "Holding area not specified."
+            logger.critical(msg)
+            raise ValueError(msg)
+        if not os.path.isdir(path):
+            msg = f"{path}: directory not found."
+            logger.critical(msg)
+            raise ValueError(msg)
+        self.root = path
+        self.inp = inp
+        self.out = out
+
+        settings = {
+            "high_watermark": 0.9,
+            "low_watermark": 0.8,
+            "max_age": None,
+            "batch_size": 1000,
+        }
+        settings.update(config.get("reaper", None) or {})
+        if settings["low_watermark"] > settings["high_watermark"]:
+            msg = "Invalid configuration: low_watermark exceeds " \
+                  "high_watermark."
+            logger.critical(msg)
+            raise ValueError(msg)
+        self.high_watermark = settings["high_watermark"]
+        self.low_watermark = settings["low_watermark"]
+        self.max_age = settings["max_age"]
+        self.batch_size = settings["batch_size"]
+        self.evicting = False
+        self.eager = False
+
+    def usage(self):
+        """Find out the usage of the file system of the holding area.
+
+        Returns
+        -------
+        `tuple` [`int`, `int`]
+            Number of used and total bytes.
+        """
+        info = os.statvfs(self.root)
+        total = info.f_blocks * info.f_frsize
+        free = info.f_bavail * info.f_frsize
+        return total - free, total
+
+    def quota(self):
+        """Calculate how much data need to be removed from the holding area.
+
+        Returns
+        -------
+        `int`
+            Number of bytes to remove, 0 if the usage is acceptable.
+        """
+        used, total = self.usage()
+        if total == 0:
+            return 0
+        fraction = used / total
+        high = self.low_watermark if self.eager else self.high_watermark
+        if fraction >= high and not self.evicting:
+            logger.info(f"Holding area usage {fraction:.2%} reached the high "
+                        f"watermark, removing files.")
+            self.evicting = True
+        if self.evicting and fraction <= self.low_watermark:
+            logger.info(f"Holding area usage {fraction:.2%} dropped to the "
+                        f"low watermark.")
+            self.evicting = False
+        if not self.evicting:
+            return 0
+        return max(int(used - self.low_watermark * total), 0)
+
+    def run(self):
+        """Remove files from the holding area.
+        """
+        count = 0
+        while not self.inp.empty():
+            msg = self.inp.get(block=False)
+            path = os.path.join(self.root, msg.tail, msg.name)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                logger.debug(f"File '{path}' already removed.")
+            except OSError as ex:
+                logger.warning(f"Cannot remove '{path}': {ex}.")
+                continue
+            msg.head = self.root
+            msg.timestamp = datetime.now().timestamp()
+            self.out.put(msg)
+            count += 1
+        if count:
+            logger.info(f"Removed {count} file(s) from the holding area.")
+
+
+def _copy(src, dst):
+    """Move a file to a different device.
+
+    The file is copied under a temporary name first which is changed to the
+    final one once the copy is complete, i.e., the copy has the size of the
+    source file.
+
+    Parameters
+    ----------
+    src : `str`
+        Path to the file.
+    dst : `str`
+        Destination path.
+
+    Returns
+    -------
+    `int`
+        Number of bytes copied.
+
+    Raises
+    ------
+    OSError
+        If the file could not be copied completely.
+    """
+    tmp = f"{dst}.part"
+    try:
+        size = os.stat(src).st_size
+        copied = copy_file(src, tmp)
+        written = os.stat(tmp).st_size
+        if copied != size or written != size:
+            raise OSError(errno.EIO, f"incomplete copy ({copied} byte(s) "
+                                     f"copied, {written} written, {size} "
+                                     f"expected)", src)
+        shutil.copystat(src, tmp)
+        os.replace(tmp, dst)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    os.remove(src)
+    return size
@@ -21,20 +21,27 @@
 """DBB handoff manager.
 """
 
+import functools
 import logging
 import os
 import queue
 import time
 from dataclasses import asdict
 from datetime import datetime, timedelta
-from sqlalchemy import tuple_
+from sqlalchemy import and_, exists, tuple_
 from sqlalchemy.exc import DBAPIError, SQLAlchemyError
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import aliased, sessionmaker
 from threading import Thread
-from . import Eraser, Finder, Macro, Mover, Porter, Wiper
-from .declaratives import Batch, File
+from . import Eraser, Finder, Macro, Mover, Porter, Reaper, Wiper
+from .catalog import Catalog
+from .controller import Controller
+from .declaratives import (Batch, File, IN_FLIGHT, MOVED, REGISTERED,
+                           TRANSFERRED, TRANSITIONS)
 from .defaults import Defaults
 from .messages import FileMsg
+from .pressure import Monitor
+from .scheduling import Lanes, Scheduler
+from .schema import check_schema
 from .utils import get_checksum, get_chunk, setup_db_conn
 
 
@@ -55,6 +62,12 @@ class Manager:
     It uses a SQLite database to persists various information about files it
     it transferred (or failed to do so).
 
+    The database also keeps track of the state of each file in the pipeline
+    (registered, in flight, transferred, or moved).  On startup, the queues
+    are rebuilt from these states, so the files known from before do not
+    need to be found and hashed again.  Files which were in flight are first
+    checked against the endpoint site.
+
     Parameters
     ----------
     configuration : `dict`
@@ -65,6 +78,18 @@ class Manager:
         # Set up database connection.
         config = configuration["database"]
         engine = setup_db_conn(config)
+        tables, columns, indexes = check_schema(engine)
+        if tables or columns:
+            missing = tables + [f"{c.table.name}.{c.name}" for c in columns]
+            msg = f"database schema is outdated, missing: " \
+                  f"{', '.join(missing)}; run 'hdfmgr initdb' for missing " \
+                  f"tables or 'hdfmgr upgradedb' for missing columns"
+            logger.critical(msg)
+            raise RuntimeError(msg)
+        if indexes:
+            logger.warning(f"Database schema lacks index(es): "
+                           f"{', '.join(i.name for i in indexes)}; run "
+                           f"'hdfmgr upgradedb' to create them.")
         Session = sessionmaker(bind=engine)
         self.session = Session()
 
@@ -74,53 +99,131 @@ class Manager:
         if config is not None:
             settings.update(config)
         self.num_threads = settings["num_threads"]
+        self.engine = settings["engine"]
         self.pause = settings["pause"]
 
+        # Set up the controller adjusting transfer settings, if requested.
+        self.controller = None
+        config = settings["autotune"]
+        if config is not None:
+            self.controller = Controller(config,
+                                         num_threads=settings["num_threads"],
+                                         chunk_size=settings["chunk_size"])
+            self.num_threads = self.controller.num_threads
+
+        # Set up limits of the work done in a single cycle.  The queue with
+        # files found in the buffer is bounded so the scan stops when it
+        # fills up and resumes in the next cycle.
+        budget = dict(settings["budget"] or {})
+        self.queue_size = budget.pop("queue_size", None)
+
         # Initialize message queues.
-        self.discovered = queue.Queue()
+        self.discovered = queue.Queue(maxsize=self.queue_size or 0)
         self.pending = queue.Queue()
+        factory = queue.Queue
+        config = settings["catalog"]
+        if config is not None:
+            self.pending = Catalog(config)
+            factory = functools.partial(Catalog, config)
+        config = settings["priority"]
+        if config is not None:
+            self.pending = Scheduler(config)
+            factory = functools.partial(Scheduler, config)
+        if settings["lanes"] is not None:
+            self.pending = Lanes(settings["lanes"], factory=factory)
         self.processed = queue.Queue()
         self.completed = queue.Queue()
 
         self.transfers = queue.Queue()
+        self.staged = queue.Queue()
+        self.emptied = queue.Queue()
 
         # Define tasks related to managing the buffer.
         handoff = configuration["handoff"]
-        self.finder = Finder(handoff, self.discovered)
-        mover = Mover(handoff, self.processed, self.completed)
-        eraser = Eraser(handoff, exp_time=settings["expiration_time"])
+        self.buffer = handoff["buffer"]
+        self.finder = Finder(handoff, self.discovered, dirs=self.emptied,
+                             budget=budget)
+        mover = Mover(handoff, self.processed, self.completed,
+                      dirs=self.emptied)
+        eraser = Eraser(handoff, exp_time=settings["expiration_time"],
+                        dirs=self.emptied)
         self.cleaner = Macro()
         self.cleaner.add(mover)
         self.cleaner.add(eraser)
 
+        # Set up the monitor of the buffer pressure, if requested.
+        self.monitor = None
+        config = settings["pressure"]
+        if config is not None:
+            self.monitor = Monitor(config, handoff["buffer"],
+                                   handoff["holding"])
+
+        # Define task removing files from the holding area, if requested.
+        self.expired = queue.Queue()
+        self.reaped = queue.Queue()
+        self.reaper = None
+        if handoff.get("reaper", None) is not None:
+            self.reaper = Reaper(handoff, self.expired, self.reaped)
+
         # Define tasks related to file transfer.
         endpoint = configuration["endpoint"]
         self.porter = Porter(endpoint, self.pending, self.transfers,
                              chunk_size=settings["chunk_size"],
-                             timeout=settings["timeout"])
-        self.wiper = Wiper(endpoint)
+                             timeout=settings["timeout"],
+                             staged=self.staged)
+        if self.controller is not None:
+            self.porter.chunk_size = self.controller.chunk_size
+        self.wiper = Wiper(endpoint, timeout=settings["timeout"],
+                           staged=self.staged)
 
     def run(self):
         """Start the manager.
         """
         logger.info("Starting monitoring the buffer...")
+        startup = time.time()
+        first = True
+
+        # Rebuild the queues from the states of the files recorded in the
+        # database.  If any files are pending, the first scan is skipped to
+        # start transferring them as soon as possible.
+        self._recover()
+        recovered = not self.pending.empty()
+
         while True:
             # Scan source location for files.
             #
             # Note
             # ----
             # Produces file items and enqueues them in the discovery queue.
-            logger.info("Scanning buffer for new files.")
-            start = time.time()
-            self.finder.run()
-            end = time.time()
-            duration = end - start
-            logger.info(f"Scan completed in {duration:.2f} sec., "
-                        f"{self.discovered.qsize()} file(s) found.")
+            #
+            # The scan is postponed if files were recovered.  Otherwise, the
+            # pending files were handed to the Porter in the previous cycle
+            # and the size of the scan is bounded by the discovery queue.
+            if recovered:
+                logger.info(f"{self.pending.qsize()} file(s) recovered, "
+                            f"scan postponed.")
+                recovered = False
+            else:
+                logger.info("Scanning buffer for new files.")
+                start = time.time()
+                self.finder.run()
+                end = time.time()
+                duration = end - start
+                logger.info(f"Scan completed in {duration:.2f} sec., "
+                            f"{self.discovered.qsize()} file(s) found.")
+
+            # Adapt to the current buffer pressure.
+            num_threads = self.num_threads
+            if self.monitor is not None:
+                backlog = self.discovered.qsize() + self.pending.qsize()
+                level = self.monitor.update(backlog)
+                num_threads = self._adapt(level)
 
             # Go to slumber for a given time interval before starting next
-            # scan, if no files were found.
-            if self.discovered.qsize() == 0:
+            # scan, if no files were found and none are waiting for transfer
+            # or to be moved.
+            if self.discovered.qsize() == 0 and self.pending.qsize() == 0 \
+                    and self.transfers.empty() and self.processed.empty():
                 logger.info(f"Next scan in {self.pause} sec.")
                 time.sleep(self.pause)
                 continue
@@ -143,17 +246,33 @@ class Manager:
             # transfer attempts.
             logger.info(f"Transferring files.")
             start = time.time()
-            threads = []
-            for _ in range(self.num_threads):
-                t = Thread(target=self.porter.run)
-                t.start()
-                threads.append(t)
-            for t in threads:
-                t.join()
-            self.wiper.run()
+            if self.porter.ready():
+                if first:
+                    delay = time.time() - startup
+                    logger.info(f"First transfers started {delay:.2f} sec. "
+                                f"after startup.")
+                    first = False
+                self.porter.precheck()
+                self.porter.dedup(self._find_copies)
+                if isinstance(self.pending, Lanes):
+                    self.pending.plan(num_threads)
+                if self.engine == "asyncio":
+                    self.porter.concurrency = num_threads
+                    self.porter.run()
+                else:
+                    threads = []
+                    for _ in range(num_threads):
+                        t = Thread(target=self.porter.run)
+                        t.start()
+                        threads.append(t)
+                    for t in threads:
+                        t.join()
+                self.wiper.run()
             end = time.time()
-            duration = end - start
-            logger.info(f"Transfer attempts completed in {duration:.2f} sec.")
+            elapsed = end - start
+            logger.info(f"Transfer attempts completed in {elapsed:.2f} sec.")
+            if isinstance(self.pending, (Catalog, Lanes, Scheduler)):
+                self.pending.report()
 
             # Create database entries for the transfers made.
             #
@@ -163,6 +282,18 @@ class Manager:
             # the processed queue with file items.
             self._add_transfers(self.transfers, self.processed)
 
+            # Files which are still in flight were not transferred, e.g.,
+            # because the endpoint site was unavailable.  Make them eligible
+            # for transfers in the next cycle.
+            self._release_files()
+
+            # Adjust transfer settings for the next cycle based on the
+            # outcome of the transfer attempts.
+            if self.controller is not None:
+                threads, chunk_size = self.controller.update(elapsed)
+                self.num_threads = threads
+                self.porter.chunk_size = chunk_size
+
             # Move successfully transferred files to the holding area.
             #
             # Note
@@ -178,13 +309,55 @@ class Manager:
             # Consumes file items from the completed queue.
             self._update_files(self.completed)
 
+            # Remove files from the holding area to keep its usage in check.
+            if self.reaper is not None:
+                self._reap_files()
+
             # Go to slumber for a given time interval.
             logger.info(f"Next scan in {self.pause} sec.")
             time.sleep(self.pause)
 
+    def _adapt(self, level):
+        """Adjust the settings to the buffer pressure.
+
+        Under pressure, the number of transfer threads is multiplied by the
+        boost factor (within the bounds of the controller, if any), the
+        pending files are transferred the oldest first, and the files are
+        removed from the holding area eagerly.
+
+        Parameters
+        ----------
+        level : `str`
+            Current pressure level.
+
+        Returns
+        -------
+        `int`
+            Number of transfer threads to use in the current cycle.
+        """
+        pressed = level != "normal"
+        if isinstance(self.pending, (Lanes, Scheduler)):
+            self.pending.set_oldest_first(pressed)
+        if self.reaper is not None:
+            self.reaper.eager = pressed
+        if not pressed:
+            return self.num_threads
+        num_threads = self.num_threads * self.monitor.settings["boost"]
+        if self.controller is not None:
+            opts = self.controller.settings
+            num_threads = max(opts["min_threads"],
+                              min(opts["max_threads"], num_threads))
+        return num_threads
+
     def _add_files(self, inp, out, chunk_size=10):
         """Create database entries for files found in the buffer.
 
+        Files which are already known and did not change (have the same size
+        and modification time) are not hashed again.  Files which are
+        already in flight are skipped and files which were already
+        transferred are passed directly to the queue of files to move to the
+        holding area.
+
         Parameters
         ----------
         inp : queue.Queue
@@ -199,39 +372,64 @@ class Manager:
             items = get_chunk(inp, size=chunk_size)
 
             files = []
+            queued, delivered, ids = [], [], []
             for item in items:
-                path = os.path.join(item.head, item.tail, item.name)
-                cksm = get_checksum(path)
+                created_on = datetime.fromtimestamp(item.timestamp)
 
-                # Skip already existing database entries.
+                # Reuse the checksum of a known file if it did not change.
                 file_ = self.session.query(File).\
                     filter(File.relpath == item.tail,
-                           File.filename == item.name,
-                           File.checksum == cksm).first()
-                if file_ is not None:
+                           File.filename == item.name).\
+                    order_by(File.id.desc()).first()
+                if file_ is not None and file_.size_bytes == item.size and \
+                        file_.created_on == created_on:
+                    item.checksum = file_.checksum
+                else:
+                    path = os.path.join(item.head, item.tail, item.name)
+                    cksm = get_checksum(path)
+                    item.checksum = cksm
+
+                    # Skip already existing database entries.
+                    file_ = self.session.query(File).\
+                        filter(File.relpath == item.tail,
+                               File.filename == item.name,
+                               File.checksum == cksm).first()
+
+                if file_ is None:
+                    file_ = File(
+                        relpath=item.tail,
+                        filename=item.name,
+                        checksum=item.checksum,
+                        size_bytes=item.size,
+                        created_on=created_on,
+                        state=IN_FLIGHT
+                    )
+                    files.append(file_)
+                elif file_.state == IN_FLIGHT:
                     continue
-
-                file_ = File(
-                    relpath=item.tail,
-                    filename=item.name,
-                    checksum=cksm,
-                    size_bytes=item.size,
-                    created_on=datetime.fromtimestamp(item.timestamp)
-                )
-                files.append(file_)
+                elif file_.state == TRANSFERRED:
+                    delivered.append(item)
+                    continue
+                else:
+                    ids.append(file_.id)
+                queued.append(item)
 
             # Try to commit changes to the database.  If the commit was
             # successful, populate the output queue with files that need to
             # be transferred.
             self.session.add_all(files)
             try:
+                self._transition(ids, IN_FLIGHT)
                 self.session.commit()
             except (DBAPIError, SQLAlchemyError) as ex:
+                self.session.rollback()
                 msg = f"adding new files failed: {ex}"
                 logger.error(msg)
             else:
-                for item in items:
+                for item in queued:
                     out.put(item)
+            for item in delivered:
+                self.processed.put(item)
 
     def _add_transfers(self, transfers, files, chunk_size=10):
         """Create database entries for completed transfer batches.
@@ -250,7 +448,11 @@ class Manager:
 
             batches = []
             transferred = []
+            ids = []
             for item in items:
+                if self.controller is not None:
+                    self.controller.observe(item)
+
                 records = []
                 try:
                     records = self.session.query(File). \
@@ -263,6 +465,16 @@ class Manager:
                 if not records:
                     continue
 
+                # A file may have been registered several times under the
+                # same name, only its latest entry describes the file which
+                # was transferred.
+                latest = {}
+                for rec in records:
+                    key = (rec.relpath, rec.filename)
+                    if key not in latest or rec.id > latest[key].id:
+                        latest[key] = rec
+                records = list(latest.values())
+
                 # Create an entry for a given transfer batch.
                 batch = Batch(
                     pre_start_time=datetime.fromtimestamp(item.pre_start),
@@ -272,6 +484,8 @@ class Manager:
                     post_start_time=datetime.fromtimestamp(item.pre_start),
                     post_duration=timedelta(seconds=item.pre_duration),
                     size_bytes=item.size,
+                    wire_size_bytes=item.wire_size,
+                    compression=item.compression,
                     rate_mbytes_per_sec=item.rate,
                     status=item.status,
                     err_msg=item.error
@@ -279,9 +493,18 @@ class Manager:
                 batch.files.extend(records)
                 batches.append(batch)
 
+                # Record which delivered files the files were copied from
+                # on the endpoint site.
+                if item.links:
+                    for rec in records:
+                        ident = item.links.get(rec.filename)
+                        if ident is not None and ident != rec.id:
+                            rec.duplicate_of = ident
+
                 # Create messages corresponding to successfully transferred
                 # files.
                 if item.status == 0:
+                    ids.extend(rec.id for rec in records)
                     for head, tail, name in item.files:
                         item = FileMsg(head=head, tail=tail, name=name)
                         transferred.append(item)
@@ -291,17 +514,55 @@ class Manager:
             # successfully transferred.
             self.session.add_all(batches)
             try:
+                self._transition(ids, TRANSFERRED)
                 self.session.commit()
             except (DBAPIError, SQLAlchemyError) as ex:
+                self.session.rollback()
                 msg = f"adding new transfer batches failed: {ex}"
                 logger.error(msg)
             else:
                 for item in transferred:
                     files.put(item)
 
+    def _find_copies(self, checksums, chunk_size=500):
+        """Find files with given checksums delivered to the endpoint site.
+
+        Parameters
+        ----------
+        checksums : `list` [`str`]
+            Checksums of the files.
+        chunk_size : `int`, optional
+            Number of checksums to look up with a single query, defaults to
+            500.
+
+        Returns
+        -------
+        `dict`
+            Relative path, name, and id of a delivered file, keyed by its
+            checksum.
+        """
+        found = {}
+        for i in range(0, len(checksums), chunk_size):
+            chunk = checksums[i:i + chunk_size]
+            try:
+                rows = self.session.query(File.checksum, File.relpath,
+                                          File.filename, File.id).\
+                    join(File.batches).\
+                    filter(File.checksum.in_(chunk), Batch.status == 0).\
+                    order_by(File.id).all()
+            except (DBAPIError, SQLAlchemyError) as ex:
+                logger.error(f"looking up delivered files failed: {ex}")
+                return found
+            for checksum, relpath, filename, ident in rows:
+                found.setdefault(checksum, (relpath, filename, ident))
+        return found
+
     def _update_files(self, inp, chunk_size=10):
         """Add move time to file database entries.
 
+        A file with the same name may have been registered several times, only
+        the latest transferred entry is updated.
+
         Parameters
         ----------
         inp : queue.Queue
@@ -311,15 +572,201 @@ class Manager:
         """
         while not inp.empty():
             items = get_chunk(inp, size=chunk_size)
+            ids = []
             for item in items:
                 tail, name = item.tail, item.name
                 rec = self.session.query(File).\
-                    filter(File.relpath == tail, File.filename == name).\
+                    filter(File.relpath == tail, File.filename == name,
+                           File.state == TRANSFERRED).\
+                    order_by(File.id.desc()).\
                     first()
                 if rec is not None:
                     rec.held_on = datetime.fromtimestamp(item.timestamp)
+                    ids.append(rec.id)
             try:
+                self._transition(ids, MOVED)
                 self.session.commit()
             except (DBAPIError, SQLAlchemyError) as ex:
+                self.session.rollback()
                 msg = f"updating files' held times failed: {ex}"
                 logger.error(msg)
+
+    def _transition(self, ids, state, chunk_size=500):
+        """Change the state of files in the pipeline.
+
+        Only the files in the states from which the given state can be
+        entered are changed, so applying the same transition again has no
+        effect.  The changes are not committed.
+
+        Parameters
+        ----------
+        ids : `list` [`int`]
+            Ids of the database entries of the files.
+        state : `str`
+            The new state of the files.
+        chunk_size : `int`, optional
+            Number of files to change with a single query, defaults to 500.
+        """
+        for i in range(0, len(ids), chunk_size):
+            self.session.query(File).\
+                filter(File.id.in_(ids[i:i + chunk_size]),
+                       File.state.in_(TRANSITIONS[state])).\
+                update({File.state: state}, synchronize_session=False)
+
+    def _release_files(self):
+        """Return files which are still in flight to the registered state.
+        """
+        try:
+            count = self.session.query(File).\
+                filter(File.state == IN_FLIGHT).\
+                update({File.state: REGISTERED}, synchronize_session=False)
+            self.session.commit()
+        except (DBAPIError, SQLAlchemyError) as ex:
+            self.session.rollback()
+            logger.error(f"releasing files in flight failed: {ex}")
+            return
+        if count:
+            logger.info(f"{count} file(s) not transferred, will be retried.")
+
+    def _recover(self, chunk_size=1000):
+        """Rebuild the queues from the states of the files.
+
+        Files which were transferred are queued to be moved to the holding
+        area.  Files which were registered or in flight are queued to be
+        transferred, provided they are still in the buffer and did not
+        change.  The latter are checked against the endpoint site first as
+        they might have been delivered before the manager stopped.
+
+        At most ``queue_size`` files are queued to be transferred, if the
+        size of the queues is limited.  Files in flight which were not
+        queued are released after the first transfer cycle and, like the
+        remaining registered files, are found again by the scans.
+
+        Parameters
+        ----------
+        chunk_size : `int`, optional
+            Number of database entries to fetch at once, defaults to 1000.
+        """
+        start = time.time()
+        counts = {}
+        queued = 0
+        for state in (TRANSFERRED, IN_FLIGHT, REGISTERED):
+            query = self.session.query(File.id, File.relpath, File.filename,
+                                       File.size_bytes, File.created_on,
+                                       File.checksum).\
+                filter(File.state == state)
+            if state != TRANSFERRED and self.queue_size is not None:
+                if queued >= self.queue_size:
+                    break
+                query = query.order_by(File.id).\
+                    limit(self.queue_size - queued)
+            ids = []
+            try:
+                for row in query.yield_per(chunk_size):
+                    id_, tail, name, size, created_on, checksum = row
+                    path = os.path.join(self.buffer, tail, name)
+                    try:
+                        status = os.stat(path)
+                    except OSError:
+                        continue
+                    if state != TRANSFERRED and \
+                            (status.st_size != size or
+                             datetime.fromtimestamp(status.st_mtime) !=
+                             created_on):
+                        continue
+                    item = FileMsg(head=self.buffer, tail=tail, name=name,
+                                   size=size,
+                                   timestamp=created_on.timestamp(),
+                                   checksum=checksum)
+                    if state == TRANSFERRED:
+                        self.processed.put(item)
+                    else:
+                        self.pending.put(item)
+                        ids.append(id_)
+                        queued += 1
+                    counts[state] = counts.get(state, 0) + 1
+            except (DBAPIError, SQLAlchemyError) as ex:
+                logger.error(f"retrieving files in state '{state}' "
+                             f"failed: {ex}")
+            try:
+                self._transition(ids, IN_FLIGHT)
+                self.session.commit()
+            except (DBAPIError, SQLAlchemyError) as ex:
+                self.session.rollback()
+                logger.error(f"updating states of recovered files failed: "
+                             f"{ex}")
+        if counts:
+            summary = ", ".join(f"{count} {state}"
+                                for state, count in counts.items())
+            logger.info(f"Recovered file(s): {summary} in "
+                        f"{time.time() - start:.2f} sec.")
+
+        # Files which were in flight might have been delivered already.
+        if counts.get(IN_FLIGHT, 0) and self.porter.ready():
+            self.porter.precheck(force=True)
+
+    def _reap_files(self):
+        """Remove files from the holding area and record their deletion.
+
+        Files are removed in batches, the oldest first, until the reaper is
+        satisfied with the usage of the holding area and there are no files
+        older than the maximal age.
+        """
+        reaper = self.reaper
+        while True:
+            quota = reaper.quota()
+            cutoff = None
+            if reaper.max_age is not None:
+                cutoff = datetime.now() - timedelta(seconds=reaper.max_age)
+            if quota == 0 and cutoff is None:
+                break
+
+            # Select the oldest files in the holding area.  Entries of files
+            # which were replaced by a newer version held under the same path
+            # are ignored, the newer one describes the file in the area.
+            newer = aliased(File)
+            replaced = exists().where(and_(newer.relpath == File.relpath,
+                                           newer.filename == File.filename,
+                                           newer.held_on.isnot(None),
+                                           newer.id > File.id))
+            query = self.session.query(File.id, File.relpath, File.filename,
+                                       File.size_bytes, File.held_on).\
+                filter(File.held_on.isnot(None), File.deleted_on.is_(None),
+                       ~replaced)
+            if quota == 0:
+                query = query.filter(File.held_on < cutoff)
+            try:
+                rows = query.order_by(File.held_on).\
+                    limit(reaper.batch_size).all()
+            except (DBAPIError, SQLAlchemyError) as ex:
+                logger.error(f"retrieving files to remove failed: {ex}")
+                break
+
+            ids = {}
+            for id_, tail, name, size, held_on in rows:
+                if quota <= 0 and (cutoff is None or held_on >= cutoff):
+                    break
+                quota -= size
+                ids[(tail, name)] = id_
+                self.expired.put(FileMsg(tail=tail, name=name, size=size))
+            if not ids:
+                break
+            reaper.run()
+
+            # Record the deletion of the removed files.
+            removed = []
+            while not self.reaped.empty():
+                item = self.reaped.get(block=False)
+                removed.append(ids[(item.tail, item.name)])
+            if not removed:
+                break
+            try:
+                self.session.query(File).\
+                    filter(File.id.in_(removed)).\
+                    update({File.deleted_on: datetime.now()},
+                           synchronize_session=False)
+                self.session.commit()
+            except (DBAPIError, SQLAlchemyError) as ex:
+                self.session.rollback()
+                logger.error(f"updating files' deletion times failed: {ex}")
+                break
@@ -19,81 +19,277 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """Specifications of messages allowed in inter-thread/command communication.
+
+Messages are compact: they use ``__slots__`` and refer to directories
+represented by objects from a registry shared by all commands instead of
+keeping their own copies of the path strings.
 """
-from dataclasses import dataclass
+import sys
+import threading
+import weakref
 
 
-@dataclass
-class FileMsg:
-    """A message containing information about a file.
-    """
+__all__ = ["FileMsg", "Location", "Locations", "LOCATIONS", "TransferMsg"]
 
-    head: str = None
-    """Root directory.
-    """
 
-    tail: str = None
-    """Path (directory) to file, relative to "head".
-    """
+class Location:
+    """A directory where files are located.
 
-    name: str = None
-    """File name equivalent to Bash `basename path
+    Parameters
+    ----------
+    head : `str`
+        Root directory.
+    tail : `str`
+        Path to the directory, relative to the root directory.
     """
 
-    size: int = None
-    """File size in bytes.
+    __slots__ = ("head", "tail", "__weakref__")
+
+    def __init__(self, head, tail):
+        self.head = head
+        self.tail = tail
+
+    def __repr__(self):
+        return f"Location(head={self.head!r}, tail={self.tail!r})"
+
+
+class Locations:
+    """Registry of directories where files are located.
+
+    Each distinct pair of a root directory and a path relative to it is
+    represented by a single `Location` shared by all messages referring to
+    it.  The path strings are interned so each of them is stored only once.
+    The registry keeps only weak references to the directories, so
+    a directory is dropped from it as soon as nothing refers to it anymore.
     """
 
-    timestamp: float = None
-    """A timestamp for an arbitrary file event, e.g., creation, deletion, etc.
+    def __init__(self):
+        self._locations = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._locations)
+
+    def register(self, head, tail):
+        """Get a directory, registering it if necessary.
+
+        Parameters
+        ----------
+        head : `str`
+            Root directory.
+        tail : `str`
+            Path to the directory, relative to the root directory.
+
+        Returns
+        -------
+        `Location`
+            The directory.
+        """
+        key = (head, tail)
+        location = self._locations.get(key)
+        if location is None:
+            with self._lock:
+                location = self._locations.get(key)
+                if location is None:
+                    head, tail = (sys.intern(p) if isinstance(p, str) else p
+                                  for p in key)
+                    location = Location(head, tail)
+                    self._locations[(head, tail)] = location
+        return location
+
+
+LOCATIONS = Locations()
+"""Registry of directories shared by all messages.
+"""
+
+
+class FileMsg:
+    """A message containing information about a file.
+
+    Attributes
+    ----------
+    head : `str`
+        Root directory.
+    tail : `str`
+        Path (directory) to file, relative to "head".
+    name : `str`
+        File name equivalent to Bash `basename path`.
+    size : `int`
+        File size in bytes.
+    timestamp : `float`
+        A timestamp for an arbitrary file event, e.g., creation, deletion,
+        etc.
+    checksum : `str`
+        File checksum (BLAKE2), if known.
+    location : `Location`
+        The directory ("head", "tail") from the registry.
     """
 
+    __slots__ = ("location", "name", "size", "timestamp", "checksum")
+
+    def __init__(self, head=None, tail=None, name=None, size=None,
+                 timestamp=None, checksum=None):
+        self.location = LOCATIONS.register(head, tail)
+        self.name = name
+        self.size = size
+        self.timestamp = timestamp
+        self.checksum = checksum
+
+    def __repr__(self):
+        return f"FileMsg(head={self.head!r}, tail={self.tail!r}, " \
+               f"name={self.name!r}, size={self.size!r}, " \
+               f"timestamp={self.timestamp!r}, checksum={self.checksum!r})"
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.astuple() == other.astuple()
+
+    @property
+    def head(self):
+        return self.location.head
+
+    @head.setter
+    def head(self, value):
+        self.location = LOCATIONS.register(value, self.tail)
+
+    @property
+    def tail(self):
+        return self.location.tail
+
+    @tail.setter
+    def tail(self, value):
+        self.location = LOCATIONS.register(self.head, value)
+
+    def astuple(self):
+        """Get the values of the fields.
+
+        Returns
+        -------
+        `tuple`
+            Root directory, relative path, name, size, timestamp, and
+            checksum of the file.
+        """
+        location = self.location
+        return location.head, location.tail, self.name, self.size, \
+            self.timestamp, self.checksum
+
 
-@dataclass
 class TransferMsg:
     """A message containing information about a transfer batch.
-    """
 
-    pre_start: float = None
-    """Timestamp showing when pre-transfer actions started.
-    """
+    Attributes
+    ----------
+    pre_start : `float`
+        Timestamp showing when pre-transfer actions started.
+    pre_duration : `float`
+        Duration of pre-transfer actions.
+    trans_start : `float`
+        Timestamp showing when transfer started.
+    trans_duration : `float`
+        Duration of transfer.
+    post_start : `float`
+        Timestamp showing when post-transfer actions started.
+    post_duration : `float`
+        Duration of post-transfer actions.
+    size : `int`
+        Amount of data transferred (in bytes).
+    wire_size : `int`
+        Amount of data actually sent to the endpoint site (in bytes).  It
+        differs from `size` if the data were compressed during the transfer.
+        None if unknown.
+    compression : `str`
+        Compression method used during the transfer, if any.
+    rate : `float`
+        Transfer rate (in MBytes/s).  It is calculated from the uncompressed
+        size of the transferred files.
+    status : `int`
+        Transfer attempt status (0 for success, non-zero for failure).
+    error : `str`
+        Error message when transfer failed.
+    files : `tuple`
+        List of files in the batch, each described by its root directory,
+        relative path, and name.
+    checksums : `dict`
+        Checksums of files, keyed by file names.  Before the transfer, the
+        expected ones, after it, the ones computed during the transfer (if
+        the transport computes them).
+    failures : `dict`
+        Errors of files which failed to transfer, keyed by file names.  Set
+        only if the remaining files in the batch were transferred
+        successfully.
+    links : `dict`
+        Identifiers of the delivered files which the files in the batch were
+        copied from on the endpoint site instead of being sent, keyed by file
+        names.
 
-    pre_duration: float = None
-    """Duration of pre-transfer actions.
+    Notes
+    -----
+    Files are stored by their directories and names.  If all of them share
+    the same directory, which is usually the case, the directory is kept only
+    once for the entire batch.
     """
 
-    trans_start: float = None
-    """Timestamp showing when transfer started.
-    """
+    _fields = ("pre_start", "pre_duration", "trans_start", "trans_duration",
+               "post_start", "post_duration", "size", "wire_size",
+               "compression", "rate", "status", "error", "checksums",
+               "failures", "links")
 
-    trans_duration: float = None
-    """Duration of transfer.
-    """
+    __slots__ = _fields + ("location", "names")
 
-    post_start: float = None
-    """Timestamp showing when post-transfer actions started.
-    """
+    def __init__(self, files=None, **kwargs):
+        unknown = set(kwargs) - set(self._fields)
+        if unknown:
+            raise TypeError(f"unexpected keyword argument(s): "
+                            f"{', '.join(sorted(unknown))}")
+        for field in self._fields:
+            setattr(self, field, kwargs.get(field, None))
+        self.files = files
 
-    post_duration: float = None
-    """Duration of post-transfer actions.
-    """
+    def __repr__(self):
+        values = ", ".join(f"{field}={getattr(self, field)!r}"
+                           for field in self._fields + ("files",))
+        return f"TransferMsg({values})"
 
-    size: int = None
-    """Amount of data transferred (in bytes).
-    """
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field)
+                   for field in self._fields + ("files",))
 
-    rate: float = None
-    """Transfer rate (in MBytes/s)
-    """
+    @property
+    def files(self):
+        if self.names is None:
+            return None
+        if self.location is not None:
+            head, tail = self.location.head, self.location.tail
+            return tuple((head, tail, name) for name in self.names)
+        return tuple((location.head, location.tail, name)
+                     for location, name in self.names)
 
-    status: int = None
-    """Transfer attempt status (0 for success, non-zero for failure)
-    """
+    @files.setter
+    def files(self, value):
+        self.location, self.names = None, None
+        if value is None:
+            return
+        locations = [LOCATIONS.register(head, tail)
+                     for head, tail, _ in value]
+        if len(set(locations)) == 1:
+            self.location = locations[0]
+            self.names = tuple(name for _, _, name in value)
+        else:
+            self.names = tuple((location, name) for location, (_, _, name)
+                               in zip(locations, value))
 
-    error: str = None
-    """Error message when transfer failed.
-    """
+    def copy(self):
+        """Make a shallow copy of the message.
 
-    files: tuple = None
-    """List of files in the batch.
-    """
+        Returns
+        -------
+        `TransferMsg`
+            The copy of the message.
+        """
+        other = TransferMsg()
+        for field in self.__slots__:
+            setattr(other, field, getattr(self, field))
+        return other
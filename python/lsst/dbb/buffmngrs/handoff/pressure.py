@@ -0,0 +1,187 @@
+# This file is part of dbb_buffmngrs_handoff.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Monitoring of the pressure on the buffer on the handoff site.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import time
+
+
+__all__ = ["Monitor"]
+
+
+logger = logging.getLogger(__name__)
+
+
+class Monitor:
+    """Monitor of the buffer pressure.
+
+    The pressure is determined by the file system usage of the buffer and
+    the holding area and by the number of files waiting in the buffer
+    (backlog).  It is 'critical' if any of them reaches its critical
+    threshold, 'elevated' if any reaches its elevated threshold, and
+    'normal' otherwise.  Backlog thresholds are not used unless specified.
+
+    If 'signal_file' is specified, the current pressure is written to it as
+    a JSON object every time it is updated so the applications writing files
+    to the buffer can adjust their behavior.  The file is replaced
+    atomically, it is never seen partially written.  It must not be located
+    in the buffer, otherwise it would be transferred as any other file.
+
+    Parameters
+    ----------
+    config : `dict`
+        Configuration of the monitor.
+    buffer : `str`
+        Path to the buffer.
+    holding : `str`
+        Path to the holding area.
+
+    Raises
+    ------
+    ValueError
+        If the thresholds are inconsistent or the signal file is located in
+        the buffer.
+    """
+
+    levels = ("normal", "elevated", "critical")
+    """Supported pressure levels, from the lowest.
+    """
+
+    def __init__(self, config, buffer, holding):
+        settings = {
+            "elevated": 0.7,
+            "critical": 0.85,
+            "backlog_elevated": None,
+            "backlog_critical": None,
+            "boost": 2,
+            "signal_file": None,
+        }
+        settings.update(config)
+        if settings["elevated"] > settings["critical"]:
+            msg = "Invalid configuration: elevated exceeds critical."
+            logger.critical(msg)
+            raise ValueError(msg)
+        path = settings["signal_file"]
+        if path is not None:
+            top = os.path.realpath(buffer)
+            path = os.path.realpath(path)
+            if os.path.commonpath([top, path]) == top:
+                msg = "Invalid configuration: signal file is in the buffer."
+                logger.critical(msg)
+                raise ValueError(msg)
+        self.settings = settings
+        self.buffer = buffer
+        self.holding = holding
+        self.level = "normal"
+
+    def update(self, backlog):
+        """Determine the current buffer pressure.
+
+        Parameters
+        ----------
+        backlog : `int`
+            Number of files waiting in the buffer.
+
+        Returns
+        -------
+        `str`
+            The pressure level.
+        """
+        opts = self.settings
+        usages = {"buffer": _usage(self.buffer),
+                  "holding": _usage(self.holding)}
+        level = 0
+        for usage in usages.values():
+            if usage >= opts["critical"]:
+                level = max(level, 2)
+            elif usage >= opts["elevated"]:
+                level = max(level, 1)
+        limits = (opts["backlog_elevated"], opts["backlog_critical"])
+        for value, limit in enumerate(limits, start=1):
+            if limit is not None and backlog >= limit:
+                level = max(level, value)
+
+        previous, self.level = self.level, self.levels[level]
+        if self.level != previous:
+            logger.warning(f"Buffer pressure changed from '{previous}' to "
+                           f"'{self.level}' (buffer usage "
+                           f"{usages['buffer']:.2%}, holding area usage "
+                           f"{usages['holding']:.2%}, backlog {backlog}).")
+
+        if opts["signal_file"] is not None:
+            status = dict(level=self.level,
+                          buffer_usage=round(usages["buffer"], 4),
+                          holding_usage=round(usages["holding"], 4),
+                          backlog=backlog,
+                          timestamp=time.time())
+            try:
+                _publish(opts["signal_file"], status)
+            except OSError as ex:
+                logger.warning(f"Cannot write '{opts['signal_file']}': {ex}.")
+        return self.level
+
+
+def _usage(path):
+    """Find out the fraction of the file system space in use.
+
+    Parameters
+    ----------
+    path : `str`
+        Any path on the file system.
+
+    Returns
+    -------
+    `float`
+        Fraction of the space in use.
+    """
+    info = os.statvfs(path)
+    if info.f_blocks == 0:
+        return 0.0
+    return 1.0 - info.f_bavail / info.f_blocks
+
+
+def _publish(path, status):
+    """Replace the content of a file with a JSON object atomically.
+
+    Parameters
+    ----------
+    path : `str`
+        Path to the file.
+    status : `dict`
+        The object to write.
+    """
+    dirname, basename = os.path.split(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=dirname, prefix=f".{basename}.")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(status, f)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
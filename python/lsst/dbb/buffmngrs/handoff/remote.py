@@ -21,23 +21,25 @@
 """Definitions of commands that need to be executed on the endpoint site.
 """
 
+import asyncio
 import datetime
-import dataclasses
 import errno
 import logging
 import os
-import re
-import shlex
-import subprocess
+import queue
+import time
 from .abcs import Command
+from .breaker import CircuitBreaker
+from .catalog import Catalog
 from .messages import TransferMsg
-from .utils import get_chunk
+from .scheduling import Lanes, Scheduler
+from .transports import get_transport
+from .utils import get_checksum, get_chunk
 
 __all__ = ['Porter', 'Wiper']
 
 
 logger = logging.getLogger(__name__)
-keywords = {"batch", "command", "dest", "file"}
 
 
 class Porter(Command):
@@ -51,11 +53,51 @@ class Porter(Command):
     initially transferred to it and moved to the endpoint's buffer only
     after the transfer is finished.
 
+    The way the files are delivered to the endpoint site is determined by
+    the transport selected in the configuration (see `get_transport`).  By
+    default, files are transferred and the endpoint's directories are
+    managed with shell commands specified in the configuration.
+
+    If the transport supports it, files larger than 'stripe_threshold' bytes
+    are striped: the file is split into 'num_stripes' byte ranges which are
+    sent concurrently to a preallocated file in the staging area.  Its
+    checksum is verified on the endpoint site before the file is moved to
+    the buffer.
+
+    If 'resume' is enabled and the transport supports it, files which were
+    partially transferred to the staging area by earlier, failed attempts
+    are not sent from scratch.  Only their missing bytes are sent and then
+    the checksum of the complete file is verified.
+
+    If 'verify' is enabled, checksums of all files sent in a transfer cycle
+    are calculated on the endpoint site in a single call and compared with
+    the checksums of the originals before the files are moved to the buffer.
+    Files which do not match are reported as failed transfers and left in the
+    staging area.
+
+    If 'precheck' is enabled, `precheck` compares pending files with
+    a listing of the relevant directories in the buffer on the endpoint site,
+    fetched with a single call, before any transfers take place.  Files which
+    are already there, e.g., because the manager crashed before recording
+    their transfers, are reported as transferred without sending them again.
+
+    If 'dedup' is enabled and the transport supports it, `dedup` looks for
+    files identical to the pending ones, i.e., having the same checksums,
+    which were already delivered to the endpoint site.  Instead of sending
+    them again, their copies are made on the endpoint site with a single
+    call.
+
+    If 'circuit_breaker' is configured, transfers stop after a number of
+    consecutive failures and the files which were not transferred yet are
+    dropped from the input queue without recording any transfer attempts.
+    They will be picked up again in one of the following cycles, once
+    `ready` confirms that the endpoint site is reachable again.
+
     Parameters
     ----------
     config : dict
         Configuration of the endpoint where files should be transferred to.
-    pending : queue.Queue
+    pending : queue.Queue or `Lanes`
         Files that need to be transferred.
     completed : queue.Queue
         Files that were transferred successfully.
@@ -66,6 +108,12 @@ class Porter(Command):
         Time (in seconds) after which the child process executing a bash
         command will be terminated. If None (default), the command will wait
         indefinitely for the child process to complete.
+    concurrency : int, optional
+        Number of transfers the command runs concurrently within a single
+        thread, defaults to 1.
+    staged : queue.Queue, optional
+        Directories in the staging area used during transfers.  If None
+        (default), they are not recorded.
 
     Raises
     ------
@@ -73,57 +121,279 @@ class Porter(Command):
         If endpoint's specification is invalid.
     """
 
-    def __init__(self, config, pending, completed, chunk_size=1, timeout=None):
-        required = {"user", "host", "buffer", "commands"}
-        missing = required - set(config)
-        if missing:
-            msg = f"Invalid configuration: {', '.join(missing)} not provided."
+    def __init__(self, config, pending, completed, chunk_size=1, timeout=None,
+                 concurrency=1, staged=None):
+        if "buffer" not in config:
+            msg = "Invalid configuration: buffer not provided."
             logger.critical(msg)
             raise ValueError(msg)
+        self.buffer = config["buffer"]
+        self.stage = config.get("staging", self.buffer)
+
+        self.transport = get_transport(config, timeout=timeout)
+        self.batch_mode = self.transport.batch_mode
+
+        self.stripe_threshold = None
+        ops = ("allocate", "send_range", "checksums")
+        if all(self.transport.supports(op) for op in ops):
+            self.stripe_threshold = config.get("stripe_threshold", None)
+        self.num_stripes = config.get("num_stripes", 4)
+        self.method = config.get("checksum", "blake2")
+
+        self.resume = False
+        ops = ("allocate", "send_range", "sizes", "checksums")
+        if all(self.transport.supports(op) for op in ops):
+            self.resume = config.get("resume", False)
+        self.resume_check = config.get("resume_check", 1048576)
 
-        self.cmds = config["commands"]
-        self.params = {k: v for k, v in config.items() if k != "commands"}
-
-        # Verify if all parameters in use were provided.
-        actual = set(self.params)
-        for cmd in self.cmds.values():
-            formal = set(re.findall(r"{(\w+)}", cmd))
-            remaining = formal - actual
-            undefined = remaining - keywords
-            if undefined:
-                msg = f"parameters {', '.join(undefined)} are used, " \
-                      f"but not defined in '{cmd}'"
-                logger.error(msg)
-                raise ValueError(msg)
-
-        # If the source in the transfer command is specified with keyword
-        # 'file', a separate transfer attempt will be made for each file. If
-        # the keyword 'batch' is used instead a single transfer attempt will
-        # be made for multiple files when possible.
-        self.batch_mode = False
-        if "batch" in self.cmds["transfer"]:
-            self.batch_mode = True
-
-        # Once the transfer mode set for future reference, replace 'file/batch'
-        # with generic 'source' to make generating concrete commands easier
-        # later on.
-        cmd = self.cmds["transfer"]
-        self.cmds["transfer"] = re.sub(r"(batch|file)", "source", cmd)
+        self.verify = False
+        if self.transport.supports("checksums"):
+            self.verify = config.get("verify", False)
+
+        self.precheck_enabled = False
+        if self.transport.supports("inventory"):
+            self.precheck_enabled = config.get("precheck", False)
+
+        self.dedup_enabled = False
+        if self.transport.supports("link"):
+            self.dedup_enabled = config.get("dedup", False)
+
+        self.breaker = None
+        settings = config.get("circuit_breaker", None)
+        if settings is not None:
+            self.breaker = CircuitBreaker(settings)
 
         self.chunk_size = chunk_size
         self.timeout = timeout
+        self.concurrency = concurrency
 
         self.todo = pending
         self.done = completed
+        self.staged = staged
 
     def run(self):
         """Transfer files to the endpoint site.
         """
-        buffer = self.params["buffer"]
-        stage = self.params.get("staging", buffer)
+        asyncio.run(self._run())
+
+    def ready(self):
+        """Check if transfers to the endpoint site should be attempted.
+
+        If the circuit breaker is open, the endpoint site is probed when the
+        time comes.  If the transfers should not be attempted, the input
+        queue is drained.
+
+        Returns
+        -------
+        `bool`
+            True if transfers should be attempted, False otherwise.
+        """
+        if self.breaker is None or self.breaker.closed:
+            return True
+        if self.breaker.due():
+            coro = self.transport.prepare_dirs([self.stage])
+            status, _, _, _ = asyncio.run(coro)
+            self.breaker.probed(status == 0)
+            if status == 0:
+                return True
+        self._drain()
+        return False
+
+    def precheck(self, force=False):
+        """Report pending files already present in the endpoint buffer.
+
+        A file is considered present if a file with the same name and size,
+        modified not earlier than the original, exists in the corresponding
+        directory in the buffer.  Such files are removed from the input
+        queue and a successful transfer, with no data sent, is reported for
+        each group of them sharing a location.  It does nothing, unless
+        enabled in the configuration or forced.
+
+        Parameters
+        ----------
+        force : `bool`, optional
+            If True, the check is made even if it is not enabled in the
+            configuration, provided that the transport supports it.  Defaults
+            to False.
+        """
+        enabled = self.precheck_enabled
+        if force:
+            enabled = self.transport.supports("inventory")
+        if not enabled or self.todo.empty():
+            return
+        files = self._collect()
+
+        dirs = {os.path.normpath(os.path.join(self.buffer, item.tail))
+                for item in files}
+        start = datetime.datetime.now()
+        coro = self.transport.inventory(sorted(dirs))
+        status, found, stderr, dur = asyncio.run(coro)
+        if status != 0:
+            logger.warning(f"Listing files in '{self.buffer}' failed with "
+                           f"error: '{stderr}'")
+            found = {}
+
+        mapping = {}
+        for item in files:
+            path = os.path.join(self.buffer, item.tail, item.name)
+            size, mtime = found.get(os.path.normpath(path), (None, None))
+            if size is None or size != item.size or \
+                    (item.timestamp is not None and
+                     mtime < int(item.timestamp)):
+                self.todo.put(item)
+                continue
+            mapping.setdefault((item.head, item.tail), []).append(item)
+
+        for (head, tail), items in mapping.items():
+            transfer = TransferMsg(pre_start=start.timestamp(),
+                                   pre_duration=dur.total_seconds(),
+                                   trans_start=start.timestamp(),
+                                   trans_duration=0.0,
+                                   post_start=start.timestamp(),
+                                   post_duration=0.0,
+                                   wire_size=0,
+                                   rate=0.0,
+                                   status=0,
+                                   error="")
+            transfer.files = tuple((head, tail, item.name) for item in items)
+            transfer.size = sum(item.size for item in items)
+            self._flush([transfer])
+        total = sum(len(items) for items in mapping.values())
+        if total:
+            logger.info(f"Found {total} pending file(s) already in "
+                        f"'{self.buffer}', skipping their transfers.")
+
+    def dedup(self, lookup):
+        """Replace transfers of pending files with copies of identical ones.
+
+        Pending files are grouped by their checksums.  If a file with the
+        same checksum was already delivered to the endpoint site, all files
+        of the group are linked to (or copied from) it on the endpoint site.
+        The copies are made with a single call and a successful transfer,
+        with no data sent, is reported for each group of files sharing
+        a location.  Files which could not be copied are transferred as
+        usual.  If no such file was delivered, only the first file of the
+        group is transferred in this cycle, the remaining ones will be copied
+        from it in one of the following ones.  It does nothing, unless
+        enabled in the configuration.
+
+        Parameters
+        ----------
+        lookup : callable
+            A function which, given a list of checksums, returns
+            a dictionary with the delivered files having these checksums.
+            Each file is described by its path relative to the buffer on the
+            endpoint site, its name, and an identifier keyed by the checksum.
+        """
+        if not self.dedup_enabled or self.todo.empty():
+            return
+        groups, unknown = {}, []
+        for item in self._collect():
+            if item.checksum is None:
+                unknown.append(item)
+                continue
+            groups.setdefault(item.checksum, []).append(item)
+        for item in unknown:
+            self.todo.put(item)
+        if not groups:
+            return
+
+        originals = lookup(list(groups))
+        pairs = {}
+        held = 0
+        for checksum, items in groups.items():
+            original = originals.get(checksum)
+            if original is None:
+                self.todo.put(items[0])
+                held += len(items) - 1
+                continue
+            relpath, filename, ident = original
+            src = os.path.normpath(os.path.join(self.buffer, relpath,
+                                                filename))
+            for item in items:
+                dst = os.path.normpath(os.path.join(self.buffer, item.tail,
+                                                    item.name))
+                pairs[dst] = (src, item, ident)
+        if held:
+            logger.info(f"Postponed {held} pending file(s) identical to "
+                        f"other pending files.")
+        if not pairs:
+            return
+
+        start = datetime.datetime.now()
+        coro = self.transport.link([(src, dst)
+                                    for dst, (src, _, _) in pairs.items()])
+        status, linked, stderr, dur = asyncio.run(coro)
+        if status != 0 and not linked:
+            logger.warning(f"Copying files within '{self.buffer}' failed "
+                           f"with error: '{stderr}'")
+
+        mapping = {}
+        for dst, (_, item, ident) in pairs.items():
+            if dst not in linked:
+                self.todo.put(item)
+                continue
+            location = (item.head, item.tail)
+            mapping.setdefault(location, []).append((item, ident))
+
+        saved = 0
+        for (head, tail), entries in mapping.items():
+            transfer = TransferMsg(pre_start=start.timestamp(),
+                                   pre_duration=0.0,
+                                   trans_start=start.timestamp(),
+                                   trans_duration=dur.total_seconds(),
+                                   post_start=start.timestamp(),
+                                   post_duration=0.0,
+                                   wire_size=0,
+                                   rate=0.0,
+                                   status=0,
+                                   error="")
+            transfer.files = tuple((head, tail, item.name)
+                                   for item, _ in entries)
+            transfer.size = sum(item.size or 0 for item, _ in entries)
+            transfer.links = {item.name: ident for item, ident in entries}
+            saved += transfer.size
+            self._flush([transfer])
+        total = sum(len(entries) for entries in mapping.values())
+        if total:
+            logger.info(f"Copied {total} file(s) from identical files "
+                        f"already delivered, {saved / pow(1024, 2):.2f} MB "
+                        f"not sent.")
+
+    async def _run(self):
+        """Transfer files using a number of concurrent workers.
+        """
+        limit = asyncio.Semaphore(self.concurrency)
+        workers = [self._work(limit) for _ in range(self.concurrency)]
+        await asyncio.gather(*workers)
+        if self.breaker is not None and not self.breaker.closed:
+            self._drain()
+
+    async def _work(self, limit):
+        """Transfer files until there is nothing left to transfer.
+
+        Parameters
+        ----------
+        limit : asyncio.Semaphore
+            Semaphore limiting the number of concurrently running commands.
+        """
+        # If pending files are divided into lanes, find out which lane the
+        # worker should serve.
+        lane = None
+        if isinstance(self.todo, Lanes):
+            lane = self.todo.assign()
+
         while not self.todo.empty():
+            if self.breaker is not None and not self.breaker.closed:
+                break
+
             # Grab a bunch of file items from the input queue.
-            files = get_chunk(self.todo, size=self.chunk_size)
+            if lane is not None:
+                files = self.todo.take(lane, size=self.chunk_size)
+            elif isinstance(self.todo, Catalog):
+                files = self.todo.take(size=self.chunk_size)
+            else:
+                files = get_chunk(self.todo, size=self.chunk_size)
             if not files:
                 continue
 
@@ -132,138 +402,517 @@ class Porter(Command):
             # transfer command when the batch mode is enabled.
             mapping = {}
             for item in files:
-                head, tail, *rest = dataclasses.astuple(item)
-                mapping.setdefault((head, tail), []).append(item)
+                mapping.setdefault((item.head, item.tail), []).append(item)
 
             # Transfer files to the handoff site to the endpoint site.
             for location, files in mapping.items():
                 head, tail = location
+                await self._transfer(head, tail, files, limit)
+
+    async def _transfer(self, head, tail, files, limit):
+        """Transfer files sharing the same location to the endpoint site.
+
+        Parameters
+        ----------
+        head : `str`
+            Root directory of the files.
+        tail : `str`
+            Path to the files, relative to the root directory.
+        files : `list` [`FileMsg`]
+            Files to transfer.
+        limit : asyncio.Semaphore
+            Semaphore limiting the number of concurrently running commands.
+        """
+        buffer, stage = self.buffer, self.stage
+
+        filenames = [item.name for item in files]
+        sizes = {item.name: item.size for item in files}
+        checksums = {item.name: item.checksum for item in files}
+
+        # Set aside files which need to be striped, each of them will be
+        # transferred separately.
+        striped = set()
+        if self.stripe_threshold is not None:
+            striped = {fn for fn in filenames
+                       if sizes[fn] >= self.stripe_threshold}
+        regular = [fn for fn in filenames if fn not in striped]
+
+        # 1. PRE-TRANSFER actions
+        # -----------------------
+        dest = os.path.join(stage, tail)
+        start = datetime.datetime.now()
+        total = datetime.timedelta()
+
+        # Find out which files were already partially transferred to the
+        # staging area, each of them will be resumed separately.
+        resumed = {}
+        if self.resume:
+            paths = {os.path.join(dest, fn): fn for fn in regular}
+            op = self.transport.sizes
+            _, found, _, dur = await self._call(limit, op, list(paths))
+            total += dur
+            for path, size in found.items():
+                fn = paths.get(path)
+                if fn is not None and 0 < size <= sizes[fn]:
+                    resumed[fn] = size
+            regular = [fn for fn in regular if fn not in resumed]
+
+        # Divide files into batches. If batch mode is enabled,
+        # all files grouped into a single batch. Otherwise,
+        # each batch will consist of a single file.
+        batch_size = max(len(regular), 1) if self.batch_mode else 1
+        batches = [regular[i:i+batch_size]
+                   for i in range(0, len(regular), batch_size)]
+        batches.extend([fn] for fn in filenames
+                       if fn in striped or fn in resumed)
+
+        # Create corresponding number of transfer items to put in the
+        # output queue.
+        transfers = [TransferMsg() for _ in batches]
+        for batch, transfer in zip(batches, transfers):
+            transfer.files = tuple((head, tail, fn) for fn in batch)
+            transfer.size = sum(sizes[fn] for fn in batch)
+
+        # Create a relevant subdirectory in the staging area.
+        op = self.transport.prepare_dirs
+        status, _, stderr, dur = await self._call(limit, op, [dest])
+        total += dur
+        for item in transfers:
+            item.pre_start = start.timestamp()
+            item.pre_duration = total.total_seconds()
+            item.status = status
+            item.error = stderr
+        if status != 0:
+            self._flush(transfers)
+            msg = f"Creating '{dest}' failed with error: '{stderr}'"
+            logger.warning(msg)
+            return
+
+        # Let the Wiper know which directories in the staging area were
+        # used, they will be empty once files are moved to the buffer.
+        if self.staged is not None and stage != buffer:
+            self.staged.put(dest)
+
+        # 2. TRANSFER
+        # -----------
+        async def send(batch, transfer):
+            srcs = [os.path.join(head, tail, name) for name in batch]
+            start = datetime.datetime.now()
+            name = batch[0]
+            if name in striped:
+                op, args = self._stripe, (srcs[0], dest, sizes[name],
+                                          checksums[name])
+            elif name in resumed:
+                op, args = self._resume, (srcs[0], dest, sizes[name],
+                                          resumed[name], checksums[name],
+                                          transfer)
+            else:
+                transfer.checksums = {fn: checksums[fn] for fn in batch
+                                      if checksums[fn] is not None}
+                op, args = self.transport.send_batch, (srcs, dest, transfer)
+            status, _, stderr, dur = await self._call(limit, op, *args)
+            transfer.trans_start = start.timestamp()
+            transfer.trans_duration = dur.total_seconds()
+            transfer.status = status
+            transfer.error = stderr
+
+            if status != 0:
+                self._flush([transfer])
+                msg = f"Sending '{' '.join(srcs)}' to '{dest}' failed " \
+                      f"with error: '{stderr}'"
+                logger.warning(msg)
+                return None
+
+            # If only some files were transferred, report the remaining ones
+            # as a separate, failed transfer.
+            if transfer.failures:
+                failed = self._detach(transfer, transfer.failures, sizes)
+                self._flush([failed])
+                msg = f"Sending '{' '.join(failed.failures)}' to '{dest}' " \
+                      f"failed with error: '{failed.error}'"
+                logger.warning(msg)
+                batch = [fn for fn in batch if fn not in failed.failures]
+
+            # If transfer successfully, calculate transfer rate.
+            transfer.rate = transfer.size / dur.total_seconds()  # B/s
+            transfer.rate /= pow(1024, 2)                        # MB/s
+            return batch, transfer
+
+        results = await asyncio.gather(*[send(batch, transfer)
+                                         for batch, transfer
+                                         in zip(batches, transfers)])
+        relocated = [result for result in results if result is not None]
+
+        # Recreate lists without items corresponding to failed
+        # transfers.
+        batches, transfers = [], []
+        for batch, transfer in relocated:
+            batches.append(batch)
+            transfers.append(transfer)
+        if not batches:
+            return
+
+        # Verify checksums of all transferred files at once.  Files sent in
+        # stripes or resumed were verified already.
+        if self.verify:
+            skipped = striped | set(resumed)
+            names = [fn for batch in batches for fn in batch
+                     if fn not in skipped]
+            failures = await self._check(limit, head, tail, dest, names,
+                                         checksums, transfers)
+            if failures:
+                batches, transfers = self._reject(batches, transfers,
+                                                  failures, sizes)
+            if not batches:
+                return
+
+        # If files were transferred directly to the buffer on the
+        # endpoint site, skip the next step.
+        if stage == buffer:
+            self._flush(transfers)
+            return
+
+        # 3. POST-TRANSFER actions
+        # ------------------------
+        dest = os.path.join(buffer, tail)
+        total = datetime.timedelta()
+
+        # Create a relevant subdirectory in the buffer.
+        start = datetime.datetime.now()
+        op = self.transport.prepare_dirs
+        status, _, stderr, dur = await self._call(limit, op, [dest])
+        total += dur
+        for item in transfers:
+            item.post_start = start.timestamp()
+            item.post_duration = total
+            item.status = status
+            item.error = stderr
+
+        if status != 0:
+            self._flush(transfers)
+            msg = f"Creating '{dest}' failed with error: '{stderr}'"
+            logger.warning(msg)
+            return
+
+        # Move files from the staging area to the buffer.
+        async def commit(batch, transfer):
+            srcs = [os.path.join(stage, tail, name) for name in batch]
+            start = datetime.datetime.now()
+            op = self.transport.commit_batch
+            status, _, stderr, dur = await self._call(limit, op, srcs, dest)
+            transfer.post_start = start.timestamp()
+            transfer.post_duration = (total+dur).total_seconds()
+            transfer.status = status
+            transfer.error = stderr
 
-                filenames = [item.name for item in files]
-                sizes = {item.name: item.size for item in files}
-
-                # Divide files into batches. If batch mode is enabled,
-                # all files grouped into a single batch. Otherwise,
-                # each batch will consist of a single file.
-                batch_size = len(filenames) if self.batch_mode else 1
-                batches = [filenames[i:i+batch_size]
-                           for i in range(0, len(filenames), batch_size)]
-
-                # Create corresponding number of transfer items to put in the
-                # output queue.
-                transfers = [TransferMsg() for _ in batches]
-                for batch, transfer in zip(batches, transfers):
-                    transfer.files = tuple((head, tail, fn) for fn in batch)
-                    transfer.size = sum(sizes[fn] for fn in batch)
-
-                # 1. PRE-TRANSFER actions
-                # -----------------------
-                dest = os.path.join(stage, tail)
-                relocated = []
-
-                # Create a relevant subdirectory in the staging area.
-                tpl = self.cmds["remote"]
-                cmd = tpl.format(**self.params, command=f"mkdir -p {dest}")
-                start = datetime.datetime.now()
-                status, _, stderr, dur = execute(cmd, timeout=self.timeout)
-                for item in transfers:
-                    item.pre_start = start.timestamp()
-                    item.pre_duration = dur.total_seconds()
-                    item.status = status
-                    item.error = stderr
-                if status != 0:
-                    self._flush(transfers)
-                    msg = f"Command '{cmd}' failed with error: '{stderr}'"
-                    logger.warning(msg)
-                    continue
-
-                # 2. TRANSFER
-                # -----------
-                tpl = self.cmds["transfer"]
-                for batch, transfer in zip(batches, transfers):
-                    src = " ".join([os.path.join(head, tail, name)
-                                    for name in batch])
-                    cmd = tpl.format(**self.params, source=src, dest=dest)
-                    start = datetime.datetime.now()
-                    status, _, stderr, dur = execute(cmd, timeout=self.timeout)
-                    transfer.trans_start = start.timestamp()
-                    transfer.trans_duration = dur.total_seconds()
-                    transfer.status = status
-                    transfer.error = stderr
-
-                    if status != 0:
-                        self._flush([transfer])
-                        msg = f"command '{cmd}' failed with error: '{stderr}'"
-                        logger.warning(msg)
-                        continue
-
-                    # If transfer successfully, calculate transfer rate.
-                    transfer.rate = transfer.size / dur.total_seconds()  # B/s
-                    transfer.rate /= pow(1024, 2)                        # MB/s
-
-                    relocated.append((batch, transfer))
-
-                # Recreate lists without items corresponding to failed
-                # transfers.
-                batches, transfers = [], []
-                for batch, transfer in relocated:
-                    batches.append(batch)
-                    transfers.append(transfer)
-                if not batches:
-                    continue
-
-                # If files were transferred directly to the buffer on the
-                # endpoint site, skip the next step.
-                if stage == buffer:
-                    self._flush(transfers)
-                    continue
-
-                # 3. POST-TRANSFER actions
-                # ------------------------
-                dest = os.path.join(buffer, tail)
-                completed = []
-                total = datetime.timedelta()
-
-                # Create a relevant subdirectory in the buffer.
-                tpl = self.cmds["remote"]
-                cmd = tpl.format(**self.params, command=f"mkdir -p {dest}")
-                start = datetime.datetime.now()
-                status, _, stderr, dur = execute(cmd, timeout=self.timeout)
-                total += dur
-                for item in transfers:
-                    item.post_start = start.timestamp()
-                    item.post_duration = total
-                    item.status = status
-                    item.error = stderr
-
-                if status != 0:
-                    self._flush(transfers)
-                    msg = f"Command '{cmd}' failed with error: '{stderr}'"
-                    logger.warning(msg)
-                    continue
-
-                # Move files from the staging area to the buffer.
-                tpl = self.cmds["remote"]
-                for batch, transfer in zip(batches, transfers):
-                    src = " ".join([os.path.join(stage, tail, name)
-                                    for name in batch])
-                    cmd = tpl.format(**self.params, command=f"mv {src} {dest}")
-                    start = datetime.datetime.now()
-                    status, _, stderr, dur = execute(cmd, timeout=self.timeout)
-                    transfer.post_start = start.timestamp()
-                    transfer.post_duration = (total+dur).total_seconds()
-                    transfer.status = status
-                    transfer.error = stderr
-
-                    if status != 0:
-                        self._flush([transfer])
-                        msg = f"Command '{cmd}' failed with error: '{stderr}'"
-                        logger.warning(msg)
-                        continue
-
-                    completed.append(transfer)
-
-                self._flush([transfer for transfer in completed])
+            if status != 0:
+                self._flush([transfer])
+                msg = f"Moving '{' '.join(srcs)}' to '{dest}' failed " \
+                      f"with error: '{stderr}'"
+                logger.warning(msg)
+                return None
+            return transfer
+
+        results = await asyncio.gather(*[commit(batch, transfer)
+                                         for batch, transfer
+                                         in zip(batches, transfers)])
+        self._flush([transfer for transfer in results if transfer is not None])
+
+    async def _stripe(self, src, dest, size, checksum=None):
+        """Transfer a file in concurrently sent byte ranges.
+
+        Parameters
+        ----------
+        src : `str`
+            Path to the file.
+        dest : `str`
+            Destination directory on the endpoint site.
+        size : `int`
+            Size of the file in bytes.
+        checksum : `str`, optional
+            Checksum of the file.  If None, it will be calculated.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, output, error message, and duration.
+        """
+        start = datetime.datetime.now()
+        dst = os.path.join(dest, os.path.basename(src))
+
+        status, stdout, stderr, _ = await self.transport.allocate(dst, size)
+        if status != 0:
+            return status, stdout, stderr, datetime.datetime.now() - start
+
+        stripe = -(-size // self.num_stripes)
+        sends = [self.transport.send_range(src, dst, offset,
+                                           min(stripe, size - offset))
+                 for offset in range(0, size, stripe)]
+        results = await asyncio.gather(*sends)
+        errors = [result for result in results if result[0] != 0]
+        if errors:
+            stderr = "; ".join(result[2] for result in errors)
+            return errors[0][0], "", stderr, datetime.datetime.now() - start
+
+        status, stderr = await self._verify(src, dst, checksum)
+        return status, "", stderr, datetime.datetime.now() - start
+
+    async def _resume(self, src, dest, size, offset, checksum=None,
+                      msg=None):
+        """Resume an interrupted transfer of a file.
+
+        Only the bytes missing in the partial copy on the endpoint site are
+        sent.  If requested, the last bytes of the partial copy are compared
+        with the original first and the whole file is sent again if they do
+        not match.  Once complete, the checksum of the copy is verified.  If
+        the verification fails, the copy is truncated so that the next
+        attempt starts from scratch.
+
+        Parameters
+        ----------
+        src : `str`
+            Path to the file.
+        dest : `str`
+            Destination directory on the endpoint site.
+        size : `int`
+            Size of the file in bytes.
+        offset : `int`
+            Size of the partial copy of the file on the endpoint site.
+        checksum : `str`, optional
+            Checksum of the file.  If None, it will be calculated.
+        msg : `TransferMsg`, optional
+            Message describing the transfer where the number of bytes
+            actually sent will be recorded.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, output, error message, and duration.
+        """
+        start = datetime.datetime.now()
+        dst = os.path.join(dest, os.path.basename(src))
+
+        length = min(offset, self.resume_check)
+        if length > 0 and self.transport.supports("range_checksum"):
+            loop = asyncio.get_running_loop()
+            expected = await loop.run_in_executor(None, get_checksum, src,
+                                                  self.method, 4096,
+                                                  offset - length, length)
+            result = await self.transport.range_checksum(dst, offset - length,
+                                                         length, self.method)
+            status, actual, _, _ = result
+            if status != 0 or actual != expected:
+                logger.debug(f"Partial copy '{dst}' differs from the "
+                             f"original, sending the whole file.")
+                offset = 0
+
+        if offset < size:
+            result = await self.transport.send_range(src, dst, offset,
+                                                     size - offset)
+            status, stdout, stderr, _ = result
+            if status != 0:
+                return status, stdout, stderr, datetime.datetime.now() - start
+        if msg is not None:
+            msg.wire_size = size - offset
+        logger.debug(f"Resumed transfer of '{src}' at byte {offset}.")
+
+        status, stderr = await self._verify(src, dst, checksum)
+        if status != 0:
+            await self.transport.allocate(dst, 0)
+        return status, "", stderr, datetime.datetime.now() - start
+
+    async def _verify(self, src, dst, checksum=None):
+        """Verify the checksum of a file on the endpoint site.
+
+        The verification fails if the transport does not support
+        calculating checksums.
+
+        Parameters
+        ----------
+        src : `str`
+            Path to the original file.
+        dst : `str`
+            Path to the file on the endpoint site.
+        checksum : `str`, optional
+            Checksum of the original file calculated with BLAKE2 algorithm.
+            If None, or a different algorithm is used, it will be calculated.
+
+        Returns
+        -------
+        (int, str)
+            Status of the verification and an error message if it failed.
+        """
+        if not self.transport.supports("checksums"):
+            return errno.ENOTSUP, f"{dst}: checksums not supported"
+        if checksum is None or self.method != "blake2":
+            loop = asyncio.get_running_loop()
+            checksum = await loop.run_in_executor(None, get_checksum, src,
+                                                  self.method)
+        result = await self.transport.checksums([dst], method=self.method)
+        status, sums, stderr, _ = result
+        if status != 0:
+            return status, stderr
+        if sums.get(dst) != checksum:
+            return errno.EBADMSG, f"{dst}: checksum mismatch"
+        return 0, ""
+
+    async def _check(self, limit, head, tail, dest, names, checksums,
+                     transfers):
+        """Verify checksums of transferred files on the endpoint site.
+
+        Checksums of all files are calculated with a single call to the
+        transport.  Its duration is included in the transfer duration.
+
+        Parameters
+        ----------
+        limit : asyncio.Semaphore
+            Semaphore limiting the number of concurrently running operations.
+        head : `str`
+            Top directory of the files on the handoff site.
+        tail : `str`
+            Subdirectory of the files, relative to the top directory.
+        dest : `str`
+            Directory with the files on the endpoint site.
+        names : `list` [`str`]
+            Names of the files to verify.
+        checksums : `dict`
+            Checksums of the original files, keyed by file names.  If a
+            checksum is None, it will be calculated.
+        transfers : `list` [`TransferMsg`]
+            Messages describing the transfers of the files.
+
+        Returns
+        -------
+        `dict`
+            Errors of the files which failed the verification, keyed by file
+            names.
+        """
+        if not names:
+            return {}
+        start = datetime.datetime.now()
+
+        # Checksums stored in the database are calculated with BLAKE2, for
+        # any other algorithm the checksums need to be calculated anew.
+        expected = {fn: checksums.get(fn) for fn in names}
+        if self.method != "blake2":
+            expected = dict.fromkeys(names)
+        missing = [fn for fn, value in expected.items() if value is None]
+        if missing:
+            loop = asyncio.get_running_loop()
+            tasks = [loop.run_in_executor(None, get_checksum,
+                                          os.path.join(head, tail, fn),
+                                          self.method)
+                     for fn in missing]
+            expected.update(zip(missing, await asyncio.gather(*tasks)))
+
+        paths = {fn: os.path.join(dest, fn) for fn in names}
+        op = self.transport.checksums
+        _, sums, stderr, _ = await self._call(limit, op, list(paths.values()),
+                                              self.method)
+        failures = {}
+        for fn, path in paths.items():
+            if path not in sums:
+                failures[fn] = f"{path}: checksum not available"
+            elif sums[path] != expected[fn]:
+                failures[fn] = f"{path}: checksum mismatch"
+
+        duration = (datetime.datetime.now() - start).total_seconds()
+        for transfer in transfers:
+            transfer.trans_duration += duration
+        if failures:
+            logger.warning(f"Verification of {len(failures)} file(s) in "
+                           f"'{dest}' failed.")
+        return failures
+
+    def _reject(self, batches, transfers, failures, sizes):
+        """Report files which failed the verification.
+
+        Parameters
+        ----------
+        batches : `list` [`list` [`str`]]
+            Names of the files in each transfer.
+        transfers : `list` [`TransferMsg`]
+            Messages describing the transfers.
+        failures : `dict`
+            Errors of the files which failed the verification, keyed by file
+            names.
+        sizes : `dict`
+            Sizes of the files, keyed by file names.
+
+        Returns
+        -------
+        `tuple` [`list`, `list`]
+            Batches and messages of the transfers with the remaining files.
+        """
+        remaining = ([], [])
+        for batch, transfer in zip(batches, transfers):
+            errors = {fn: failures[fn] for fn in batch if fn in failures}
+            if not errors:
+                remaining[0].append(batch)
+                remaining[1].append(transfer)
+                continue
+            failed = self._detach(transfer, errors, sizes)
+            failed.status = errno.EBADMSG
+            self._flush([failed])
+            batch = [fn for fn in batch if fn not in errors]
+            if batch:
+                remaining[0].append(batch)
+                remaining[1].append(transfer)
+        return remaining
+
+    async def _call(self, limit, op, *args):
+        """Perform a transport operation once a slot for it becomes available.
+
+        Parameters
+        ----------
+        limit : asyncio.Semaphore
+            Semaphore limiting the number of concurrently running operations.
+        op : callable
+            The transport operation to perform.
+        *args
+            Arguments of the operation.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, output, error message, and duration of the operation.
+        """
+        async with limit:
+            return await op(*args)
+
+    @staticmethod
+    def _detach(transfer, failures, sizes):
+        """Move files which failed to transfer to a separate message.
+
+        Parameters
+        ----------
+        transfer : `TransferMsg`
+            Message describing a partially successful transfer.  Files which
+            failed to transfer are removed from it.
+        failures : `dict`
+            Errors of the files which failed to transfer, keyed by file names.
+        sizes : `dict`
+            Sizes of the files, keyed by file names.
+
+        Returns
+        -------
+        `TransferMsg`
+            Message describing the failed transfer of the remaining files.
+        """
+        failed = transfer.copy()
+        failed.files = tuple(f for f in transfer.files if f[2] in failures)
+        failed.size = sum(sizes[f[2]] for f in failed.files)
+        failed.status = errno.EREMOTEIO
+        failed.error = "; ".join(sorted(set(failures.values())))
+        failed.wire_size = None
+        failed.checksums = None
+        failed.failures = dict(failures)
+
+        transfer.files = tuple(f for f in transfer.files
+                               if f[2] not in failures)
+        transfer.size = sum(sizes[f[2]] for f in transfer.files)
+        transfer.failures = None
+        return failed
 
     def _flush(self, items):
         """Enqueue messages in the output queue.
@@ -274,12 +923,53 @@ class Porter(Command):
             List of items to enqueue in the output queue.
         """
         for item in items:
+            if self.breaker is not None:
+                self.breaker.record(item.status == 0)
             self.done.put(item)
 
+    def _collect(self):
+        """Remove all files from the input queue for inspection.
+
+        Files are not recorded as served by the queues collecting statistics
+        as they will be either put back or reported as transferred.
+
+        Returns
+        -------
+        `list` [`FileMsg`]
+            Files removed from the queue.
+        """
+        if isinstance(self.todo, (Lanes, Scheduler)):
+            return self.todo.drain()
+        files = []
+        while not self.todo.empty():
+            files.extend(get_chunk(self.todo, size=1000))
+        return files
+
+    def _drain(self):
+        """Remove all files from the input queue.
+        """
+        count = 0
+        while True:
+            try:
+                self.todo.get_nowait()
+            except queue.Empty:
+                break
+            count += 1
+        if count:
+            logger.warning(f"Endpoint unavailable, transfers of {count} "
+                           f"file(s) postponed.")
+
 
 class Wiper(Command):
     """Command removing empty directories from the staging area.
 
+    If a queue with directories used by `Porter` is provided, only these
+    directories and their parents within the staging area are removed, if
+    empty, deepest first with a single call to the transport.  The entire
+    staging area is swept for empty directories only once per
+    'sweep_interval' seconds (defaults to 3600), starting with the first
+    run.  Otherwise, it is swept every time the command runs.
+
     Parameters
     ----------
     config : dict
@@ -289,6 +979,8 @@ class Wiper(Command):
         Time (in seconds) after which the child process executing a bash
         command will be terminated. If None (default), the command will wait
         indefinitely for the child process to complete.
+    staged : queue.Queue, optional
+        Directories in the staging area used during transfers.
 
     Raises
     ------
@@ -296,72 +988,37 @@ class Wiper(Command):
         If endpoint's specification is invalid.
     """
 
-    def __init__(self, config, timeout=None):
-        required = {"user", "host", "commands"}
-        missing = required - set(config)
-        if missing:
-            msg = f"Invalid configuration: {', '.join(missing)} not provided."
-            logger.critical(msg)
-            raise ValueError(msg)
-
-        self.cmds = config["commands"]
-        self.params = {k: v for k, v in config.items() if k != "commands"}
-
-        self.stage = self.params.get("staging", None)
-
-        self.time = timeout
+    def __init__(self, config, timeout=None, staged=None):
+        self.stage = config.get("staging", None)
+        self.transport = get_transport(config, timeout=timeout)
+        self.staged = staged
+        self.sweep_interval = config.get("sweep_interval", 3600)
+        self.last_sweep = None
 
     def run(self):
         """Remove empty directories from the staging area.
         """
         if self.stage is None:
             return
-        tpl = self.cmds["remote"]
-        args = dict(command=f"find {self.stage} -type d -empty -mindepth 1 "
-                            f"-delete")
-        cmd = tpl.format(**self.params, **args)
-        status, _, stderr, _ = execute(cmd, timeout=self.time)
+        dirs = set()
+        if self.staged is not None:
+            while not self.staged.empty():
+                path = os.path.relpath(self.staged.get(), start=self.stage)
+                while path not in ("", ".") and not path.startswith(".."):
+                    dirs.add(os.path.join(self.stage, path))
+                    path = os.path.dirname(path)
+
+        now = time.monotonic()
+        if self.staged is None or self.last_sweep is None or \
+                now - self.last_sweep >= self.sweep_interval:
+            self.last_sweep = now
+            coro = self.transport.cleanup(self.stage)
+        elif dirs:
+            paths = sorted(dirs, key=lambda p: (-p.count(os.sep), p))
+            coro = self.transport.cleanup(self.stage, dirs=paths)
+        else:
+            return
+        status, _, stderr, _ = asyncio.run(coro)
         if status != 0:
-            msg = f"Command '{cmd}' failed with error: '{stderr}'"
+            msg = f"Cleaning up '{self.stage}' failed with error: '{stderr}'"
             logger.warning(msg)
-
-
-def execute(cmd, timeout=None):
-    """Run a shell command.
-
-    Parameters
-    ----------
-    cmd : basestring
-        String representing the command, its options and arguments.
-    timeout : int, optional
-        Time (in seconds) after which the child process executing a bash
-        command will be terminated. If None (default), the command will wait
-        indefinitely for the child process to complete.
-
-    Returns
-    -------
-    (int, str, str, datetime.timedelta)
-        Shell command exit status, stdout, stderr, and duration.
-    """
-    logger.debug(f"Executing {cmd}.")
-
-    start = datetime.datetime.now()
-    args = shlex.split(cmd)
-    opts = dict(capture_output=True, timeout=timeout, check=True, text=True)
-    try:
-        proc = subprocess.run(args, **opts)
-    except subprocess.CalledProcessError as ex:
-        status = errno.EREMOTEIO
-        stdout, stderr = ex.stdout, ex.stderr
-    except subprocess.TimeoutExpired as ex:
-        status = errno.ETIME
-        stdout, stderr = ex.stdout, ex.stderr
-    else:
-        status = proc.returncode
-        stdout, stderr = proc.stdout, proc.stderr
-    end = datetime.datetime.now()
-    duration = end - start
-
-    logger.debug(f"Execution completed in {duration.total_seconds()}: "
-                 f"(status: {status}, output: '{stdout}', error: '{stderr}').")
-    return status, stdout, stderr, duration
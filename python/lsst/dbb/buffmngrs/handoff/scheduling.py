@@ -0,0 +1,506 @@
+# This file is part of dbb_buffmngrs_handoff.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Scheduling of pending file transfers.
+"""
+
+import fnmatch
+import heapq
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from .catalog import Catalog
+from .utils import get_chunk
+
+
+__all__ = ["Lanes", "Scheduler"]
+
+
+logger = logging.getLogger(__name__)
+
+
+class Lanes:
+    """Pending files divided into transfer lanes by their sizes.
+
+    Each lane holds files not larger than its 'max_size' (in bytes), the
+    last lane, without the limit, holds the remaining ones.  Every lane gets
+    a share of transfer workers proportional to its 'share' (defaults to 1),
+    but at least one if there are enough workers, and may define its own
+    'chunk_size'.  A worker takes files from its own lane first and borrows
+    them from other lanes, smaller files first, only when its lane is empty.
+    That way a burst of large files cannot occupy all workers while small
+    files are waiting.
+
+    Lanes can be used in place of a `queue.Queue` holding pending files.
+    In that case, files are taken from the lane with the smallest files
+    first.
+
+    Parameters
+    ----------
+    config : `list` [`dict`]
+        Specifications of the lanes.
+    factory : callable, optional
+        A function creating the queue of a lane, defaults to `queue.Queue`.
+
+    Raises
+    ------
+    ValueError
+        If the specifications are invalid.
+    """
+
+    def __init__(self, config, factory=queue.Queue):
+        if not config:
+            msg = "Invalid configuration: no lanes specified."
+            logger.critical(msg)
+            raise ValueError(msg)
+        specs = sorted(config, key=lambda s: (s.get("max_size") is None,
+                                              s.get("max_size") or 0))
+        if any(spec.get("max_size") is None for spec in specs[:-1]):
+            msg = "Invalid configuration: only one lane can have no max_size."
+            logger.critical(msg)
+            raise ValueError(msg)
+        self.names = [spec["name"] for spec in specs]
+        if len(set(self.names)) != len(self.names):
+            msg = "Invalid configuration: lane names are not unique."
+            logger.critical(msg)
+            raise ValueError(msg)
+        self.limits = [spec.get("max_size") for spec in specs]
+        self.shares = [spec.get("share", 1) for spec in specs]
+        self.chunk_sizes = {spec["name"]: spec.get("chunk_size")
+                            for spec in specs}
+        self.queues = {name: factory() for name in self.names}
+
+        self._lock = threading.Lock()
+        self._slots = []
+
+    def put(self, item, block=True, timeout=None):
+        """Add a file to the lane matching its size.
+
+        Parameters
+        ----------
+        item : `FileMsg`
+            The file to add.
+        block : `bool`, optional
+            Ignored, lanes are unbounded.
+        timeout : `float`, optional
+            Ignored, lanes are unbounded.
+        """
+        self.queues[self.classify(item.size)].put(item)
+
+    def get(self, block=True, timeout=None):
+        """Remove and return a file, smaller files first.
+
+        Parameters
+        ----------
+        block : `bool`, optional
+            Ignored, the method never blocks.
+        timeout : `float`, optional
+            Ignored, the method never blocks.
+
+        Raises
+        ------
+        queue.Empty
+            If all lanes are empty.
+        """
+        for name in self.names:
+            try:
+                return self.queues[name].get(block=False)
+            except queue.Empty:
+                continue
+        raise queue.Empty
+
+    def get_nowait(self):
+        """Remove and return a file without blocking.
+
+        Equivalent to ``get(block=False)``.
+
+        Raises
+        ------
+        queue.Empty
+            If there are no files.
+        """
+        return self.get(block=False)
+
+    def drain(self):
+        """Remove and return all files without recording their waiting times.
+
+        Returns
+        -------
+        `list` [`FileMsg`]
+            Files from all lanes, the lane with the smallest files first.
+        """
+        files = []
+        for name in self.names:
+            q = self.queues[name]
+            if isinstance(q, Scheduler):
+                files.extend(q.drain())
+                continue
+            while not q.empty():
+                files.extend(get_chunk(q, size=1000))
+        return files
+
+    def empty(self):
+        """Check if all lanes are empty.
+
+        Returns
+        -------
+        `bool`
+            True if there are no files in any lane, False otherwise.
+        """
+        return all(q.empty() for q in self.queues.values())
+
+    def qsize(self):
+        """Return the approximate number of files in all lanes.
+
+        Returns
+        -------
+        `int`
+            Number of files.
+        """
+        return sum(q.qsize() for q in self.queues.values())
+
+    def set_oldest_first(self, enabled):
+        """Switch between priority and oldest-first ordering in all lanes.
+
+        It has no effect on lanes which files are not kept in priority
+        queues.
+
+        Parameters
+        ----------
+        enabled : `bool`
+            If True, files are ordered by their timestamps only.
+        """
+        for q in self.queues.values():
+            if isinstance(q, Scheduler):
+                q.set_oldest_first(enabled)
+
+    def report(self):
+        """Log statistics of the lanes, if their queues collect any.
+        """
+        for name in self.names:
+            q = self.queues[name]
+            if isinstance(q, (Catalog, Scheduler)):
+                q.report(prefix=f"Lane '{name}': ")
+
+    def classify(self, size):
+        """Find the lane for a file of a given size.
+
+        Parameters
+        ----------
+        size : `int`
+            Size of the file in bytes.  If None, the file is assigned to the
+            first lane.
+
+        Returns
+        -------
+        `str`
+            Name of the lane.
+        """
+        if size is not None:
+            for name, limit in zip(self.names, self.limits):
+                if limit is None or size <= limit:
+                    return name
+        return self.names[0] if size is None else self.names[-1]
+
+    def plan(self, num_workers):
+        """Divide transfer workers between lanes.
+
+        Each lane gets at least one worker if there are enough of them, the
+        remaining ones are distributed proportionally to the lane shares.
+
+        Parameters
+        ----------
+        num_workers : `int`
+            Number of transfer workers.
+
+        Returns
+        -------
+        `dict`
+            Number of workers per lane.
+        """
+        counts = dict.fromkeys(self.names, 0)
+        if num_workers >= len(self.names):
+            counts = dict.fromkeys(self.names, 1)
+        left = num_workers - sum(counts.values())
+        total = sum(self.shares)
+        quotas = {name: left * share / total
+                  for name, share in zip(self.names, self.shares)}
+        for name in counts:
+            counts[name] += int(quotas[name])
+        left = num_workers - sum(counts.values())
+        remainders = sorted(self.names, reverse=True,
+                            key=lambda n: quotas[n] - int(quotas[n]))
+        for name in remainders[:left]:
+            counts[name] += 1
+
+        with self._lock:
+            self._slots = [name for name in self.names
+                           for _ in range(counts[name])]
+        logger.debug(f"Workers per lane: {counts}.")
+        return counts
+
+    def assign(self):
+        """Assign a worker to a lane according to the current plan.
+
+        Returns
+        -------
+        `str`
+            Name of the lane.  If no slots are left, it is the first lane.
+        """
+        with self._lock:
+            return self._slots.pop(0) if self._slots else self.names[0]
+
+    def take(self, lane, size=10):
+        """Take files for a worker of a given lane.
+
+        Parameters
+        ----------
+        lane : `str`
+            Name of the lane of the worker.
+        size : `int`, optional
+            Number of files to take, unless the lane defines its own chunk
+            size.  Defaults to 10.
+
+        Returns
+        -------
+        `list` [`FileMsg`]
+            Files taken from the worker's lane or, if it is empty, from the
+            first non-empty lane.
+        """
+        names = [lane] + [name for name in self.names if name != lane]
+        for name in names:
+            q, n = self.queues[name], self.chunk_sizes[name] or size
+            if isinstance(q, Catalog):
+                files = q.take(size=n)
+            else:
+                files = get_chunk(q, size=n)
+            if files:
+                if name != lane:
+                    logger.debug(f"Worker of lane '{lane}' borrowed "
+                                 f"{len(files)} file(s) from lane '{name}'.")
+                return files
+        return []
+
+
+class Scheduler:
+    """Priority queue of pending files.
+
+    The priority of a file is determined by the first rule which pattern
+    matches its path relative to the buffer.  Files are taken from the queue
+    in the order of their keys, the lowest first, where the key of a file is
+    its timestamp (e.g., modification time) reduced by its priority
+    multiplied by 'aging' seconds (defaults to 60).  Hence, a file with
+    priority higher by one is taken before the files which are not older
+    than 'aging' seconds, but a file waiting long enough is eventually
+    taken before files with higher priorities, i.e., it never starves.
+
+    If the rule defines a 'deadline' (in seconds after the timestamp), the
+    key of the file is never larger than its deadline reduced by 'horizon'
+    seconds (defaults to 3600).
+
+    Under pressure, the scheduler can be switched to order files by their
+    timestamps only, the oldest first (see `set_oldest_first`).
+
+    Files which do not match any rule have priority 0.  For each rule, and
+    the files not matching any of them, the time the files spent waiting
+    since their timestamp till they were taken from the queue is collected
+    and logged by `report`.
+
+    The scheduler can be used in place of a `queue.Queue`.
+
+    Parameters
+    ----------
+    config : `dict`
+        Configuration of the scheduler.
+    """
+
+    def __init__(self, config):
+        settings = {
+            "rules": [],
+            "aging": 60,
+            "horizon": 3600,
+        }
+        settings.update(config)
+        self.rules = [(rule.get("name", rule["pattern"]), rule["pattern"],
+                       rule.get("priority", 0), rule.get("deadline"))
+                      for rule in settings["rules"]]
+        self.aging = settings["aging"]
+        self.horizon = settings["horizon"]
+        self.oldest_first = False
+
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def put(self, item, block=True, timeout=None):
+        """Add a file to the queue.
+
+        Parameters
+        ----------
+        item : `FileMsg`
+            The file to add.
+        block : `bool`, optional
+            Ignored, the queue is unbounded.
+        timeout : `float`, optional
+            Ignored, the queue is unbounded.
+        """
+        name, key = self.prioritize(item)
+        with self._lock:
+            entry = (key, next(self._counter), name, item)
+            heapq.heappush(self._heap, entry)
+
+    def get(self, block=True, timeout=None):
+        """Remove and return the file with the lowest key.
+
+        Parameters
+        ----------
+        block : `bool`, optional
+            Ignored, the method never blocks.
+        timeout : `float`, optional
+            Ignored, the method never blocks.
+
+        Raises
+        ------
+        queue.Empty
+            If the queue is empty.
+        """
+        with self._lock:
+            if not self._heap:
+                raise queue.Empty
+            _, _, name, item = heapq.heappop(self._heap)
+            if item.timestamp is not None:
+                wait = max(time.time() - item.timestamp, 0.0)
+                stats = self._stats.setdefault(name, [0, 0.0, 0.0])
+                stats[0] += 1
+                stats[1] += wait
+                stats[2] = max(stats[2], wait)
+        return item
+
+    def get_nowait(self):
+        """Remove and return a file without blocking.
+
+        Equivalent to ``get(block=False)``.
+
+        Raises
+        ------
+        queue.Empty
+            If there are no files.
+        """
+        return self.get(block=False)
+
+    def drain(self):
+        """Remove and return all files without recording their waiting times.
+
+        Returns
+        -------
+        `list` [`FileMsg`]
+            Files in the order they would be taken from the queue.
+        """
+        with self._lock:
+            entries, self._heap = self._heap, []
+        return [item for _, _, _, item in sorted(entries)]
+
+    def empty(self):
+        """Check if the queue is empty.
+
+        Returns
+        -------
+        `bool`
+            True if there are no files in the queue, False otherwise.
+        """
+        with self._lock:
+            return not self._heap
+
+    def qsize(self):
+        """Return the number of files in the queue.
+
+        Returns
+        -------
+        `int`
+            Number of files.
+        """
+        with self._lock:
+            return len(self._heap)
+
+    def set_oldest_first(self, enabled):
+        """Switch between priority and oldest-first ordering of files.
+
+        Parameters
+        ----------
+        enabled : `bool`
+            If True, files are ordered by their timestamps only, rules are
+            ignored.
+        """
+        with self._lock:
+            if enabled == self.oldest_first:
+                return
+            self.oldest_first = enabled
+            entries = [(self.prioritize(item)[1], count, name, item)
+                       for _, count, name, item in self._heap]
+            heapq.heapify(entries)
+            self._heap = entries
+        logger.info(f"Oldest-first ordering "
+                    f"{'enabled' if enabled else 'disabled'}.")
+
+    def prioritize(self, item):
+        """Find the class and the key of a file.
+
+        Parameters
+        ----------
+        item : `FileMsg`
+            The file.
+
+        Returns
+        -------
+        `tuple` [`str`, `float`]
+            Name of the class of the file and its key.
+        """
+        path = os.path.join(item.tail or "", item.name or "")
+        name, priority, deadline = "default", 0, None
+        for rule, pattern, value, limit in self.rules:
+            if fnmatch.fnmatch(path, pattern):
+                name, priority, deadline = rule, value, limit
+                break
+        stamp = item.timestamp if item.timestamp is not None else time.time()
+        if self.oldest_first:
+            return name, stamp
+        key = stamp - priority * self.aging
+        if deadline is not None:
+            key = min(key, stamp + deadline - self.horizon)
+        return name, key
+
+    def report(self, prefix=""):
+        """Log and reset waiting time statistics of the classes of files.
+
+        Parameters
+        ----------
+        prefix : `str`, optional
+            Text prepended to each message, empty by default.
+        """
+        with self._lock:
+            stats, self._stats = self._stats, {}
+        for name, (count, total, longest) in sorted(stats.items()):
+            logger.info(f"{prefix}class '{name}': {count} file(s), "
+                        f"mean latency {total / count:.2f} sec., "
+                        f"max latency {longest:.2f} sec.")
@@ -0,0 +1,116 @@
+# This file is part of dbb_buffmngrs_handoff.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Detection and upgrade of outdated database schemas.
+"""
+
+import logging
+from sqlalchemy import inspect, text
+from .declaratives import MOVED, Base
+
+
+__all__ = ["check_schema", "upgrade_schema"]
+
+
+logger = logging.getLogger(__name__)
+
+
+def check_schema(engine):
+    """Find the parts of the schema missing in the database.
+
+    Parameters
+    ----------
+    engine : `sqlalchemy.engine.Engine`
+        Engine connected to the database.
+
+    Returns
+    -------
+    tables : `list` [`str`]
+        Names of the missing tables.
+    columns : `list` [`sqlalchemy.Column`]
+        Columns missing in the existing tables.
+    indexes : `list` [`sqlalchemy.Index`]
+        Indexes missing in the existing tables.
+    """
+    inspector = inspect(engine)
+    existing = set(inspector.get_table_names())
+    tables, columns, indexes = [], [], []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            tables.append(table.name)
+            continue
+        names = {c["name"] for c in inspector.get_columns(table.name)}
+        columns.extend(c for c in table.columns if c.name not in names)
+        names = {i["name"] for i in inspector.get_indexes(table.name)}
+        indexes.extend(i for i in table.indexes if i.name not in names)
+    return tables, columns, indexes
+
+
+def upgrade_schema(engine):
+    """Bring the schema of an existing database up to date.
+
+    Missing columns are added to the existing tables and missing indexes are
+    created.  Files registered before their states were recorded are marked
+    as moved if they were already moved to the holding area, and as
+    registered otherwise.
+
+    Parameters
+    ----------
+    engine : `sqlalchemy.engine.Engine`
+        Engine connected to the database.
+
+    Returns
+    -------
+    `list` [`str`]
+        Descriptions of the applied changes.
+
+    Raises
+    ------
+    ValueError
+        If some tables do not exist at all.
+    """
+    tables, columns, indexes = check_schema(engine)
+    if tables:
+        msg = f"missing table(s): {', '.join(tables)}, initialize " \
+              f"the database first"
+        logger.critical(msg)
+        raise ValueError(msg)
+    changes = []
+    with engine.begin() as conn:
+        for column in columns:
+            table = column.table.name
+            type_ = column.type.compile(dialect=engine.dialect)
+            ddl = f"ALTER TABLE {table} ADD COLUMN {column.name} {type_}"
+            default = column.default
+            if default is not None and default.is_scalar:
+                ddl += f" DEFAULT '{default.arg}'"
+            if not column.nullable:
+                ddl += " NOT NULL"
+            conn.execute(text(ddl))
+            changes.append(f"added column {table}.{column.name}")
+            if table == "files" and column.name == "state":
+                conn.execute(text(f"UPDATE files SET state = '{MOVED}' "
+                                  f"WHERE held_on IS NOT NULL"))
+        for index in indexes:
+            index.create(bind=conn)
+            changes.append(f"created index {index.name}")
+    for change in changes:
+        logger.info(f"Upgraded database schema: {change}.")
+    return changes
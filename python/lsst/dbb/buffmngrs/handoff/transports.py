@@ -0,0 +1,1254 @@
+# This file is part of dbb_buffmngrs_handoff.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Definitions of methods of delivering files to the endpoint site.
+"""
+
+import asyncio
+import concurrent.futures
+import datetime
+import errno
+import gzip
+import importlib
+import logging
+import os
+import re
+import tarfile
+import zlib
+from .abcs import Transport
+from .engine import execute_async
+from .utils import copy_file, copy_range, get_checksum, get_hasher
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+__all__ = ["LocalTransport", "ShellTransport", "TarTransport",
+           "get_transport"]
+
+
+logger = logging.getLogger(__name__)
+keywords = {"batch", "command", "dest", "file"}
+
+
+class ShellTransport(Transport):
+    """Transport delivering files with user-specified shell commands.
+
+    Files are sent to the endpoint site with the command defined as
+    'transfer' in the configuration.  Any other operations are performed by
+    executing shell commands with the command defined as 'remote'.
+
+    Checksums of multiple files are calculated in a single remote invocation
+    by a pool of 'checksum_workers' (defaults to 4) processes running on the
+    endpoint site.  Copies of files already present on the endpoint site are
+    made by remote commands handling up to 'link_chunk_size' (defaults to
+    100) files each, so the commands do not exceed the shell limits.
+
+    Transfers are monitored for progress if 'stall_timeout' is set.  The
+    transfer command is terminated if it makes no progress for that many
+    seconds.  By default, any output of the command counts as a progress.
+    If 'progress' is set, only the output matching this regular expression
+    does, e.g., percentages reported by the transfer tool.  Data streamed to
+    the endpoint site count as a progress as well.  If 'min_rate' (in MB/s)
+    is set, the timeout of a transfer is extended proportionally to the
+    amount of data to send.
+
+    Parameters
+    ----------
+    config : `dict`
+        Configuration of the endpoint.
+    timeout : `int`, optional
+        Time (in seconds) after which the child process executing a bash
+        command will be terminated. If None (default), the command will wait
+        indefinitely for the child process to complete.
+
+    Raises
+    ------
+    ValueError
+        If endpoint's specification is invalid.
+    """
+
+    tools = {
+        "blake2": "b2sum",
+        "md5": "md5sum",
+        "sha1": "sha1sum",
+    }
+    """Shell commands calculating checksums with supported algorithms.
+    """
+
+    def __init__(self, config, timeout=None):
+        required = {"user", "host", "commands"}
+        missing = required - set(config)
+        if missing:
+            msg = f"Invalid configuration: {', '.join(missing)} not provided."
+            logger.critical(msg)
+            raise ValueError(msg)
+
+        self.cmds = dict(config["commands"])
+        self.params = {k: v for k, v in config.items() if k != "commands"}
+        self.timeout = timeout
+        self.workers = config.get("checksum_workers", 4)
+        self.link_chunk_size = config.get("link_chunk_size", 100)
+        self.stall_timeout = config.get("stall_timeout", None)
+        self.progress = config.get("progress", None)
+        self.min_rate = config.get("min_rate", None)
+        if self.progress is not None:
+            try:
+                self.progress = re.compile(self.progress)
+            except re.error as ex:
+                msg = f"Invalid configuration: progress: {ex}."
+                logger.critical(msg)
+                raise ValueError(msg)
+
+        # Verify if all parameters in use were provided.
+        actual = set(self.params)
+        for cmd in self.cmds.values():
+            formal = set(re.findall(r"{(\w+)}", cmd))
+            remaining = formal - actual
+            undefined = remaining - keywords
+            if undefined:
+                msg = f"parameters {', '.join(undefined)} are used, " \
+                      f"but not defined in '{cmd}'"
+                logger.error(msg)
+                raise ValueError(msg)
+
+        # If the source in the transfer command is specified with keyword
+        # 'file', a separate transfer attempt will be made for each file. If
+        # the keyword 'batch' is used instead a single transfer attempt will
+        # be made for multiple files when possible.
+        self.batch_mode = False
+        if "batch" in self.cmds.get("transfer", ""):
+            self.batch_mode = True
+
+        # Once the transfer mode set for future reference, replace 'file/batch'
+        # with generic 'source' to make generating concrete commands easier
+        # later on.
+        if "transfer" in self.cmds:
+            cmd = self.cmds["transfer"]
+            self.cmds["transfer"] = re.sub(r"(batch|file)", "source", cmd)
+
+    async def prepare_dirs(self, paths):
+        """Create directories on the endpoint site.
+
+        Parameters
+        ----------
+        paths : `list` [`str`]
+            Directories to create, including any missing parents.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, output, error message, and duration.
+        """
+        return await self.remote(f"mkdir -p {' '.join(paths)}")
+
+    async def send_batch(self, sources, dest, msg=None):
+        """Send files to a directory on the endpoint site.
+
+        Parameters
+        ----------
+        sources : `list` [`str`]
+            Files to send.
+        dest : `str`
+            Destination directory.
+        msg : `TransferMsg`, optional
+            Message describing the transfer, not used.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, output, error message, and duration.
+        """
+        tpl = self.cmds["transfer"]
+        cmd = tpl.format(**self.params, source=" ".join(sources), dest=dest)
+
+        # Keep track of the latest progress report of the transfer tool.
+        reports = [None]
+
+        def parse(text):
+            found = self.progress.findall(text)
+            if found:
+                reports[0] = (len(found), found[-1])
+
+        opts = dict(timeout=self.limit(_total_size(sources)),
+                    stall_timeout=self.stall_timeout)
+        if self.progress is not None:
+            opts.update(callback=parse, progress=lambda: reports[0])
+        return await execute_async(cmd, **opts)
+
+    async def commit_batch(self, sources, dest):
+        """Move files between directories on the endpoint site.
+
+        Parameters
+        ----------
+        sources : `list` [`str`]
+            Files to move.
+        dest : `str`
+            Destination directory.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, output, error message, and duration.
+        """
+        return await self.remote(f"mv {' '.join(sources)} {dest}")
+
+    async def cleanup(self, root, dirs=None):
+        """Remove empty directories on the endpoint site.
+
+        Parameters
+        ----------
+        root : `str`
+            Directory which subdirectories should be removed if empty.  The
+            directory itself is never removed.
+        dirs : `list` [`str`], optional
+            Subdirectories of the root to remove, if empty, in the given
+            order.  If None (default), all empty subdirectories are removed.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, output, error message, and duration.
+        """
+        if dirs is not None:
+            if not dirs:
+                return 0, "", "", datetime.timedelta()
+            return await self.remote(f"rmdir --ignore-fail-on-non-empty "
+                                     f"{' '.join(dirs)}")
+        return await self.remote(f"find {root} -type d -empty -mindepth 1 "
+                                 f"-delete")
+
+    async def remote(self, command):
+        """Execute a shell command on the endpoint site.
+
+        Parameters
+        ----------
+        command : `str`
+            The shell command to execute.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, output, error message, and duration.
+        """
+        tpl = self.cmds["remote"]
+        cmd = tpl.format(**self.params, command=command)
+        return await execute_async(cmd, timeout=self.timeout)
+
+    def limit(self, size):
+        """Calculate the timeout of a transfer.
+
+        Parameters
+        ----------
+        size : `int`
+            Number of bytes to transfer.
+
+        Returns
+        -------
+        `float` or None
+            Time (in seconds) after which the transfer will be terminated.
+            None if there is no limit.
+        """
+        if self.min_rate is None:
+            return self.timeout
+        return (self.timeout or 0) + size / (self.min_rate * pow(1024, 2))
+
+    async def stream(self, command, producer, *args, size=0):
+        """Execute a shell command on the endpoint site feeding it with data.
+
+        Parameters
+        ----------
+        command : `str`
+            The shell command to execute.  It reads the data from its stdin.
+        producer : callable
+            A function writing the data to a file object passed to it as its
+            first argument.  It runs in a separate thread.
+        *args
+            Additional arguments of the producer.
+        size : `int`, optional
+            Number of bytes the producer is expected to write, used to
+            calculate the timeout.  Defaults to 0.
+
+        Returns
+        -------
+        ((int, str, str, datetime.timedelta), int)
+            Exit status, output, error message, duration, and the number of
+            bytes sent.
+        """
+        def produce(pipe, *args):
+            with pipe:
+                producer(pipe, *args)
+
+        loop = asyncio.get_running_loop()
+        tpl = self.cmds["remote"]
+        cmd = tpl.format(**self.params, command=command)
+        rfd, wfd = os.pipe()
+        pipe = _CountingWriter(open(wfd, "wb"))
+        writer = loop.run_in_executor(None, produce, pipe, *args)
+        try:
+            result = await execute_async(cmd, timeout=self.limit(size),
+                                         stdin=rfd,
+                                         stall_timeout=self.stall_timeout,
+                                         progress=lambda: pipe.count)
+        finally:
+            os.close(rfd)
+        status, stdout, stderr, duration = result
+        try:
+            await writer
+        except BrokenPipeError as ex:
+            logger.debug(f"Streaming data to '{cmd}' interrupted: {ex}.")
+        except OSError as ex:
+            if status == 0:
+                status, stderr = _status(ex), str(ex)
+        return (status, stdout, stderr, duration), pipe.count
+
+    async def allocate(self, path, size):
+        """Create a file of a given size on the endpoint site.
+
+        Parameters
+        ----------
+        path : `str`
+            Path to the file.
+        size : `int`
+            Size of the file in bytes.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, output, error message, and duration.
+        """
+        return await self.remote(f"truncate -s {size} {path} && "
+                                 f"(fallocate -l {size} {path} || true)")
+
+    async def send_range(self, src, dst, offset, length):
+        """Send a range of bytes of a file to the endpoint site.
+
+        Parameters
+        ----------
+        src : `str`
+            Path to the source file.
+        dst : `str`
+            Path to the destination file on the endpoint site.
+        offset : `int`
+            Position of the first byte to send.
+        length : `int`
+            Number of bytes to send.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, output, error message, and duration.
+        """
+        command = f"dd of={dst} bs=1M seek={offset} oflag=seek_bytes " \
+                  f"conv=notrunc status=none"
+        result, count = await self.stream(command, _read_range,
+                                          src, offset, length, size=length)
+        status, stdout, stderr, duration = result
+        if status == 0 and count != length:
+            status = errno.EIO
+            stderr = f"{src}: sent {count} of {length} bytes"
+        return status, stdout, stderr, duration
+
+    async def checksums(self, paths, method="blake2"):
+        """Calculate checksums of files on the endpoint site.
+
+        Parameters
+        ----------
+        paths : `list` [`str`]
+            Paths to the files.
+        method : `str`, optional
+            Hashing algorithm to use, defaults to BLAKE2.
+
+        Returns
+        -------
+        (int, dict, str, datetime.timedelta)
+            Exit status, checksums keyed by paths, error message, and
+            duration.
+        """
+        # Each file is hashed by a separate process so lines of the output
+        # of concurrently running processes never interleave.
+        tool = self.tools.get(method, self.tools["blake2"])
+        cmd = f"echo {' '.join(paths)} | xargs -n 1 -P {self.workers} {tool}"
+        status, stdout, stderr, duration = await self.remote(cmd)
+        sums = {}
+        for line in stdout.splitlines():
+            try:
+                value, path = line.split(maxsplit=1)
+            except ValueError:
+                continue
+            sums[path.lstrip("*")] = value
+        return status, sums, stderr, duration
+
+    async def sizes(self, paths):
+        """Find out sizes of files on the endpoint site.
+
+        Parameters
+        ----------
+        paths : `list` [`str`]
+            Paths to the files.
+
+        Returns
+        -------
+        (int, dict, str, datetime.timedelta)
+            Exit status, sizes keyed by paths, error message, and duration.
+        """
+        if not paths:
+            return 0, {}, "", datetime.timedelta()
+        cmd = f"stat -c %s:%n {' '.join(paths)} 2>/dev/null || true"
+        status, stdout, stderr, duration = await self.remote(cmd)
+        sizes = {}
+        for line in stdout.splitlines():
+            try:
+                value, path = line.split(":", 1)
+                sizes[path] = int(value)
+            except ValueError:
+                continue
+        return status, sizes, stderr, duration
+
+    async def inventory(self, dirs):
+        """List files in directories on the endpoint site.
+
+        Parameters
+        ----------
+        dirs : `list` [`str`]
+            Directories to list.
+
+        Returns
+        -------
+        (int, dict, str, datetime.timedelta)
+            Exit status, sizes and modification times of the files keyed by
+            paths, error message, and duration.
+        """
+        if not dirs:
+            return 0, {}, "", datetime.timedelta()
+        cmd = f"find {' '.join(dirs)} -maxdepth 1 -type f " \
+              f"-exec stat -c %s:%Y:%n {{}} + 2>/dev/null || true"
+        status, stdout, stderr, duration = await self.remote(cmd)
+        files = {}
+        for line in stdout.splitlines():
+            try:
+                size, mtime, path = line.split(":", 2)
+                files[path] = (int(size), float(mtime))
+            except ValueError:
+                continue
+        return status, files, stderr, duration
+
+    async def link(self, pairs):
+        """Create copies of files already present on the endpoint site.
+
+        Parameters
+        ----------
+        pairs : `list` [`tuple` [`str`, `str`]]
+            Paths to the existing files and their copies.
+
+        Returns
+        -------
+        (int, set, str, datetime.timedelta)
+            Exit status, paths to the copies created, error message, and
+            duration.
+        """
+        status, done, errors = 0, set(), []
+        duration = datetime.timedelta()
+        size = self.link_chunk_size
+        for i in range(0, len(pairs), size):
+            chunk = pairs[i:i + size]
+            dirs = sorted({os.path.dirname(dst) for _, dst in chunk})
+            cmds = [f"mkdir -p {' '.join(dirs)}"]
+            for src, dst in chunk:
+                if src == dst:
+                    cmds.append(f"test -f {dst} && echo {dst}")
+                else:
+                    cmds.append(f"{{ ln -f {src} {dst} || "
+                                f"cp -p {src} {dst}; }} 2>/dev/null && "
+                                f"echo {dst}")
+            result = await self.remote("; ".join(cmds))
+            code, stdout, stderr, dur = result
+            status = status or code
+            done.update(stdout.splitlines())
+            if stderr:
+                errors.append(stderr)
+            duration += dur
+        return status, done, "; ".join(errors), duration
+
+    async def range_checksum(self, path, offset, length, method="blake2"):
+        """Calculate checksum of a range of bytes of a file on the endpoint.
+
+        Parameters
+        ----------
+        path : `str`
+            Path to the file.
+        offset : `int`
+            Position of the first byte of the range.
+        length : `int`
+            Number of bytes in the range.
+        method : `str`, optional
+            Hashing algorithm to use, defaults to BLAKE2.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, checksum, error message, and duration.
+        """
+        tool = self.tools.get(method, self.tools["blake2"])
+        cmd = f"dd if={path} bs=1M skip={offset} count={length} " \
+              f"iflag=skip_bytes,count_bytes status=none | {tool}"
+        status, stdout, stderr, duration = await self.remote(cmd)
+        value = stdout.split()[0] if stdout.split() else ""
+        return status, value, stderr, duration
+
+
+class TarTransport(ShellTransport):
+    """Transport streaming batches of files as tar archives.
+
+    All files in a batch are sent as a single tar stream, optionally
+    compressed, which is unpacked on the fly on the endpoint site by a tar
+    process started with the command defined as 'remote' in the
+    configuration.  The archive is generated in memory, no temporary files
+    are created.  Checksums of the files are calculated while they are
+    being streamed and compared with the expected ones, if known.
+
+    If the compression is set to 'auto', the decision whether to compress
+    a batch is made separately for each batch by compressing a sample of
+    bytes from each file.  The batch is compressed only if the sample
+    shrinks enough to make spending CPU time worthwhile.
+
+    Parameters
+    ----------
+    config : `dict`
+        Configuration of the endpoint.
+    timeout : `int`, optional
+        Time (in seconds) after which the child process executing a bash
+        command will be terminated. If None (default), the command will wait
+        indefinitely for the child process to complete.
+
+    Raises
+    ------
+    ValueError
+        If endpoint's specification is invalid.
+    """
+
+    modes = {
+        "none": ("w|", ""),
+        "gzip": ("w|", "-z"),
+        "zstd": ("w|", "--zstd"),
+    }
+    """Modes of the tar stream and the corresponding tar options.
+    """
+
+    level = 1
+    """Level of the gzip compression, the same the probe uses.
+    """
+
+    def __init__(self, config, timeout=None):
+        super().__init__(config, timeout=timeout)
+        self.batch_mode = True
+        self.compression = config.get("compression", "none")
+        if self.compression not in set(self.modes) | {"auto"}:
+            msg = f"unknown compression method: {self.compression}"
+            logger.critical(msg)
+            raise ValueError(msg)
+        if self.compression == "zstd" and zstandard is None:
+            msg = "zstd compression requires 'zstandard' package"
+            logger.critical(msg)
+            raise ValueError(msg)
+        self.codec = "zstd" if zstandard is not None else "gzip"
+        self.probe_size = config.get("probe_size", 65536)
+        self.probe_threshold = config.get("probe_threshold", 0.9)
+        self.method = config.get("checksum", "blake2")
+
+    async def send_batch(self, sources, dest, msg=None):
+        """Stream files to a directory on the endpoint site.
+
+        Parameters
+        ----------
+        sources : `list` [`str`]
+            Files to send.
+        dest : `str`
+            Destination directory.
+        msg : `TransferMsg`, optional
+            Message describing the transfer.  If provided, checksums of the
+            files, errors of files which were not extracted on the endpoint
+            site or whose checksums do not match the expected ones, and the
+            number of bytes sent are recorded in it.  Its checksums, if set,
+            are taken as the expected BLAKE2 checksums of the files.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, output, error message, and duration.
+        """
+        loop = asyncio.get_running_loop()
+        codec = self.compression
+        if codec == "auto":
+            ratio = await loop.run_in_executor(None, self._probe, sources)
+            codec = self.codec if ratio < self.probe_threshold else "none"
+            logger.debug(f"Compression ratio of the sample: {ratio:.2f}, "
+                         f"using '{codec}' compression.")
+
+        _, opt = self.modes[codec]
+        command = f"tar -x {opt} -v -C {dest}"
+        checksums = {}
+        result, count = await self.stream(command, self._write,
+                                          sources, checksums, codec,
+                                          size=_total_size(sources))
+        status, stdout, stderr, duration = result
+        known = {}
+        if msg is not None:
+            if self.method == "blake2":
+                known = msg.checksums or {}
+            msg.compression = codec
+            msg.wire_size = count
+
+        # Find out which files were extracted on the endpoint site.  In case
+        # of a failure, the last file tar reported might have not been
+        # extracted completely.
+        names = [os.path.basename(src) for src in sources]
+        extracted = [line.strip() for line in stdout.splitlines()
+                     if line.strip()]
+        if status != 0:
+            extracted = extracted[:-1]
+        delivered = set(extracted) & set(checksums)
+        errors = {}
+        if status != 0:
+            errors = {name: stderr for name in names
+                      if name not in delivered}
+
+        # Files which changed since their checksums were calculated were
+        # extracted, but are not the files the manager knows about.
+        for name in delivered:
+            value = known.get(name)
+            if value is not None and value != checksums[name]:
+                errors[name] = f"{os.path.join(dest, name)}: " \
+                               f"checksum mismatch"
+        delivered -= set(errors)
+        if msg is not None:
+            msg.checksums = {n: checksums[n] for n in delivered}
+        if errors and delivered:
+            if msg is not None:
+                msg.failures = errors
+            status = 0
+        elif errors and status == 0:
+            status = errno.EREMOTEIO
+            stderr = "; ".join(sorted(set(errors.values())))
+        return status, stdout, stderr, duration
+
+    def _probe(self, sources):
+        """Estimate how well files compress.
+
+        Parameters
+        ----------
+        sources : `list` [`str`]
+            Files to examine.
+
+        Returns
+        -------
+        `float`
+            Ratio of the compressed and the original size of a sample of
+            bytes taken from the beginning of each file.
+        """
+        compressor = zlib.compressobj(self.level)
+        original, compressed = 0, 0
+        for src in sources:
+            try:
+                with open(src, "rb") as f:
+                    data = f.read(self.probe_size)
+            except OSError:
+                continue
+            original += len(data)
+            compressed += len(compressor.compress(data))
+        compressed += len(compressor.flush())
+        return compressed / original if original else 1.0
+
+    def _write(self, pipe, sources, checksums, codec):
+        """Write files as a tar stream to a pipe.
+
+        Parameters
+        ----------
+        pipe : file object
+            The pipe to write to.
+        sources : `list` [`str`]
+            Files to write.
+        checksums : `dict`
+            Container where checksums of the files will be stored.
+        codec : `str`
+            Compression method to use.
+        """
+        mode, _ = self.modes[codec]
+        out = pipe
+        if codec == "zstd":
+            out = zstandard.ZstdCompressor().stream_writer(pipe)
+        elif codec == "gzip":
+            out = gzip.GzipFile(fileobj=pipe, mode="wb",
+                                compresslevel=self.level)
+        with tarfile.open(fileobj=out, mode=mode) as tar:
+            for src in sources:
+                name = os.path.basename(src)
+                info = tar.gettarinfo(src, arcname=name)
+                hasher = get_hasher(self.method)
+                with open(src, "rb") as f:
+                    tar.addfile(info, fileobj=_HashingReader(f, hasher))
+                checksums[name] = hasher.hexdigest()
+        if out is not pipe:
+            out.close()
+
+
+class LocalTransport(Transport):
+    """Transport delivering files to an endpoint mounted locally.
+
+    All operations are performed in-process: directories are created with
+    `os.makedirs`, data are copied with `os.copy_file_range` or
+    `os.sendfile` (i.e. without passing through the user space), and files
+    are moved from the staging area to the buffer with `os.replace`.
+    Copies of files already present on the endpoint are made by the worker
+    pool in chunks of 'link_chunk_size' (defaults to 100) files.
+
+    Parameters
+    ----------
+    config : `dict`
+        Configuration of the endpoint.
+    timeout : `int`, optional
+        Ignored, operations are not interrupted.
+    """
+
+    batch_mode = True
+
+    def __init__(self, config, timeout=None):
+        num_workers = config.get("copy_workers", 1)
+        self.pool = concurrent.futures.ThreadPoolExecutor(num_workers)
+        self.link_chunk_size = config.get("link_chunk_size", 100)
+
+    async def prepare_dirs(self, paths):
+        """Create directories.
+
+        Parameters
+        ----------
+        paths : `list` [`str`]
+            Directories to create, including any missing parents.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, output, error message, and duration.
+        """
+        def make(paths):
+            for path in paths:
+                os.makedirs(path, exist_ok=True)
+        return await self._call(make, paths)
+
+    async def send_batch(self, sources, dest, msg=None):
+        """Copy files to a directory.
+
+        Files are copied concurrently by the worker pool.
+
+        Parameters
+        ----------
+        sources : `list` [`str`]
+            Files to copy.
+        dest : `str`
+            Destination directory.
+        msg : `TransferMsg`, optional
+            Message describing the transfer, not used.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, output, error message, and duration.
+        """
+        loop = asyncio.get_running_loop()
+        start = datetime.datetime.now()
+        tasks = []
+        for src in sources:
+            dst = os.path.join(dest, os.path.basename(src))
+            tasks.append(loop.run_in_executor(self.pool, copy_file, src, dst))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        errors = [ex for ex in results if isinstance(ex, Exception)]
+        duration = datetime.datetime.now() - start
+        if errors:
+            return _status(errors[0]), "", "; ".join(map(str, errors)), \
+                duration
+        return 0, "", "", duration
+
+    async def commit_batch(self, sources, dest):
+        """Move files to a directory.
+
+        Parameters
+        ----------
+        sources : `list` [`str`]
+            Files to move.
+        dest : `str`
+            Destination directory located on the same filesystem.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, output, error message, and duration.
+        """
+        def move(sources, dest):
+            for src in sources:
+                os.replace(src, os.path.join(dest, os.path.basename(src)))
+        return await self._call(move, sources, dest)
+
+    async def cleanup(self, root, dirs=None):
+        """Remove empty directories.
+
+        Parameters
+        ----------
+        root : `str`
+            Directory which subdirectories should be removed if empty.  The
+            directory itself is never removed.
+        dirs : `list` [`str`], optional
+            Subdirectories of the root to remove, if empty, in the given
+            order.  If None (default), all empty subdirectories are removed.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, output, error message, and duration.
+        """
+        def remove(paths):
+            for path in paths:
+                try:
+                    os.rmdir(path)
+                except OSError as ex:
+                    if ex.errno not in (errno.ENOTEMPTY, errno.EEXIST,
+                                        errno.ENOENT):
+                        raise
+
+        def sweep(root):
+            for top, subdirs, _ in os.walk(root, topdown=False):
+                remove(os.path.join(top, name) for name in subdirs)
+
+        if dirs is not None:
+            return await self._call(remove, dirs)
+        return await self._call(sweep, root)
+
+    async def allocate(self, path, size):
+        """Create a file of a given size.
+
+        Parameters
+        ----------
+        path : `str`
+            Path to the file.
+        size : `int`
+            Size of the file in bytes.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, output, error message, and duration.
+        """
+        def alloc(path, size):
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                os.ftruncate(fd, size)
+                if hasattr(os, "posix_fallocate") and size > 0:
+                    try:
+                        os.posix_fallocate(fd, 0, size)
+                    except OSError:
+                        pass
+            finally:
+                os.close(fd)
+        return await self._call(alloc, path, size)
+
+    async def send_range(self, src, dst, offset, length):
+        """Copy a range of bytes between files.
+
+        Parameters
+        ----------
+        src : `str`
+            Path to the source file.
+        dst : `str`
+            Path to the destination file.
+        offset : `int`
+            Position of the first byte to copy.
+        length : `int`
+            Number of bytes to copy.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, output, error message, and duration.
+        """
+        def copy(src, dst, offset, length):
+            fd_in = os.open(src, os.O_RDONLY)
+            try:
+                fd_out = os.open(dst, os.O_WRONLY)
+                try:
+                    copied = copy_range(fd_in, fd_out, offset, length)
+                finally:
+                    os.close(fd_out)
+            finally:
+                os.close(fd_in)
+            if copied != length:
+                raise OSError(errno.EIO, f"incomplete copy ({copied} of "
+                                         f"{length} byte(s))", src)
+        return await self._call(copy, src, dst, offset, length)
+
+    async def checksums(self, paths, method="blake2"):
+        """Calculate checksums of files.
+
+        Parameters
+        ----------
+        paths : `list` [`str`]
+            Paths to the files.
+        method : `str`, optional
+            Hashing algorithm to use, defaults to BLAKE2.
+
+        Returns
+        -------
+        (int, dict, str, datetime.timedelta)
+            Exit status, checksums keyed by paths, error message, and
+            duration.
+        """
+        loop = asyncio.get_running_loop()
+        start = datetime.datetime.now()
+        tasks = [loop.run_in_executor(self.pool, get_checksum, path, method)
+                 for path in paths]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        sums = {path: value for path, value in zip(paths, results)
+                if not isinstance(value, Exception)}
+        errors = [ex for ex in results if isinstance(ex, Exception)]
+        duration = datetime.datetime.now() - start
+        if errors:
+            return _status(errors[0]), sums, "; ".join(map(str, errors)), \
+                duration
+        return 0, sums, "", duration
+
+    async def sizes(self, paths):
+        """Find out sizes of files.
+
+        Parameters
+        ----------
+        paths : `list` [`str`]
+            Paths to the files.
+
+        Returns
+        -------
+        (int, dict, str, datetime.timedelta)
+            Exit status, sizes keyed by paths, error message, and duration.
+        """
+        start = datetime.datetime.now()
+        sizes = {}
+        for path in paths:
+            try:
+                sizes[path] = os.stat(path).st_size
+            except OSError:
+                continue
+        return 0, sizes, "", datetime.datetime.now() - start
+
+    async def inventory(self, dirs):
+        """List files in directories.
+
+        Parameters
+        ----------
+        dirs : `list` [`str`]
+            Directories to list.
+
+        Returns
+        -------
+        (int, dict, str, datetime.timedelta)
+            Exit status, sizes and modification times of the files keyed by
+            paths, error message, and duration.
+        """
+        start = datetime.datetime.now()
+        files = {}
+        for path in dirs:
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.is_file(follow_symlinks=False):
+                            info = entry.stat(follow_symlinks=False)
+                            files[entry.path] = (info.st_size, info.st_mtime)
+            except OSError:
+                continue
+        return 0, files, "", datetime.datetime.now() - start
+
+    async def link(self, pairs):
+        """Create copies of existing files.
+
+        Parameters
+        ----------
+        pairs : `list` [`tuple` [`str`, `str`]]
+            Paths to the existing files and their copies.
+
+        Returns
+        -------
+        (int, set, str, datetime.timedelta)
+            Exit status, paths to the copies created, error message, and
+            duration.
+        """
+        def make(pairs):
+            done, errors = set(), []
+            for src, dst in pairs:
+                try:
+                    size = os.stat(src).st_size
+                    if os.path.abspath(src) != os.path.abspath(dst):
+                        os.makedirs(os.path.dirname(dst), exist_ok=True)
+                        if os.path.lexists(dst):
+                            os.remove(dst)
+                        try:
+                            os.link(src, dst)
+                        except OSError:
+                            if copy_file(src, dst) != size:
+                                raise OSError(errno.EIO, "incomplete copy",
+                                              dst)
+                except OSError as ex:
+                    errors.append(str(ex))
+                else:
+                    done.add(dst)
+            return done, errors
+
+        loop = asyncio.get_running_loop()
+        start = datetime.datetime.now()
+        size = self.link_chunk_size
+        tasks = [loop.run_in_executor(self.pool, make, pairs[i:i + size])
+                 for i in range(0, len(pairs), size)]
+        done, errors = set(), []
+        for chunk_done, chunk_errors in await asyncio.gather(*tasks):
+            done.update(chunk_done)
+            errors.extend(chunk_errors)
+        return 0, done, "; ".join(errors), datetime.datetime.now() - start
+
+    async def range_checksum(self, path, offset, length, method="blake2"):
+        """Calculate checksum of a range of bytes of a file.
+
+        Parameters
+        ----------
+        path : `str`
+            Path to the file.
+        offset : `int`
+            Position of the first byte of the range.
+        length : `int`
+            Number of bytes in the range.
+        method : `str`, optional
+            Hashing algorithm to use, defaults to BLAKE2.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, checksum, error message, and duration.
+        """
+        loop = asyncio.get_running_loop()
+        start = datetime.datetime.now()
+        try:
+            value = await loop.run_in_executor(self.pool, get_checksum, path,
+                                               method, 4096, offset, length)
+        except OSError as ex:
+            return _status(ex), "", str(ex), datetime.datetime.now() - start
+        return 0, value, "", datetime.datetime.now() - start
+
+    async def _call(self, func, *args):
+        """Run a function in the worker pool and time it.
+
+        Parameters
+        ----------
+        func : callable
+            The function to call.
+        *args
+            Arguments of the function.
+
+        Returns
+        -------
+        (int, str, str, datetime.timedelta)
+            Exit status, output, error message, and duration.
+        """
+        loop = asyncio.get_running_loop()
+        start = datetime.datetime.now()
+        try:
+            await loop.run_in_executor(self.pool, func, *args)
+        except OSError as ex:
+            status, stderr = _status(ex), str(ex)
+        else:
+            status, stderr = 0, ""
+        duration = datetime.datetime.now() - start
+        return status, "", stderr, duration
+
+
+registry = {
+    "local": LocalTransport,
+    "shell": ShellTransport,
+    "tar": TarTransport,
+}
+"""Transports which can be selected by name in the endpoint configuration.
+"""
+
+
+def get_transport(config, timeout=None):
+    """Create the transport selected in the endpoint configuration.
+
+    The transport is selected with the 'transport' setting which can be
+    either a name of a built-in transport or a fully qualified name of
+    a class implementing `Transport` interface, e.g.,
+    'mypackage.mymodule.MyTransport'.  If not set, `ShellTransport` is used.
+
+    Parameters
+    ----------
+    config : `dict`
+        Configuration of the endpoint.
+    timeout : `int`, optional
+        Time (in seconds) after which the operations performed by the
+        transport will be terminated, if supported.
+
+    Returns
+    -------
+    `Transport`
+        The transport.
+
+    Raises
+    ------
+    ValueError
+        If the transport is unknown or invalid.
+    """
+    name = config.get("transport", "shell")
+    try:
+        class_ = registry[name]
+    except KeyError:
+        module_name, _, class_name = name.rpartition(".")
+        try:
+            module = importlib.import_module(module_name)
+            class_ = getattr(module, class_name)
+        except (ImportError, AttributeError, ValueError):
+            msg = f"unknown transport: {name}"
+            logger.critical(msg)
+            raise ValueError(msg)
+    if not (isinstance(class_, type) and issubclass(class_, Transport)):
+        msg = f"'{name}' is not a valid transport"
+        logger.critical(msg)
+        raise ValueError(msg)
+    return class_(config, timeout=timeout)
+
+
+class _CountingWriter:
+    """File-like object counting the bytes written through it.
+
+    Parameters
+    ----------
+    f : file object
+        File to write the data to.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, data):
+        n = self.f.write(data)
+        self.count += len(data)
+        return n
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class _HashingReader:
+    """File-like object calculating the hash of the data read through it.
+
+    Parameters
+    ----------
+    f : file object
+        File to read the data from.
+    hasher : hash object
+        Object the read data will be fed to.
+    """
+
+    def __init__(self, f, hasher):
+        self.f = f
+        self.hasher = hasher
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.hasher.update(data)
+        return data
+
+
+def _read_range(pipe, src, offset, length, block_size=1024 * 1024):
+    """Write a range of bytes of a file to a pipe.
+
+    Parameters
+    ----------
+    pipe : file object
+        The pipe to write to.
+    src : `str`
+        Path to the file.
+    offset : `int`
+        Position of the first byte to write.
+    length : `int`
+        Number of bytes to write.
+    block_size : `int`, optional
+        Maximal number of bytes to read at once, defaults to 1 MiB.
+    """
+    with open(src, "rb") as f:
+        f.seek(offset)
+        remaining = length
+        while remaining > 0:
+            data = f.read(min(block_size, remaining))
+            if not data:
+                break
+            pipe.write(data)
+            remaining -= len(data)
+
+
+def _total_size(paths):
+    """Calculate the total size of files.
+
+    Parameters
+    ----------
+    paths : `list` [`str`]
+        Paths to the files.  Files which cannot be accessed are ignored.
+
+    Returns
+    -------
+    `int`
+        Total size of the files in bytes.
+    """
+    total = 0
+    for path in paths:
+        try:
+            total += os.stat(path).st_size
+        except OSError:
+            continue
+    return total
+
+
+def _status(ex):
+    """Get a non-zero status corresponding to an exception.
+
+    Parameters
+    ----------
+    ex : Exception
+        The exception.
+
+    Returns
+    -------
+    `int`
+        Error number of the exception or EIO if it does not have any.
+    """
+    return getattr(ex, "errno", None) or errno.EIO
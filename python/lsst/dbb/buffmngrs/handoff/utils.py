@@ -21,24 +21,125 @@
 """A collection of general purpose functions.
 """
 
+import errno
 import hashlib
 import importlib
 import logging
+import os
 import queue
+import shutil
 import time
 from sqlalchemy import create_engine
 
 
 __all__ = [
+    "copy_file",
+    "copy_range",
     "get_checksum",
     "get_chunk",
+    "get_hasher",
     "run_continuously",
     "setup_db_conn",
     "setup_logging"
 ]
 
 
-def get_checksum(path, method='blake2', block_size=4096):
+def copy_file(src, dst):
+    """Copy a file without passing its content through the user space.
+
+    Parameters
+    ----------
+    src : `str`
+        Path to the source file.
+    dst : `str`
+        Path to the destination file.  It will be overwritten if it already
+        exists.
+
+    Returns
+    -------
+    `int`
+        Number of bytes copied, less than the size of the source file if
+        it was truncated while being copied.
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        copied = copy_range(fsrc.fileno(), fdst.fileno(), 0, size)
+    shutil.copymode(src, dst)
+    return copied
+
+
+def copy_range(fd_in, fd_out, offset, length):
+    """Copy a range of bytes between two files.
+
+    The bytes are copied with `os.copy_file_range` if supported by the
+    platform and the filesystems, with `os.sendfile` otherwise.  If neither
+    works, the data are copied through the user space.  The same offset is
+    used in both files.
+
+    Parameters
+    ----------
+    fd_in : `int`
+        File descriptor of the source file.
+    fd_out : `int`
+        File descriptor of the destination file.
+    offset : `int`
+        Position of the first byte to copy.
+    length : `int`
+        Number of bytes to copy.
+
+    Returns
+    -------
+    `int`
+        Number of bytes copied, less than 'length' if the end of the source
+        file was reached first.
+    """
+    fallbacks = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                 errno.EBADF}
+    pos, end = offset, offset + length
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            while pos < end:
+                n = os.copy_file_range(fd_in, fd_out, end - pos, pos, pos)
+                if n == 0:
+                    break
+                pos += n
+        except OSError as ex:
+            if ex.errno not in fallbacks:
+                raise
+        else:
+            return pos - offset
+
+    if hasattr(os, "sendfile"):
+        try:
+            os.lseek(fd_out, pos, os.SEEK_SET)
+            while pos < end:
+                n = os.sendfile(fd_out, fd_in, pos, end - pos)
+                if n == 0:
+                    break
+                pos += n
+        except OSError as ex:
+            if ex.errno not in fallbacks:
+                raise
+        else:
+            return pos - offset
+
+    os.lseek(fd_in, pos, os.SEEK_SET)
+    os.lseek(fd_out, pos, os.SEEK_SET)
+    while pos < end:
+        data = os.read(fd_in, min(end - pos, 1024 * 1024))
+        if not data:
+            break
+        view = memoryview(data)
+        while view:
+            n = os.write(fd_out, view)
+            view = view[n:]
+            pos += n
+    return pos - offset
+
+
+def get_checksum(path, method='blake2', block_size=4096, offset=0,
+                 length=None):
     """Calculate checksum for a file using BLAKE2 cryptographic hash function.
 
     Parameters
@@ -55,22 +156,53 @@ def get_checksum(path, method='blake2', block_size=4096):
         be used.
     block_size : `int`, optional
         Size of the block
+    offset : `int`, optional
+        Position of the first byte to hash, defaults to 0.
+    length : `int`, optional
+        Number of bytes to hash.  If None (default), bytes till the end of
+        the file are hashed.
 
     Returns
     -------
     `str`
         File's hash calculated using a given method.
     """
+    hasher = get_hasher(method)
+    with open(path, "rb") as f:
+        f.seek(offset)
+        remaining = length
+        while remaining is None or remaining > 0:
+            size = block_size if remaining is None \
+                else min(block_size, remaining)
+            chunk = f.read(size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return hasher.hexdigest()
+
+
+def get_hasher(method='blake2'):
+    """Create a hash object for a given algorithm.
+
+    Parameters
+    ----------
+    method : `str`
+        An algorithm to use, see `get_checksum` for supported ones.  If
+        unsupported method is provided, BLAKE2 algorithm will be used.
+
+    Returns
+    -------
+    hash object
+        Object calculating the hash of the data fed to it.
+    """
     methods = {
         'blake2': hashlib.blake2b,
         'md5': hashlib.md5,
         'sha1': hashlib.sha1,
     }
-    hasher = methods.get(method, hashlib.blake2b)()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(block_size), b""):
-            hasher.update(chunk)
-    return hasher.hexdigest()
+    return methods.get(method, hashlib.blake2b)()
 
 
 def get_chunk(q, size=10):
@@ -31,7 +31,70 @@ SCHEMA = {
             "type": "object",
             "properties": {
                 "buffer": {"type": "string"},
-                "holding": {"type": "string"}
+                "holding": {"type": "string"},
+                "move_workers": {
+                    "type": "integer",
+                    "minimum": 1
+                },
+                "sweep_interval": {
+                    "type": "number",
+                    "minimum": 0
+                },
+                "settle": {
+                    "anyOf": [
+                        {
+                            "type": "object",
+                            "properties": {
+                                "min_age": {
+                                    "type": "number",
+                                    "minimum": 0
+                                },
+                                "stable": {"type": "boolean"},
+                                "ignore": {
+                                    "type": "array",
+                                    "items": {"type": "string"}
+                                },
+                                "marker": {
+                                    "anyOf": [
+                                        {"type": "string", "minLength": 1},
+                                        {"type": "null"}
+                                    ]
+                                }
+                            }
+                        },
+                        {"type": "null"}
+                    ]
+                },
+                "reaper": {
+                    "anyOf": [
+                        {
+                            "type": "object",
+                            "properties": {
+                                "high_watermark": {
+                                    "type": "number",
+                                    "minimum": 0,
+                                    "maximum": 1
+                                },
+                                "low_watermark": {
+                                    "type": "number",
+                                    "minimum": 0,
+                                    "maximum": 1
+                                },
+                                "max_age": {
+                                    "anyOf": [
+                                        {"type": "number", "minimum": 0},
+                                        {"type": "null"}
+                                    ]
+                                },
+                                "batch_size": {
+                                    "type": "integer",
+                                    "minimum": 1
+                                }
+                            }
+                        },
+                        {"type": "null"}
+                    ]
+                }
             },
             "required": ["buffer", "holding"]
         },
@@ -41,6 +104,93 @@ SCHEMA = {
                 "user": {"type": "string"},
                 "host": {"type": "string"},
                 "buffer": {"type": "string"},
+                "staging": {"type": "string"},
+                "transport": {"type": "string"},
+                "compression": {
+                    "type": "string",
+                    "enum": ["none", "gzip", "zstd", "auto"]
+                },
+                "probe_size": {
+                    "type": "integer",
+                    "minimum": 1
+                },
+                "stripe_threshold": {
+                    "anyOf": [
+                        {"type": "integer", "minimum": 1},
+                        {"type": "null"}
+                    ]
+                },
+                "num_stripes": {
+                    "type": "integer",
+                    "minimum": 1
+                },
+                "resume": {"type": "boolean"},
+                "verify": {"type": "boolean"},
+                "precheck": {"type": "boolean"},
+                "dedup": {"type": "boolean"},
+                "circuit_breaker": {
+                    "anyOf": [
+                        {
+                            "type": "object",
+                            "properties": {
+                                "threshold": {
+                                    "type": "integer",
+                                    "minimum": 1
+                                },
+                                "backoff": {
+                                    "type": "number",
+                                    "minimum": 0
+                                },
+                                "max_backoff": {
+                                    "type": "number",
+                                    "minimum": 0
+                                },
+                                "factor": {
+                                    "type": "number",
+                                    "minimum": 1
+                                }
+                            }
+                        },
+                        {"type": "null"}
+                    ]
+                },
+                "stall_timeout": {
+                    "type": "number",
+                    "exclusiveMinimum": 0
+                },
+                "progress": {"type": "string"},
+                "min_rate": {
+                    "type": "number",
+                    "exclusiveMinimum": 0
+                },
+                "sweep_interval": {
+                    "type": "number",
+                    "minimum": 0
+                },
+                "checksum_workers": {
+                    "type": "integer",
+                    "minimum": 1
+                },
+                "resume_check": {
+                    "type": "integer",
+                    "minimum": 0
+                },
+                "checksum": {
+                    "type": "string",
+                    "enum": ["blake2", "md5", "sha1"]
+                },
+                "probe_threshold": {
+                    "type": "number",
+                    "exclusiveMinimum": 0
+                },
+                "copy_workers": {
+                    "type": "integer",
+                    "minimum": 1
+                },
+                "link_chunk_size": {
+                    "type": "integer",
+                    "minimum": 1
+                },
                 "commands": {
                     "type": "object",
                     "properties": {
@@ -50,7 +200,7 @@ SCHEMA = {
                     "required": ["remote", "transfer"]
                 }
             },
-            "required": ["user", "host", "buffer"]
+            "required": ["buffer"]
         },
         "logging": {
             "type": "object",
@@ -81,6 +231,10 @@ SCHEMA = {
                     "type": "integer",
                     "minimum": 1
                 },
+                "engine": {
+                    "type": "string",
+                    "enum": ["threads", "asyncio"]
+                },
                 "timeout": {
                     "anyOf": [
                         {"type": "integer", "minimum": 1},
@@ -94,6 +248,204 @@ SCHEMA = {
                 "pause": {
                     "type": "integer",
                     "minimum": 1
+                },
+                "catalog": {
+                    "anyOf": [
+                        {
+                            "type": "object",
+                            "properties": {
+                                "max_bytes": {
+                                    "anyOf": [
+                                        {"type": "integer", "minimum": 1},
+                                        {"type": "null"}
+                                    ]
+                                }
+                            }
+                        },
+                        {"type": "null"}
+                    ]
+                },
+                "budget": {
+                    "anyOf": [
+                        {
+                            "type": "object",
+                            "properties": {
+                                "max_files": {
+                                    "type": "integer",
+                                    "minimum": 1
+                                },
+                                "max_bytes": {
+                                    "type": "integer",
+                                    "minimum": 1
+                                },
+                                "max_time": {
+                                    "type": "number",
+                                    "minimum": 0
+                                },
+                                "queue_size": {
+                                    "type": "integer",
+                                    "minimum": 1
+                                }
+                            }
+                        },
+                        {"type": "null"}
+                    ]
+                },
+                "pressure": {
+                    "anyOf": [
+                        {
+                            "type": "object",
+                            "properties": {
+                                "elevated": {
+                                    "type": "number",
+                                    "minimum": 0,
+                                    "maximum": 1
+                                },
+                                "critical": {
+                                    "type": "number",
+                                    "minimum": 0,
+                                    "maximum": 1
+                                },
+                                "backlog_elevated": {
+                                    "anyOf": [
+                                        {"type": "integer", "minimum": 0},
+                                        {"type": "null"}
+                                    ]
+                                },
+                                "backlog_critical": {
+                                    "anyOf": [
+                                        {"type": "integer", "minimum": 0},
+                                        {"type": "null"}
+                                    ]
+                                },
+                                "boost": {
+                                    "type": "integer",
+                                    "minimum": 1
+                                },
+                                "signal_file": {
+                                    "anyOf": [
+                                        {"type": "string"},
+                                        {"type": "null"}
+                                    ]
+                                }
+                            }
+                        },
+                        {"type": "null"}
+                    ]
+                },
+                "priority": {
+                    "anyOf": [
+                        {
+                            "type": "object",
+                            "properties": {
+                                "rules": {
+                                    "type": "array",
+                                    "items": {
+                                        "type": "object",
+                                        "properties": {
+                                            "name": {"type": "string"},
+                                            "pattern": {"type": "string"},
+                                            "priority": {"type": "number"},
+                                            "deadline": {
+                                                "type": "number",
+                                                "minimum": 0
+                                            }
+                                        },
+                                        "required": ["pattern"]
+                                    }
+                                },
+                                "aging": {
+                                    "type": "number",
+                                    "exclusiveMinimum": 0
+                                },
+                                "horizon": {
+                                    "type": "number",
+                                    "minimum": 0
+                                }
+                            }
+                        },
+                        {"type": "null"}
+                    ]
+                },
+                "lanes": {
+                    "anyOf": [
+                        {
+                            "type": "array",
+                            "minItems": 1,
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "name": {"type": "string"},
+                                    "max_size": {
+                                        "anyOf": [
+                                            {"type": "integer",
+                                             "minimum": 0},
+                                            {"type": "null"}
+                                        ]
+                                    },
+                                    "share": {
+                                        "type": "number",
+                                        "exclusiveMinimum": 0
+                                    },
+                                    "chunk_size": {
+                                        "type": "integer",
+                                        "minimum": 1
+                                    }
+                                },
+                                "required": ["name"]
+                            }
+                        },
+                        {"type": "null"}
+                    ]
+                },
+                "autotune": {
+                    "anyOf": [
+                        {
+                            "type": "object",
+                            "properties": {
+                                "min_threads": {
+                                    "type": "integer",
+                                    "minimum": 1
+                                },
+                                "max_threads": {
+                                    "type": "integer",
+                                    "minimum": 1
+                                },
+                                "min_chunk_size": {
+                                    "type": "integer",
+                                    "minimum": 1
+                                },
+                                "max_chunk_size": {
+                                    "type": "integer",
+                                    "minimum": 1
+                                },
+                                "window": {
+                                    "type": "integer",
+                                    "minimum": 1
+                                },
+                                "error_threshold": {
+                                    "type": "number",
+                                    "minimum": 0,
+                                    "maximum": 1
+                                },
+                                "tolerance": {
+                                    "type": "number",
+                                    "minimum": 0,
+                                    "maximum": 1
+                                },
+                                "increase": {
+                                    "type": "integer",
+                                    "minimum": 1
+                                },
+                                "decrease": {
+                                    "type": "number",
+                                    "exclusiveMinimum": 0,
+                                    "exclusiveMaximum": 1
+                                }
+                            }
+                        },
+                        {"type": "null"}
+                    ]
                 }
             }
         }
@@ -0,0 +1,134 @@
+# This file is part of dbb_buffer_mngr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Benchmark of the memory used by queued messages.
+
+It compares the messages with the plain dataclasses they used to be.  Run it
+directly, e.g.::
+
+    python bench_messages.py --files 1000000
+"""
+
+import argparse
+import gc
+import os
+import queue
+import tracemalloc
+from dataclasses import dataclass
+from lsst.dbb.buffmngrs.handoff.messages import FileMsg, TransferMsg
+
+
+@dataclass
+class LegacyFileMsg:
+    head: str = None
+    tail: str = None
+    name: str = None
+    size: int = None
+    timestamp: float = None
+    checksum: str = None
+
+
+@dataclass
+class LegacyTransferMsg:
+    pre_start: float = None
+    pre_duration: float = None
+    trans_start: float = None
+    trans_duration: float = None
+    post_start: float = None
+    post_duration: float = None
+    size: int = None
+    wire_size: int = None
+    compression: str = None
+    rate: float = None
+    status: int = None
+    error: str = None
+    files: tuple = None
+    checksums: dict = None
+    failures: dict = None
+
+
+def measure(file_cls, transfer_cls, num_files, num_dirs, chunk_size):
+    """Measure the memory used by queues of file and transfer messages.
+
+    Parameters
+    ----------
+    file_cls : `type`
+        Class of file messages.
+    transfer_cls : `type`
+        Class of transfer messages.
+    num_files : `int`
+        Number of files.
+    num_dirs : `int`
+        Number of directories the files are spread across.
+    chunk_size : `int`
+        Number of files in a transfer batch.
+
+    Returns
+    -------
+    `tuple` [`int`, `int`]
+        Number of bytes used by the file and the transfer messages.
+    """
+    head = "/data/buffer"
+    gc.collect()
+    tracemalloc.start()
+    files = queue.Queue()
+    for i in range(num_files):
+        # Directory names are created anew for each file, as os.walk() and
+        # os.path.split() do.
+        tail = os.path.join("raw", f"{i % num_dirs:06d}")
+        files.put(file_cls(head=head, tail=tail, name=f"file{i:08d}.fits",
+                           size=i, timestamp=float(i)))
+    file_size, _ = tracemalloc.get_traced_memory()
+
+    transfers = queue.Queue()
+    items = list(files.queue)
+    items.sort(key=lambda item: (item.tail, item.name))
+    for i in range(0, num_files, chunk_size):
+        batch = items[i:i + chunk_size]
+        transfers.put(transfer_cls(
+            files=tuple((item.head, item.tail, item.name) for item in batch),
+            size=sum(item.size for item in batch), status=0))
+    del items, batch
+    total, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return file_size, total - file_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=10 ** 6,
+                        help="number of queued files")
+    parser.add_argument("--dirs", type=int, default=1000,
+                        help="number of directories")
+    parser.add_argument("--chunk-size", type=int, default=10,
+                        help="number of files in a transfer batch")
+    args = parser.parse_args()
+
+    mib = pow(1024, 2)
+    for label, classes in [("dataclasses", (LegacyFileMsg, LegacyTransferMsg)),
+                           ("slotted", (FileMsg, TransferMsg))]:
+        files, transfers = measure(*classes, args.files, args.dirs,
+                                   args.chunk_size)
+        print(f"{label:>12}: files {files / mib:8.1f} MiB, "
+              f"transfers {transfers / mib:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
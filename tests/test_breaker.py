@@ -0,0 +1,64 @@
+# This file is part of dbb_buffer_mngr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import unittest
+from lsst.dbb.buffmngrs.handoff.breaker import CircuitBreaker
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    """Test the circuit breaker guarding transfers.
+    """
+
+    def setUp(self):
+        self.config = dict(threshold=3, backoff=0, max_backoff=10, factor=2)
+
+    def testInvalidConfig(self):
+        """Test if CircuitBreaker complains about inconsistent settings.
+        """
+        config = dict(backoff=20, max_backoff=10)
+        self.assertRaises(ValueError, CircuitBreaker, config)
+
+    def testOpen(self):
+        """Test if CircuitBreaker opens after consecutive failures only.
+        """
+        breaker = CircuitBreaker(self.config)
+        for success in (False, False, True, False, False):
+            breaker.record(success)
+        self.assertTrue(breaker.closed)
+        breaker.record(False)
+        self.assertFalse(breaker.closed)
+
+    def testProbe(self):
+        """Test if probes back off and a successful one closes CircuitBreaker.
+        """
+        breaker = CircuitBreaker(self.config)
+        for _ in range(3):
+            breaker.record(False)
+        self.assertTrue(breaker.due())
+        breaker.probed(False)
+        self.assertEqual(breaker.delay, 0)
+        breaker.delay = 1
+        breaker.probed(False)
+        self.assertEqual(breaker.delay, 2)
+        self.assertFalse(breaker.due())
+        breaker.probed(True)
+        self.assertTrue(breaker.closed)
@@ -0,0 +1,95 @@
+# This file is part of dbb_buffer_mngr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import queue
+import unittest
+from unittest import mock
+from lsst.dbb.buffmngrs.handoff import catalog
+from lsst.dbb.buffmngrs.handoff.catalog import Catalog
+from lsst.dbb.buffmngrs.handoff.messages import FileMsg
+
+
+class CatalogTestCase(unittest.TestCase):
+    """Test the columnar catalog of pending files.
+    """
+
+    def setUp(self):
+        self.catalog = Catalog()
+        for tail, name, stamp in [("b", "x", 30.0), ("a", "y", 20.0),
+                                  ("b", "z", 10.0), ("a", "w", 40.0),
+                                  ("c", "x", 50.0)]:
+            self.catalog.put(FileMsg(head="/buffer", tail=tail, name=name,
+                                     size=100, timestamp=stamp,
+                                     checksum=f"{tail}{name}"))
+
+    def testQueue(self):
+        """Test if the catalog can be used as a queue.
+        """
+        self.assertEqual(self.catalog.qsize(), 5)
+        self.assertEqual(self.catalog.total(), 500)
+        msg = self.catalog.get()
+        self.assertEqual((msg.tail, msg.name), ("b", "z"))
+        self.assertEqual((msg.size, msg.timestamp), (100, 10.0))
+        self.assertEqual(msg.checksum, "bz")
+        while not self.catalog.empty():
+            self.catalog.get()
+        self.assertRaises(queue.Empty, self.catalog.get)
+        self.assertEqual(len(self.catalog.state), 0)
+
+    def testTake(self):
+        """Test if files are taken by directories, the oldest first.
+        """
+        batches = []
+        while not self.catalog.empty():
+            batch = self.catalog.take(size=10)
+            batches.append([(msg.tail, msg.name) for msg in batch])
+        self.assertEqual(batches, [[("b", "z"), ("b", "x")],
+                                   [("a", "y"), ("a", "w")],
+                                   [("c", "x")]])
+
+    def testMaxBytes(self):
+        """Test if batches do not exceed the byte budget.
+        """
+        self.catalog.max_bytes = 150
+        sizes = []
+        while not self.catalog.empty():
+            sizes.append(len(self.catalog.take(size=10)))
+        self.assertEqual(sizes, [1, 1, 1, 1, 1])
+
+    def testReplan(self):
+        """Test if files added between takes are taken in order.
+        """
+        self.catalog.take(size=10)
+        self.catalog.put(FileMsg(head="/buffer", tail="d", name="v",
+                                 size=100, timestamp=0.0))
+        self.assertEqual(len(self.catalog.state), 6)
+        batch = self.catalog.take(size=10)
+        self.assertEqual(len(self.catalog.state), 4)
+        self.assertEqual([(msg.tail, msg.name) for msg in batch],
+                         [("d", "v")])
+        self.assertEqual(self.catalog.qsize(), 3)
+        self.assertEqual(self.catalog.total(), 300)
+
+
+@mock.patch.object(catalog, "numpy", None)
+class PurePythonCatalogTestCase(CatalogTestCase):
+    """Test the columnar catalog of pending files without NumPy.
+    """
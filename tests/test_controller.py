@@ -0,0 +1,93 @@
+# This file is part of dbb_buffer_mngr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+from lsst.dbb.buffmngrs.handoff.controller import Controller
+from lsst.dbb.buffmngrs.handoff.messages import TransferMsg
+
+
+class ControllerTestCase(unittest.TestCase):
+    """Test the controller adjusting transfer settings.
+    """
+
+    def setUp(self):
+        self.config = dict(min_threads=1, max_threads=4,
+                           min_chunk_size=1, max_chunk_size=8)
+
+    def testInvalidConfig(self):
+        """Test if Controller complains about inconsistent bounds.
+        """
+        config = dict(min_threads=4, max_threads=2)
+        self.assertRaises(ValueError, Controller, config)
+
+    def testIncrease(self):
+        """Test if Controller grows settings when transfers succeed.
+        """
+        ctrl = Controller(self.config, num_threads=1, chunk_size=2)
+        for _ in range(10):
+            ctrl.observe(TransferMsg(size=1024, status=0))
+        threads, chunk_size = ctrl.update(1.0)
+        self.assertEqual(threads, 2)
+        self.assertEqual(chunk_size, 3)
+
+    def testDecrease(self):
+        """Test if Controller shrinks settings when transfers fail.
+        """
+        ctrl = Controller(self.config, num_threads=4, chunk_size=8)
+        for _ in range(10):
+            ctrl.observe(TransferMsg(size=1024, status=1))
+        threads, chunk_size = ctrl.update(1.0)
+        self.assertEqual(threads, 2)
+        self.assertEqual(chunk_size, 4)
+
+    def testSingleDecrease(self):
+        """Test if a single bad cycle causes a single decrease.
+        """
+        ctrl = Controller(self.config, num_threads=4, chunk_size=8)
+        ctrl.observe(TransferMsg(size=1024, status=1))
+        self.assertEqual(ctrl.update(1.0), (2, 4))
+        for _ in range(3):
+            ctrl.observe(TransferMsg(size=1024, status=0))
+            ctrl.update(1.0)
+        self.assertEqual((ctrl.num_threads, ctrl.chunk_size), (4, 7))
+
+    def testNothingSent(self):
+        """Test if transfers which sent no data are ignored.
+        """
+        ctrl = Controller(self.config, num_threads=2, chunk_size=2)
+        ctrl.observe(TransferMsg(size=1024, wire_size=0, status=0))
+        self.assertEqual(ctrl.update(1.0), (2, 2))
+
+    def testBounds(self):
+        """Test if Controller keeps settings within bounds.
+        """
+        ctrl = Controller(self.config, num_threads=4, chunk_size=8)
+        for _ in range(3):
+            ctrl.observe(TransferMsg(size=1024, status=0))
+            threads, chunk_size = ctrl.update(1.0)
+        self.assertEqual(threads, 4)
+        self.assertEqual(chunk_size, 8)
+
+    def testIdle(self):
+        """Test if Controller keeps settings when nothing was transferred.
+        """
+        ctrl = Controller(self.config, num_threads=2, chunk_size=2)
+        self.assertEqual(ctrl.update(1.0), (2, 2))
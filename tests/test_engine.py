@@ -0,0 +1,95 @@
+# This file is part of dbb_buffer_mngr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import errno
+import time
+import unittest
+from lsst.dbb.buffmngrs.handoff.engine import execute, execute_async
+
+
+class EngineTestCase(unittest.TestCase):
+    """Test the engine executing shell commands.
+    """
+
+    def testSuccess(self):
+        """Test if a successful command is reported correctly.
+        """
+        status, stdout, stderr, _ = execute("echo foo")
+        self.assertEqual(status, 0)
+        self.assertEqual(stdout, "foo\n")
+        self.assertEqual(stderr, "")
+
+    def testFailure(self):
+        """Test if a failed command is reported correctly.
+        """
+        status, _, stderr, _ = execute("sh -c 'echo bar >&2; exit 1'")
+        self.assertEqual(status, errno.EREMOTEIO)
+        self.assertEqual(stderr, "bar\n")
+
+    def testTimeout(self):
+        """Test if the whole process group is killed on timeout.
+        """
+        start = time.time()
+        status, _, _, _ = execute("sh -c 'sleep 30 & sleep 30'", timeout=1)
+        self.assertEqual(status, errno.ETIME)
+        self.assertLess(time.time() - start, 10)
+
+    def testCallback(self):
+        """Test if stderr is passed to the callback.
+        """
+        chunks = []
+        cmd = "sh -c 'echo baz >&2'"
+        coro = execute_async(cmd, callback=chunks.append)
+        asyncio.run(coro)
+        self.assertEqual("".join(chunks), "baz\n")
+
+    def testConcurrency(self):
+        """Test if commands run concurrently in a single event loop.
+        """
+        async def run():
+            cmds = [execute_async("sleep 1") for _ in range(10)]
+            return await asyncio.gather(*cmds)
+
+        start = time.time()
+        results = asyncio.run(run())
+        self.assertLess(time.time() - start, 5)
+        self.assertTrue(all(status == 0 for status, *_ in results))
+
+    def testStall(self):
+        """Test if a command making no progress is killed.
+        """
+        start = time.time()
+        cmd = "sh -c 'echo foo; sleep 30'"
+        coro = execute_async(cmd, stall_timeout=0.5)
+        status, stdout, _, _ = asyncio.run(coro)
+        self.assertEqual(status, errno.ETIMEDOUT)
+        self.assertEqual(stdout, "foo\n")
+        self.assertLess(time.time() - start, 10)
+
+    def testProgress(self):
+        """Test if a command making progress is not killed.
+        """
+        cmd = "sh -c 'for i in 1 2 3 4; do echo $i >&2; sleep 0.3; done'"
+        coro = execute_async(cmd, stall_timeout=1)
+        status, _, stderr, _ = asyncio.run(coro)
+        self.assertEqual(status, 0)
+        self.assertEqual(stderr, "1\n2\n3\n4\n")
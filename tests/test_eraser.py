@@ -20,6 +20,7 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import os
+import queue
 import shutil
 import tempfile
 import time
@@ -97,3 +98,30 @@ class EraserTestCase(unittest.TestCase):
                 dirs.append(d)
         self.assertEqual(len(dirs), 1)
 
+    def testTracked(self):
+        """Test if Eraser removes tracked directories without a full scan.
+        """
+        dirs = queue.Queue()
+        config = dict(buffer=self.dir, sweep_interval=3600)
+        cmd = Eraser(config, exp_time=1, dirs=dirs)
+        cmd.run()
+        self.assertIsNotNone(cmd.last_sweep)
+
+        parent = tempfile.mkdtemp(dir=self.dir)
+        child = tempfile.mkdtemp(dir=parent)
+        other = tempfile.mkdtemp(dir=self.dir)
+        dirs.put(child)
+        cmd.run()
+        self.assertIn(child, cmd.candidates)
+
+        time.sleep(2)
+        cmd.run()
+        self.assertFalse(os.path.exists(child))
+        self.assertTrue(os.path.exists(parent))
+        self.assertTrue(os.path.exists(other))
+        self.assertIn(parent, cmd.candidates)
+
+        time.sleep(2)
+        cmd.run()
+        self.assertEqual(os.listdir(self.dir), [os.path.basename(other)])
+        self.assertEqual(cmd.candidates, {})
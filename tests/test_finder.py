@@ -24,6 +24,7 @@ import os
 import queue
 import shutil
 import tempfile
+import time
 import unittest
 from lsst.dbb.buffmngrs.handoff import Finder
 
@@ -74,3 +75,122 @@ class ScannerTestCase(unittest.TestCase):
         s = Finder(config, self.queue)
         s.run()
         self.assertEqual(self.queue.qsize(), 3)
+
+    def testEmptySubdirs(self):
+        """Test if Scanner reports empty subdirectories.
+        """
+        empty = tempfile.mkdtemp(dir=self.root)
+        full = tempfile.mkdtemp(dir=self.root)
+        fd, _ = tempfile.mkstemp(dir=full)
+        os.close(fd)
+
+        dirs = queue.Queue()
+        config = dict(buffer=self.root)
+        s = Finder(config, self.queue, dirs=dirs)
+        s.run()
+        self.assertEqual(self.queue.qsize(), 1)
+        self.assertEqual(dirs.qsize(), 1)
+        self.assertEqual(dirs.get(), empty)
+
+    def testIgnored(self):
+        """Test if Scanner skips files matching the ignore patterns.
+        """
+        for name in ["a.fits", "b.fits.part", "c.tmp"]:
+            open(os.path.join(self.root, name), "w").close()
+
+        settle = dict(ignore=["*.part", "*.tmp"])
+        config = dict(buffer=self.root, settle=settle)
+        s = Finder(config, self.queue)
+        s.run()
+        self.assertEqual(self.queue.qsize(), 1)
+        self.assertEqual(self.queue.get().name, "a.fits")
+
+    def testMinAge(self):
+        """Test if Scanner defers files which are too young.
+        """
+        old = os.path.join(self.root, "old.fits")
+        new = os.path.join(self.root, "new.fits")
+        for path in [old, new]:
+            open(path, "w").close()
+        stamp = time.time() - 120
+        os.utime(old, (stamp, stamp))
+
+        config = dict(buffer=self.root, settle=dict(min_age=60))
+        s = Finder(config, self.queue)
+        s.run()
+        self.assertEqual(self.queue.qsize(), 1)
+        self.assertEqual(self.queue.get().name, "old.fits")
+
+    def testStable(self):
+        """Test if Scanner defers files which are still changing.
+        """
+        path = os.path.join(self.root, "file.fits")
+        with open(path, "w") as f:
+            f.write("a")
+
+        config = dict(buffer=self.root, settle=dict(stable=True))
+        s = Finder(config, self.queue)
+        s.run()
+        self.assertEqual(self.queue.qsize(), 0)
+
+        with open(path, "a") as f:
+            f.write("b")
+        s.run()
+        self.assertEqual(self.queue.qsize(), 0)
+
+        s.run()
+        self.assertEqual(self.queue.qsize(), 1)
+
+        os.remove(path)
+        s.run()
+        self.assertEqual(s.observed, {})
+
+    def testMarker(self):
+        """Test if Scanner waits for marker files.
+        """
+        for name in ["a.fits", "a.fits.done", "b.fits"]:
+            open(os.path.join(self.root, name), "w").close()
+
+        config = dict(buffer=self.root, settle=dict(marker=".done"))
+        s = Finder(config, self.queue)
+        s.run()
+        self.assertEqual(self.queue.qsize(), 1)
+        self.assertEqual(self.queue.get().name, "a.fits")
+
+    def testBudget(self):
+        """Test if Scanner resumes the scan when the budget is exhausted.
+        """
+        leaf = tempfile.mkdtemp(dir=self.root)
+        for i in range(5):
+            fd, _ = tempfile.mkstemp(dir=self.root if i % 2 else leaf)
+            os.close(fd)
+
+        config = dict(buffer=self.root)
+        s = Finder(config, self.queue, budget=dict(max_files=2))
+        names = set()
+        for expected in [2, 2, 1]:
+            s.run()
+            self.assertEqual(self.queue.qsize(), expected)
+            while not self.queue.empty():
+                names.add(self.queue.get().name)
+        self.assertEqual(len(names), 5)
+        self.assertIsNone(s.cursor)
+
+    def testBoundedQueue(self):
+        """Test if Scanner stops when the output queue is full.
+        """
+        for _ in range(3):
+            fd, _ = tempfile.mkstemp(dir=self.root)
+            os.close(fd)
+
+        bounded = queue.Queue(maxsize=2)
+        config = dict(buffer=self.root)
+        s = Finder(config, bounded)
+        s.run()
+        self.assertEqual(bounded.qsize(), 2)
+        s.run()
+        self.assertEqual(bounded.qsize(), 2)
+        bounded.get()
+        bounded.get()
+        s.run()
+        self.assertEqual(bounded.qsize(), 1)
@@ -0,0 +1,235 @@
+# This file is part of dbb_buffer_mngr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import queue
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from lsst.dbb.buffmngrs.handoff import Reaper, manager
+from lsst.dbb.buffmngrs.handoff.controller import Controller
+from lsst.dbb.buffmngrs.handoff.declaratives import (
+    Base, File, IN_FLIGHT, MOVED, REGISTERED, TRANSFERRED)
+from lsst.dbb.buffmngrs.handoff.manager import Manager
+from lsst.dbb.buffmngrs.handoff.messages import FileMsg, TransferMsg
+from lsst.dbb.buffmngrs.handoff.pressure import Monitor
+from lsst.dbb.buffmngrs.handoff.utils import get_checksum, setup_db_conn
+
+
+class ManagerTestCase(unittest.TestCase):
+    """Test keeping track of the states of files in the pipeline.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        dirs = {}
+        for name in ["buffer", "holding", "endpoint", "staging"]:
+            dirs[name] = os.path.join(self.root, name)
+            os.mkdir(dirs[name])
+        self.buffer = dirs["buffer"]
+        self.holding = dirs["holding"]
+        self.endpoint = dirs["endpoint"]
+
+        database = dict(engine=f"sqlite:///{self.root}/test.db")
+        Base.metadata.create_all(setup_db_conn(database))
+        config = dict(
+            database=database,
+            handoff=dict(buffer=dirs["buffer"], holding=dirs["holding"]),
+            endpoint=dict(buffer=dirs["endpoint"], staging=dirs["staging"],
+                          transport="local"),
+        )
+        self.manager = Manager(config)
+
+    def tearDown(self):
+        self.manager.session.close()
+        shutil.rmtree(self.root)
+
+    def makeFile(self, name, data=b"data", root=None):
+        path = os.path.join(root or self.buffer, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def makeRecord(self, name, state):
+        path = os.path.join(self.buffer, name)
+        status = os.stat(path)
+        rec = File(relpath="", filename=name, checksum=get_checksum(path),
+                   size_bytes=status.st_size,
+                   created_on=datetime.fromtimestamp(status.st_mtime),
+                   state=state)
+        self.manager.session.add(rec)
+        self.manager.session.commit()
+        return rec
+
+    def makeMsg(self, name):
+        status = os.stat(os.path.join(self.buffer, name))
+        return FileMsg(head=self.buffer, tail="", name=name,
+                       size=status.st_size, timestamp=status.st_mtime)
+
+    def testAddFiles(self):
+        """Test if known files are neither hashed nor queued twice.
+        """
+        mgr = self.manager
+        self.makeFile("a")
+        mgr.discovered.put(self.makeMsg("a"))
+        mgr._add_files(mgr.discovered, mgr.pending)
+        rec = mgr.session.query(File).one()
+        self.assertEqual(rec.state, IN_FLIGHT)
+        self.assertEqual(mgr.pending.get().name, "a")
+
+        with mock.patch.object(manager, "get_checksum") as hasher:
+            mgr.discovered.put(self.makeMsg("a"))
+            mgr._add_files(mgr.discovered, mgr.pending)
+            self.assertTrue(mgr.pending.empty())
+
+            mgr._release_files()
+            mgr.session.refresh(rec)
+            self.assertEqual(rec.state, REGISTERED)
+            mgr.discovered.put(self.makeMsg("a"))
+            mgr._add_files(mgr.discovered, mgr.pending)
+            self.assertEqual(mgr.pending.get().checksum, rec.checksum)
+            hasher.assert_not_called()
+
+    def testTransitions(self):
+        """Test if only allowed transitions are made, idempotently.
+        """
+        mgr = self.manager
+        self.makeFile("a")
+        rec = self.makeRecord("a", IN_FLIGHT)
+        mgr._transition([rec.id], MOVED)
+        mgr.session.commit()
+        mgr.session.refresh(rec)
+        self.assertEqual(rec.state, IN_FLIGHT)
+        for _ in range(2):
+            mgr._transition([rec.id], TRANSFERRED)
+            mgr.session.commit()
+            mgr.session.refresh(rec)
+            self.assertEqual(rec.state, TRANSFERRED)
+
+    def testAddTransfers(self):
+        """Test if only the latest entry of a file is marked transferred.
+        """
+        mgr = self.manager
+        self.makeFile("a")
+        old = self.makeRecord("a", REGISTERED)
+        new = self.makeRecord("a", IN_FLIGHT)
+        inp, out = queue.Queue(), queue.Queue()
+        inp.put(TransferMsg(files=((self.buffer, "", "a"),), pre_start=0.0,
+                            pre_duration=0.0, size=4, rate=1.0, status=0,
+                            error=""))
+        mgr._add_transfers(inp, out)
+        mgr.session.refresh(old)
+        mgr.session.refresh(new)
+        self.assertEqual((old.state, new.state), (REGISTERED, TRANSFERRED))
+        self.assertEqual((len(old.batches), len(new.batches)), (0, 1))
+        self.assertEqual(out.get().name, "a")
+
+    def testReapReplaced(self):
+        """Test if entries of replaced files do not cause removals.
+        """
+        mgr = self.manager
+        config = dict(holding=self.holding, reaper=dict(max_age=3600))
+        mgr.reaper = Reaper(config, mgr.expired, mgr.reaped)
+        path = self.makeFile("a", root=self.holding)
+        now = datetime.now()
+        for held_on in (now - timedelta(days=2), now):
+            rec = File(relpath="", filename="a", checksum="x", size_bytes=4,
+                       created_on=held_on, held_on=held_on, state=MOVED)
+            mgr.session.add(rec)
+        mgr.session.commit()
+        with mock.patch.object(mgr.reaper, "quota", return_value=0):
+            mgr._reap_files()
+        self.assertTrue(os.path.exists(path))
+        query = mgr.session.query(File).filter(File.deleted_on.isnot(None))
+        self.assertEqual(query.count(), 0)
+
+    def testUpdateFiles(self):
+        """Test if only the latest transferred entry of a file is moved.
+        """
+        mgr = self.manager
+        self.makeFile("a")
+        old = self.makeRecord("a", MOVED)
+        new = self.makeRecord("a", TRANSFERRED)
+        inp = queue.Queue()
+        inp.put(self.makeMsg("a"))
+        mgr._update_files(inp)
+        mgr.session.refresh(old)
+        mgr.session.refresh(new)
+        self.assertIsNone(old.held_on)
+        self.assertIsNotNone(new.held_on)
+        self.assertEqual(new.state, MOVED)
+
+    def testAdapt(self):
+        """Test if boosted number of threads respects the controller bounds.
+        """
+        mgr = self.manager
+        mgr.monitor = Monitor(dict(boost=4), self.buffer, self.buffer)
+        mgr.num_threads = 2
+        self.assertEqual(mgr._adapt("normal"), 2)
+        self.assertEqual(mgr._adapt("critical"), 8)
+        mgr.controller = Controller(dict(max_threads=5), num_threads=2,
+                                    chunk_size=10)
+        self.assertEqual(mgr._adapt("critical"), 5)
+
+    def testRecover(self):
+        """Test if the queues are rebuilt from the states of the files.
+        """
+        mgr = self.manager
+        for name in ["done", "sent", "todo", "changed"]:
+            self.makeFile(name)
+        self.makeFile("sent", root=self.endpoint)
+        self.makeRecord("done", TRANSFERRED)
+        self.makeRecord("sent", IN_FLIGHT)
+        todo = self.makeRecord("todo", REGISTERED)
+        self.makeRecord("changed", REGISTERED)
+        self.makeFile("changed", data=b"new data")
+        mgr._recover()
+
+        self.assertEqual(mgr.processed.get().name, "done")
+        self.assertTrue(mgr.processed.empty())
+        self.assertEqual(mgr.pending.get().name, "todo")
+        self.assertTrue(mgr.pending.empty())
+        msg = mgr.transfers.get()
+        self.assertEqual((msg.status, msg.files), (0, ((self.buffer, "",
+                                                        "sent"),)))
+        mgr.session.refresh(todo)
+        self.assertEqual(todo.state, IN_FLIGHT)
+
+    def testRecoverBounded(self):
+        """Test if no more files than the queues can hold are recovered.
+        """
+        mgr = self.manager
+        mgr.queue_size = 1
+        for name in ["a", "b"]:
+            self.makeFile(name)
+        first = self.makeRecord("a", IN_FLIGHT)
+        second = self.makeRecord("b", REGISTERED)
+        mgr.porter.ready = lambda: False
+        mgr._recover()
+
+        self.assertEqual(mgr.pending.get().name, "a")
+        self.assertTrue(mgr.pending.empty())
+        mgr.session.refresh(first)
+        mgr.session.refresh(second)
+        self.assertEqual(first.state, IN_FLIGHT)
+        self.assertEqual(second.state, REGISTERED)
@@ -0,0 +1,101 @@
+# This file is part of dbb_buffer_mngr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+from lsst.dbb.buffmngrs.handoff.messages import (
+    LOCATIONS, FileMsg, TransferMsg)
+
+
+class FileMsgTestCase(unittest.TestCase):
+    """Test the message describing a file.
+    """
+
+    def testSharedLocation(self):
+        """Test if messages share their directories.
+        """
+        a = FileMsg(head="/buffer", tail="raw", name="a")
+        b = FileMsg(head="/buffer", tail="".join(["r", "aw"]), name="b")
+        self.assertEqual(a.location, b.location)
+        self.assertIs(a.tail, b.tail)
+        self.assertFalse(hasattr(a, "__dict__"))
+
+    def testUnreferencedLocation(self):
+        """Test if directories no message refers to are dropped.
+        """
+        kept = FileMsg(head="/buffer", tail="raw", name="c")
+        count = len(LOCATIONS)
+        msg = FileMsg(head="/buffer", tail="unreferenced", name="a")
+        other = FileMsg(head="/buffer", tail="unreferenced", name="b")
+        self.assertEqual(len(LOCATIONS), count + 1)
+        del msg
+        self.assertEqual(len(LOCATIONS), count + 1)
+        other.tail = "raw"
+        self.assertEqual(len(LOCATIONS), count)
+        self.assertIs(other.location, kept.location)
+
+    def testSetters(self):
+        """Test if the directory of a file can be changed.
+        """
+        msg = FileMsg(head="/buffer", tail="raw", name="a")
+        msg.head = "/holding"
+        self.assertEqual((msg.head, msg.tail), ("/holding", "raw"))
+        msg.tail = "calib"
+        self.assertEqual((msg.head, msg.tail), ("/holding", "calib"))
+        self.assertEqual(msg.astuple(),
+                         ("/holding", "calib", "a", None, None, None))
+
+
+class TransferMsgTestCase(unittest.TestCase):
+    """Test the message describing a transfer batch.
+    """
+
+    def testSingleLocation(self):
+        """Test if a batch from a single directory keeps it only once.
+        """
+        files = (("/buffer", "raw", "a"), ("/buffer", "raw", "b"))
+        msg = TransferMsg(files=files, status=0)
+        self.assertIsNotNone(msg.location)
+        self.assertEqual(msg.names, ("a", "b"))
+        self.assertEqual(msg.files, files)
+
+    def testMixedLocations(self):
+        """Test if a batch with files from different directories is handled.
+        """
+        files = (("/buffer", "raw", "a"), ("/buffer", "calib", "b"))
+        msg = TransferMsg(files=files)
+        self.assertIsNone(msg.location)
+        self.assertEqual(msg.files, files)
+
+    def testCopy(self):
+        """Test if a copy of a message is independent of the original.
+        """
+        msg = TransferMsg(files=(("/buffer", "raw", "a"),), size=1)
+        other = msg.copy()
+        self.assertEqual(other, msg)
+        other.files = ()
+        other.size = 0
+        self.assertEqual(msg.files, (("/buffer", "raw", "a"),))
+        self.assertEqual(msg.size, 1)
+
+    def testUnknownField(self):
+        """Test if an unknown field is rejected.
+        """
+        self.assertRaises(TypeError, TransferMsg, foo=1)
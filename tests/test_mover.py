@@ -24,7 +24,8 @@ import queue
 import shutil
 import tempfile
 import unittest
-from lsst.dbb.buffmngrs.handoff import Mover
+from unittest import mock
+from lsst.dbb.buffmngrs.handoff import Mover, local
 from lsst.dbb.buffmngrs.handoff.messages import FileMsg
 
 
@@ -85,3 +86,73 @@ class MoverTestCase(unittest.TestCase):
         self.assertEqual(len(src), 0)
         self.assertEqual(len(dst), 1)
         self.assertEqual(ref, dst)
+
+    def testCrossDevice(self):
+        """Test if Mover copies files when devices differ.
+        """
+        path = next(iter(self.files))
+        with open(path, "wb") as f:
+            f.write(os.urandom(1000))
+        mode = os.stat(path).st_mode
+
+        config = dict(holding=self.dst, move_workers=2)
+        cmd = Mover(config, self.inp, self.out)
+        cmd.devices[self.src] = False
+        cmd.run()
+
+        self.assertFalse(os.path.exists(path))
+        name = os.path.basename(path)
+        copy = os.path.join(self.dst, name)
+        self.assertEqual(os.stat(copy).st_size, 1000)
+        self.assertEqual(os.stat(copy).st_mode, mode)
+        self.assertEqual(os.listdir(self.dst), [name])
+        self.assertEqual(self.out.get().head, self.dst)
+
+    def testIncompleteCopy(self):
+        """Test if Mover keeps a file whose copy is incomplete.
+        """
+        path = next(iter(self.files))
+        with open(path, "wb") as f:
+            f.write(os.urandom(1000))
+
+        def truncate(src, dst):
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                return fdst.write(fsrc.read(10))
+
+        config = dict(holding=self.dst)
+        cmd = Mover(config, self.inp, self.out)
+        cmd.devices[self.src] = False
+        with mock.patch.object(local, "copy_file", side_effect=truncate):
+            with self.assertLogs(level="WARNING") as cm:
+                cmd.run()
+        self.assertIn("incomplete copy", cm.output[0])
+
+        self.assertEqual(os.stat(path).st_size, 1000)
+        self.assertEqual(os.listdir(self.dst), [])
+        self.assertTrue(self.out.empty())
+
+    def testStaleCache(self):
+        """Test if Mover recreates cached directories which were removed.
+        """
+        config = dict(holding=self.dst)
+        cmd = Mover(config, self.inp, self.out)
+        cmd.dirs.add(os.path.join(self.dst, "sub"))
+        fd, path = tempfile.mkstemp(dir=self.src)
+        os.close(fd)
+        name = os.path.basename(path)
+        os.makedirs(os.path.join(self.src, "sub"))
+        os.rename(path, os.path.join(self.src, "sub", name))
+        self.inp.put(FileMsg(head=self.src, tail="sub", name=name))
+        cmd.run()
+
+        self.assertTrue(os.path.exists(os.path.join(self.dst, "sub", name)))
+        self.assertEqual(self.out.qsize(), 2)
+
+    def testEmptied(self):
+        """Test if Mover reports directories files were moved from.
+        """
+        dirs = queue.Queue()
+        config = dict(holding=self.dst)
+        cmd = Mover(config, self.inp, self.out, dirs=dirs)
+        cmd.run()
+        self.assertEqual(dirs.get(), self.src)
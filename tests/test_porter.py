@@ -25,7 +25,13 @@ import queue
 import shutil
 import tempfile
 import unittest
+from unittest import mock
 from lsst.dbb.buffmngrs.handoff import Porter
+from lsst.dbb.buffmngrs.handoff.catalog import Catalog
+from lsst.dbb.buffmngrs.handoff.messages import FileMsg, TransferMsg
+from lsst.dbb.buffmngrs.handoff.scheduling import Lanes, Scheduler
+from lsst.dbb.buffmngrs.handoff.transports import LocalTransport
+from lsst.dbb.buffmngrs.handoff.utils import get_checksum
 
 
 class PorterTestCase(unittest.TestCase):
@@ -56,6 +62,26 @@ class PorterTestCase(unittest.TestCase):
         shutil.rmtree(self.dst)
         shutil.rmtree(self.stg)
 
+    def makeQueue(self):
+        """Create a queue with messages describing all files in the buffer.
+        """
+        todo = queue.Queue()
+        for path in sorted(self.listFiles(self.src)):
+            tail, name = os.path.split(path)
+            size = os.stat(os.path.join(self.src, path)).st_size
+            todo.put(FileMsg(head=self.src, tail=tail, name=name, size=size))
+        return todo
+
+    @staticmethod
+    def listFiles(root):
+        """Find paths of all files in a directory, relative to it.
+        """
+        paths = set()
+        for top, subs, names in os.walk(root):
+            for name in names:
+                paths.add(os.path.relpath(os.path.join(top, name), root))
+        return paths
+
     def testInvalidConfig(self):
         """Test if Porter complains about an invalid configurations.
         """
@@ -79,14 +105,308 @@ class PorterTestCase(unittest.TestCase):
         cmd = Porter(config, self.todo, self.done)
         cmd.run()
 
-        src = set()
-        for top, subs, names in os.walk(self.src):
-            for name in names:
-                src.add(name)
-        dst = set()
-        for top, subs, names in os.walk(self.dst):
-            for name in names:
-                dst.add(name)
+        src = {os.path.basename(path) for path in self.listFiles(self.src)}
+        dst = {os.path.basename(path) for path in self.listFiles(self.dst)}
         self.assertEqual(src, dst)
         self.assertEqual(self.todo.qsize(), 0)
         self.assertEqual(self.done.qsize(), 3)
+
+    def testConcurrentRun(self):
+        """Test if Porter transfers files with concurrent workers.
+        """
+        todo = self.makeQueue()
+        commands = dict(remote="sh -c '{command}'",
+                        transfer="cp {file} {dest}")
+        config = dict(buffer=self.dst, staging=self.stg, user=self.user,
+                      host=self.host, commands=commands)
+        cmd = Porter(config, todo, self.done, concurrency=2)
+        cmd.run()
+
+        src = {os.path.basename(path) for path in self.listFiles(self.src)}
+        dst = {os.path.basename(path) for path in self.listFiles(self.dst)}
+        self.assertEqual(src, dst)
+        self.assertEqual(todo.qsize(), 0)
+        self.assertEqual(self.done.qsize(), 3)
+        while not self.done.empty():
+            self.assertEqual(self.done.get().status, 0)
+
+    def testLocalRun(self):
+        """Test if Porter transfers files to a locally mounted endpoint.
+        """
+        todo = self.makeQueue()
+        config = dict(buffer=self.dst, staging=self.stg, transport="local",
+                      copy_workers=2)
+        cmd = Porter(config, todo, self.done, chunk_size=3)
+        cmd.run()
+
+        self.assertEqual(self.listFiles(self.src), self.listFiles(self.dst))
+        self.assertEqual(self.done.qsize(), 2)
+        while not self.done.empty():
+            msg = self.done.get()
+            self.assertEqual(msg.status, 0)
+            self.assertIsNotNone(msg.trans_duration)
+            self.assertIsNotNone(msg.post_duration)
+
+    def testDetach(self):
+        """Test if files which failed to transfer are reported separately.
+        """
+        msg = TransferMsg(status=0, size=3,
+                          files=tuple((self.src, "", n) for n in "abc"))
+        sizes = dict(a=1, b=1, c=1)
+        failed = Porter._detach(msg, dict(b="error"), sizes)
+        self.assertEqual([f[2] for f in msg.files], ["a", "c"])
+        self.assertEqual(msg.size, 2)
+        self.assertEqual(msg.status, 0)
+        self.assertEqual([f[2] for f in failed.files], ["b"])
+        self.assertEqual(failed.size, 1)
+        self.assertNotEqual(failed.status, 0)
+        self.assertEqual(failed.error, "error")
+
+    def testStripedRun(self):
+        """Test if Porter transfers large files in stripes.
+        """
+        path = os.path.join(self.src, "large")
+        with open(path, "wb") as f:
+            f.write(os.urandom(1024 * 1024 + 17))
+        todo = self.makeQueue()
+        config = dict(buffer=self.dst, staging=self.stg, transport="local",
+                      stripe_threshold=1024, num_stripes=3)
+        cmd = Porter(config, todo, self.done, chunk_size=4)
+        cmd.run()
+
+        copy = os.path.join(self.dst, "large")
+        self.assertEqual(get_checksum(copy),
+                         get_checksum(os.path.join(self.src, "large")))
+        self.assertEqual(self.done.qsize(), 3)
+        while not self.done.empty():
+            self.assertEqual(self.done.get().status, 0)
+
+    def testRangesRequireChecksums(self):
+        """Test if files are neither striped nor resumed without checksums.
+        """
+        def supports(transport, name):
+            return name != "checksums"
+
+        config = dict(buffer=self.dst, staging=self.stg, transport="local",
+                      stripe_threshold=1024, resume=True)
+        with mock.patch.object(LocalTransport, "supports", supports):
+            cmd = Porter(config, self.todo, self.done)
+        self.assertIsNone(cmd.stripe_threshold)
+        self.assertFalse(cmd.resume)
+
+    def testResumedRun(self):
+        """Test if Porter resumes interrupted transfers.
+        """
+        path = os.path.join(self.src, "large")
+        with open(path, "wb") as f:
+            f.write(os.urandom(64 * 1024 + 17))
+        with open(path, "rb") as f:
+            data = f.read(10000)
+        with open(os.path.join(self.stg, "large"), "wb") as f:
+            f.write(data)
+        with open(os.path.join(self.stg, "stale"), "wb") as f:
+            f.write(b"x" * 100)
+        path = os.path.join(self.src, "stale")
+        with open(path, "wb") as f:
+            f.write(os.urandom(1000))
+
+        todo = queue.Queue()
+        for name in ("large", "stale"):
+            path = os.path.join(self.src, name)
+            msg = FileMsg(head=self.src, tail="", name=name,
+                          size=os.stat(path).st_size)
+            todo.put(msg)
+        config = dict(buffer=self.dst, staging=self.stg, transport="local",
+                      resume=True)
+        cmd = Porter(config, todo, self.done, chunk_size=2)
+        cmd.run()
+
+        sent = {}
+        while not self.done.empty():
+            msg = self.done.get()
+            self.assertEqual(msg.status, 0)
+            sent[msg.files[0][-1]] = msg.wire_size
+        self.assertEqual(sent, {"large": 64 * 1024 + 17 - 10000,
+                                "stale": 1000})
+        for name in ("large", "stale"):
+            self.assertEqual(get_checksum(os.path.join(self.dst, name)),
+                             get_checksum(os.path.join(self.src, name)))
+
+    def testVerifiedRun(self):
+        """Test if Porter moves only verified files to the buffer.
+        """
+        todo = queue.Queue()
+        for name in ("good", "bad"):
+            path = os.path.join(self.src, name)
+            with open(path, "wb") as f:
+                f.write(os.urandom(1000))
+            checksum = get_checksum(path) if name == "good" else "0" * 128
+            msg = FileMsg(head=self.src, tail="", name=name, size=1000,
+                          checksum=checksum)
+            todo.put(msg)
+        config = dict(buffer=self.dst, staging=self.stg, transport="local",
+                      verify=True)
+        cmd = Porter(config, todo, self.done, chunk_size=2)
+        cmd.run()
+
+        status = {}
+        while not self.done.empty():
+            msg = self.done.get()
+            for _, _, name in msg.files:
+                status[name] = msg.status
+        self.assertEqual(status["good"], 0)
+        self.assertNotEqual(status["bad"], 0)
+        self.assertTrue(os.path.exists(os.path.join(self.dst, "good")))
+        self.assertFalse(os.path.exists(os.path.join(self.dst, "bad")))
+
+    def testPrecheck(self):
+        """Test if Porter skips files already present in the buffer.
+        """
+        todo = queue.Queue()
+        for name in ("present", "changed", "missing"):
+            path = os.path.join(self.src, name)
+            with open(path, "wb") as f:
+                f.write(os.urandom(1000))
+            msg = FileMsg(head=self.src, tail="", name=name, size=1000,
+                          timestamp=os.stat(path).st_mtime)
+            todo.put(msg)
+        shutil.copy(os.path.join(self.src, "present"), self.dst)
+        with open(os.path.join(self.dst, "changed"), "wb") as f:
+            f.write(os.urandom(10))
+
+        config = dict(buffer=self.dst, staging=self.stg, transport="local",
+                      precheck=True)
+        cmd = Porter(config, todo, self.done)
+        cmd.precheck()
+
+        self.assertEqual(todo.qsize(), 2)
+        self.assertEqual(self.done.qsize(), 1)
+        msg = self.done.get()
+        self.assertEqual(msg.status, 0)
+        self.assertEqual(msg.wire_size, 0)
+        self.assertEqual(msg.files, ((self.src, "", "present"),))
+
+    def testCircuitBreaker(self):
+        """Test if Porter stops transferring files when the endpoint fails.
+        """
+        path = os.path.join(self.src, "blocker")
+        with open(path, "w") as f:
+            f.write("")
+        config = dict(buffer=self.dst, staging=path, transport="local",
+                      circuit_breaker=dict(threshold=1, backoff=60,
+                                           max_backoff=60))
+        containers = [queue.Queue(), Lanes([dict(name="all")]),
+                      Scheduler(dict()), Catalog()]
+        for todo in containers:
+            with self.subTest(todo=type(todo).__name__):
+                done = queue.Queue()
+                for name in ("a", "b", "c"):
+                    todo.put(FileMsg(head=self.src, tail="", name=name,
+                                     size=0))
+                if isinstance(todo, Lanes):
+                    todo.plan(1)
+                cmd = Porter(config, todo, done)
+                cmd.run()
+
+                self.assertTrue(todo.empty())
+                self.assertEqual(done.qsize(), 1)
+                self.assertNotEqual(done.get().status, 0)
+                self.assertFalse(cmd.breaker.closed)
+
+                todo.put(FileMsg(head=self.src, tail="", name="a", size=0))
+                self.assertFalse(cmd.ready())
+                self.assertTrue(todo.empty())
+
+    def testLanes(self):
+        """Test if Porter transfers files from all lanes.
+        """
+        lanes = Lanes([dict(name="small", max_size=100),
+                       dict(name="large", chunk_size=1)])
+        for i, size in enumerate([10, 10, 1000, 1000, 10]):
+            name = f"file{i}"
+            with open(os.path.join(self.src, name), "wb") as f:
+                f.write(os.urandom(size))
+            lanes.put(FileMsg(head=self.src, tail="", name=name, size=size))
+        lanes.plan(2)
+        config = dict(buffer=self.dst, staging=self.stg, transport="local")
+        cmd = Porter(config, lanes, self.done, chunk_size=4, concurrency=2)
+        cmd.run()
+
+        self.assertTrue(lanes.empty())
+        names = []
+        while not self.done.empty():
+            msg = self.done.get()
+            self.assertEqual(msg.status, 0)
+            names.extend(name for _, _, name in msg.files)
+        self.assertEqual(sorted(names), [f"file{i}" for i in range(5)])
+
+    def testCatalog(self):
+        """Test if Porter transfers files from a catalog in batches.
+        """
+        catalog = Catalog(dict(max_bytes=2000))
+        sub = tempfile.mkdtemp(dir=self.src)
+        for i in range(6):
+            tail = os.path.relpath(sub, start=self.src) if i % 2 else ""
+            name = f"file{i}"
+            with open(os.path.join(self.src, tail, name), "wb") as f:
+                f.write(os.urandom(1000))
+            catalog.put(FileMsg(head=self.src, tail=tail, name=name,
+                                size=1000, timestamp=float(i)))
+        config = dict(buffer=self.dst, staging=self.stg, transport="local")
+        cmd = Porter(config, catalog, self.done, chunk_size=10)
+        cmd.run()
+
+        self.assertTrue(catalog.empty())
+        names = []
+        while not self.done.empty():
+            msg = self.done.get()
+            self.assertEqual(msg.status, 0)
+            self.assertLessEqual(msg.size, 2000)
+            self.assertEqual(len({tail for _, tail, _ in msg.files}), 1)
+            names.extend(name for _, _, name in msg.files)
+        self.assertEqual(sorted(names), [f"file{i}" for i in range(6)])
+
+    def testDedup(self):
+        """Test if Porter copies files identical to delivered ones.
+        """
+        os.makedirs(os.path.join(self.dst, "old"))
+        with open(os.path.join(self.dst, "old", "orig"), "wb") as f:
+            f.write(b"same")
+        todo = queue.Queue()
+        for name, data in [("a", b"same"), ("b", b"other"), ("c", b"other")]:
+            with open(os.path.join(self.src, name), "wb") as f:
+                f.write(data)
+            todo.put(FileMsg(head=self.src, tail="new", name=name,
+                             size=len(data), checksum=data.decode()))
+
+        def lookup(checksums):
+            return {"same": ("old", "orig", 7)} if "same" in checksums else {}
+
+        config = dict(buffer=self.dst, staging=self.stg, transport="local",
+                      dedup=True)
+        cmd = Porter(config, todo, self.done)
+        cmd.dedup(lookup)
+
+        copy = os.path.join(self.dst, "new", "a")
+        orig = os.path.join(self.dst, "old", "orig")
+        self.assertTrue(os.path.samefile(copy, orig))
+        self.assertEqual(self.done.qsize(), 1)
+        msg = self.done.get()
+        self.assertEqual((msg.status, msg.size, msg.wire_size), (0, 4, 0))
+        self.assertEqual(msg.links, {"a": 7})
+        self.assertEqual(todo.qsize(), 1)
+        self.assertEqual(todo.get().name, "b")
+
+    def testDedupUnknownChecksum(self):
+        """Test if files without checksums are put back only once.
+        """
+        todo = Scheduler(dict())
+        todo.put(FileMsg(head=self.src, tail="", name="a", size=1,
+                         timestamp=0.0))
+        config = dict(buffer=self.dst, staging=self.stg, transport="local",
+                      dedup=True)
+        cmd = Porter(config, todo, self.done)
+        cmd.dedup(lambda checksums: {})
+        self.assertEqual([f.name for f in todo.drain()], ["a"])
+        self.assertEqual(todo._stats, {})
+        self.assertTrue(self.done.empty())
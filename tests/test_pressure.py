@@ -0,0 +1,76 @@
+# This file is part of dbb_buffer_mngr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from lsst.dbb.buffmngrs.handoff.pressure import Monitor
+
+
+class MonitorTestCase(unittest.TestCase):
+    """Test the monitor of the buffer pressure.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.buffer = os.path.join(self.dir, "buffer")
+        os.mkdir(self.buffer)
+        self.signal = os.path.join(self.dir, "pressure.json")
+        self.config = dict(elevated=0.5, critical=0.8,
+                           backlog_elevated=100, signal_file=self.signal)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testInvalidConfig(self):
+        """Test if Monitor complains about invalid settings.
+        """
+        config = dict(elevated=0.9, critical=0.8)
+        self.assertRaises(ValueError, Monitor, config, self.dir, self.dir)
+        config = dict(signal_file=os.path.join(self.buffer, "pressure.json"))
+        self.assertRaises(ValueError, Monitor, config, self.buffer, self.dir)
+
+    def testLevels(self):
+        """Test if the pressure level follows the usage and the backlog.
+        """
+        monitor = Monitor(self.config, self.buffer, self.dir)
+        target = "lsst.dbb.buffmngrs.handoff.pressure._usage"
+        cases = [(0.1, 0, "normal"), (0.6, 0, "elevated"),
+                 (0.9, 0, "critical"), (0.1, 100, "elevated")]
+        for usage, backlog, level in cases:
+            with patch(target, return_value=usage):
+                self.assertEqual(monitor.update(backlog), level)
+
+    def testSignal(self):
+        """Test if the pressure is published in the signal file.
+        """
+        monitor = Monitor(self.config, self.buffer, self.dir)
+        level = monitor.update(5)
+        with open(self.signal) as f:
+            status = json.load(f)
+        self.assertEqual(status["level"], level)
+        self.assertEqual(status["backlog"], 5)
+        self.assertEqual(sorted(os.listdir(self.dir)),
+                         ["buffer", "pressure.json"])
@@ -0,0 +1,91 @@
+# This file is part of dbb_buffer_mngr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import queue
+import shutil
+import tempfile
+import unittest
+from lsst.dbb.buffmngrs.handoff import Reaper
+from lsst.dbb.buffmngrs.handoff.messages import FileMsg
+
+
+class ReaperTestCase(unittest.TestCase):
+    """Test the command removing files from the holding area.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.inp = queue.Queue()
+        self.out = queue.Queue()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testInvalidConfig(self):
+        """Test if Reaper complains about an invalid configuration.
+        """
+        args = [dict(), self.inp, self.out]
+        self.assertRaises(ValueError, Reaper, *args)
+        config = dict(holding=self.dir,
+                      reaper=dict(high_watermark=0.5, low_watermark=0.6))
+        args = [config, self.inp, self.out]
+        self.assertRaises(ValueError, Reaper, *args)
+
+    def testQuota(self):
+        """Test if Reaper follows the watermarks.
+        """
+        config = dict(holding=self.dir,
+                      reaper=dict(high_watermark=0.9, low_watermark=0.7))
+        cmd = Reaper(config, self.inp, self.out)
+        for used, quota in [(80, 0), (95, 25), (80, 10), (70, 0), (80, 0)]:
+            cmd.usage = lambda: (used, 100)
+            self.assertEqual(cmd.quota(), quota)
+
+    def testEager(self):
+        """Test if eager Reaper starts removing files at the low watermark.
+        """
+        config = dict(holding=self.dir,
+                      reaper=dict(high_watermark=0.9, low_watermark=0.7))
+        cmd = Reaper(config, self.inp, self.out)
+        cmd.usage = lambda: (80, 100)
+        self.assertEqual(cmd.quota(), 0)
+        cmd.eager = True
+        self.assertEqual(cmd.quota(), 10)
+
+    def testRun(self):
+        """Test if Reaper removes files and reports them.
+        """
+        os.makedirs(os.path.join(self.dir, "a"))
+        for name in ("foo", "bar"):
+            with open(os.path.join(self.dir, "a", name), "w") as f:
+                f.write(name)
+            self.inp.put(FileMsg(tail="a", name=name))
+        self.inp.put(FileMsg(tail="a", name="missing"))
+
+        config = dict(holding=self.dir, reaper=dict())
+        cmd = Reaper(config, self.inp, self.out)
+        cmd.run()
+
+        self.assertEqual(os.listdir(os.path.join(self.dir, "a")), [])
+        self.assertEqual(self.out.qsize(), 3)
+        self.assertEqual(self.out.get().head, self.dir)
@@ -0,0 +1,196 @@
+# This file is part of dbb_buffer_mngr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import queue
+import unittest
+from lsst.dbb.buffmngrs.handoff.messages import FileMsg
+from lsst.dbb.buffmngrs.handoff.scheduling import Lanes, Scheduler
+from lsst.dbb.buffmngrs.handoff.utils import get_chunk
+
+
+class LanesTestCase(unittest.TestCase):
+    """Test dividing pending files into transfer lanes.
+    """
+
+    def setUp(self):
+        self.config = [
+            dict(name="large", max_size=None, share=1, chunk_size=1),
+            dict(name="small", max_size=1024, share=2, chunk_size=8),
+        ]
+
+    def testInvalidConfig(self):
+        """Test if Lanes complains about invalid specifications.
+        """
+        self.assertRaises(ValueError, Lanes, [])
+        config = [dict(name="a"), dict(name="b")]
+        self.assertRaises(ValueError, Lanes, config)
+        config = [dict(name="a", max_size=1), dict(name="a")]
+        self.assertRaises(ValueError, Lanes, config)
+
+    def testClassify(self):
+        """Test if files are assigned to lanes by their sizes.
+        """
+        lanes = Lanes(self.config)
+        self.assertEqual(lanes.names, ["small", "large"])
+        self.assertEqual(lanes.classify(1024), "small")
+        self.assertEqual(lanes.classify(1025), "large")
+        self.assertEqual(lanes.classify(None), "small")
+
+    def testPlan(self):
+        """Test if workers are divided between lanes according to shares.
+        """
+        lanes = Lanes(self.config)
+        self.assertEqual(lanes.plan(1), {"small": 1, "large": 0})
+        self.assertEqual(lanes.plan(2), {"small": 1, "large": 1})
+        self.assertEqual(lanes.plan(5), {"small": 3, "large": 2})
+        self.assertEqual([lanes.assign() for _ in range(5)],
+                         ["small"] * 3 + ["large"] * 2)
+
+    def testTake(self):
+        """Test if workers borrow files only from other lanes when idle.
+        """
+        lanes = Lanes(self.config)
+        for i in range(10):
+            lanes.put(FileMsg(name=f"small{i}", size=10))
+        for i in range(3):
+            lanes.put(FileMsg(name=f"large{i}", size=2048))
+        self.assertEqual(lanes.qsize(), 13)
+
+        files = lanes.take("large")
+        self.assertEqual([f.name for f in files], ["large0"])
+        files = lanes.take("small")
+        self.assertEqual(len(files), 8)
+        files = lanes.take("small")
+        self.assertEqual(len(files), 2)
+        files = lanes.take("small")
+        self.assertEqual([f.name for f in files], ["large1"])
+
+    def testQueue(self):
+        """Test if Lanes can be used in place of a queue.
+        """
+        lanes = Lanes(self.config)
+        lanes.put(FileMsg(name="large", size=2048))
+        lanes.put(FileMsg(name="small", size=10))
+        files = get_chunk(lanes, size=10)
+        self.assertEqual([f.name for f in files], ["small", "large"])
+        self.assertTrue(lanes.empty())
+        self.assertRaises(queue.Empty, lanes.get)
+
+    def testScheduler(self):
+        """Test if lanes can keep files in priority queues.
+        """
+        config = dict(rules=[dict(pattern="*.fits", priority=1)])
+        lanes = Lanes(self.config, factory=lambda: Scheduler(config))
+        lanes.put(FileMsg(tail="", name="a.txt", size=10, timestamp=0.0))
+        lanes.put(FileMsg(tail="", name="b.fits", size=10, timestamp=0.0))
+        files = lanes.take("small")
+        self.assertEqual([f.name for f in files], ["b.fits", "a.txt"])
+
+    def testDrain(self):
+        """Test if all files can be removed from lanes at once.
+        """
+        config = dict(rules=[dict(pattern="*.fits", priority=1)])
+        lanes = Lanes(self.config, factory=lambda: Scheduler(config))
+        lanes.put(FileMsg(tail="", name="a", size=2048, timestamp=0.0))
+        lanes.put(FileMsg(tail="", name="b", size=10, timestamp=0.0))
+        self.assertEqual([f.name for f in lanes.drain()], ["b", "a"])
+        self.assertTrue(lanes.empty())
+        self.assertEqual(lanes.queues["small"]._stats, {})
+
+
+class SchedulerTestCase(unittest.TestCase):
+    """Test the priority queue of pending files.
+    """
+
+    def setUp(self):
+        rules = [
+            dict(name="prompt", pattern="prompt/*", priority=2),
+            dict(name="urgent", pattern="urgent/*", deadline=600),
+        ]
+        self.config = dict(rules=rules, aging=60, horizon=3600)
+
+    def testPriority(self):
+        """Test if files matching rules are taken first.
+        """
+        sched = Scheduler(self.config)
+        sched.put(FileMsg(tail="raw", name="a", timestamp=1000.0))
+        sched.put(FileMsg(tail="prompt", name="b", timestamp=1060.0))
+        sched.put(FileMsg(tail="raw", name="c", timestamp=900.0))
+        self.assertEqual(sched.qsize(), 3)
+        files = get_chunk(sched, size=10)
+        self.assertEqual([f.name for f in files], ["c", "b", "a"])
+        self.assertTrue(sched.empty())
+        self.assertRaises(queue.Empty, sched.get)
+
+    def testAging(self):
+        """Test if old files are not starved by files with high priority.
+        """
+        sched = Scheduler(self.config)
+        sched.put(FileMsg(tail="prompt", name="new", timestamp=1000.0))
+        sched.put(FileMsg(tail="raw", name="old", timestamp=800.0))
+        files = get_chunk(sched, size=10)
+        self.assertEqual([f.name for f in files], ["old", "new"])
+
+    def testDeadline(self):
+        """Test if files approaching the deadline are taken first.
+        """
+        sched = Scheduler(self.config)
+        sched.put(FileMsg(tail="prompt", name="a", timestamp=200.0))
+        sched.put(FileMsg(tail="urgent", name="b", timestamp=3000.0))
+        name, key = sched.prioritize(FileMsg(tail="urgent", name="c",
+                                             timestamp=3000.0))
+        self.assertEqual((name, key), ("urgent", -0.0))
+        files = get_chunk(sched, size=10)
+        self.assertEqual([f.name for f in files], ["b", "a"])
+
+    def testOldestFirst(self):
+        """Test if rules can be ignored in favor of the oldest files.
+        """
+        sched = Scheduler(self.config)
+        sched.put(FileMsg(tail="prompt", name="new", timestamp=1000.0))
+        sched.put(FileMsg(tail="raw", name="old", timestamp=990.0))
+        sched.set_oldest_first(True)
+        sched.put(FileMsg(tail="prompt", name="newest", timestamp=1100.0))
+        files = get_chunk(sched, size=10)
+        self.assertEqual([f.name for f in files], ["old", "new", "newest"])
+
+    def testDrain(self):
+        """Test if draining the queue does not count files as served.
+        """
+        sched = Scheduler(self.config)
+        sched.put(FileMsg(tail="raw", name="a", timestamp=1000.0))
+        sched.put(FileMsg(tail="prompt", name="b", timestamp=1060.0))
+        self.assertEqual([f.name for f in sched.drain()], ["b", "a"])
+        self.assertTrue(sched.empty())
+        self.assertEqual(sched._stats, {})
+
+    def testReport(self):
+        """Test if waiting times are logged per class and then reset.
+        """
+        sched = Scheduler(self.config)
+        sched.put(FileMsg(tail="prompt", name="a", timestamp=0.0))
+        sched.get()
+        with self.assertLogs("lsst.dbb.buffmngrs.handoff.scheduling") as cm:
+            sched.report()
+        self.assertEqual(len(cm.output), 1)
+        self.assertIn("class 'prompt': 1 file(s)", cm.output[0])
+        self.assertEqual(sched._stats, {})
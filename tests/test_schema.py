@@ -0,0 +1,117 @@
+# This file is part of dbb_buffer_mngr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import shutil
+import tempfile
+import unittest
+from sqlalchemy import text
+from lsst.dbb.buffmngrs.handoff.declaratives import Base, MOVED, REGISTERED
+from lsst.dbb.buffmngrs.handoff.manager import Manager
+from lsst.dbb.buffmngrs.handoff.schema import check_schema, upgrade_schema
+from lsst.dbb.buffmngrs.handoff.utils import setup_db_conn
+
+
+OLD_SCHEMA = [
+    "CREATE TABLE files (id INTEGER PRIMARY KEY, relpath VARCHAR NOT NULL, "
+    "filename VARCHAR NOT NULL, checksum VARCHAR NOT NULL, "
+    "size_bytes INTEGER NOT NULL, created_on DATETIME NOT NULL, "
+    "held_on DATETIME, deleted_on DATETIME)",
+    "CREATE TABLE transfer_batches (id INTEGER PRIMARY KEY, "
+    "pre_start_time DATETIME NOT NULL, pre_duration DATETIME NOT NULL, "
+    "trans_start_time DATETIME NOT NULL, trans_duration DATETIME, "
+    "post_start_time DATETIME, post_duration DATETIME, size_bytes INTEGER, "
+    "rate_mbytes_per_sec NUMERIC, status INTEGER NOT NULL, err_msg TEXT)",
+    "CREATE TABLE file_transfer_attempts (files_id BIGINT, batch_id BIGINT)",
+    "INSERT INTO files VALUES (1, 'a', 'f1', 'x', 1, '2020-01-01 00:00:00', "
+    "'2020-01-02 00:00:00', NULL)",
+    "INSERT INTO files VALUES (2, 'a', 'f2', 'y', 1, '2020-01-01 00:00:00', "
+    "NULL, NULL)",
+]
+
+
+class SchemaTestCase(unittest.TestCase):
+    """Test detecting and upgrading outdated database schemas.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.database = dict(engine=f"sqlite:///{self.root}/test.db")
+        self.engine = setup_db_conn(self.database)
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.root)
+
+    def makeOldSchema(self):
+        with self.engine.begin() as conn:
+            for stmt in OLD_SCHEMA:
+                conn.execute(text(stmt))
+
+    def testCurrentSchema(self):
+        """Test if an up-to-date schema is reported as such.
+        """
+        Base.metadata.create_all(self.engine)
+        self.assertEqual(check_schema(self.engine), ([], [], []))
+        self.assertEqual(upgrade_schema(self.engine), [])
+
+    def testOldSchema(self):
+        """Test if missing columns and indexes are detected and added.
+        """
+        self.makeOldSchema()
+        tables, columns, indexes = check_schema(self.engine)
+        self.assertEqual(tables, [])
+        self.assertEqual(
+            {f"{c.table.name}.{c.name}" for c in columns},
+            {"files.state", "files.duplicate_of",
+             "transfer_batches.wire_size_bytes",
+             "transfer_batches.compression"})
+        self.assertEqual(len(indexes), 4)
+
+        changes = upgrade_schema(self.engine)
+        self.assertEqual(len(changes), 8)
+        self.assertEqual(check_schema(self.engine), ([], [], []))
+        with self.engine.connect() as conn:
+            rows = conn.execute(text("SELECT id, state FROM files "
+                                     "ORDER BY id")).fetchall()
+        self.assertEqual([tuple(r) for r in rows],
+                         [(1, MOVED), (2, REGISTERED)])
+
+    def testMissingTables(self):
+        """Test if upgrading a database without tables fails.
+        """
+        with self.assertLogs(level="CRITICAL"):
+            with self.assertRaises(ValueError):
+                upgrade_schema(self.engine)
+
+    def testManagerRefusesOldSchema(self):
+        """Test if the manager does not start with an outdated schema.
+        """
+        self.makeOldSchema()
+        config = dict(
+            database=self.database,
+            handoff=dict(buffer=self.root, holding=self.root),
+            endpoint=dict(buffer=self.root, staging=self.root,
+                          transport="local"),
+        )
+        with self.assertLogs(level="CRITICAL") as cm:
+            with self.assertRaises(RuntimeError):
+                Manager(config)
+        self.assertIn("files.state", cm.output[0])
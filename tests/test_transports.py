@@ -0,0 +1,309 @@
+# This file is part of dbb_buffer_mngr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import errno
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from lsst.dbb.buffmngrs.handoff.messages import TransferMsg
+from lsst.dbb.buffmngrs.handoff.transports import (
+    LocalTransport,
+    ShellTransport,
+    TarTransport,
+    get_transport
+)
+from lsst.dbb.buffmngrs.handoff.utils import get_checksum
+
+
+class GetTransportTestCase(unittest.TestCase):
+    """Test selecting the transport from the configuration.
+    """
+
+    def setUp(self):
+        commands = dict(remote="sh -c '{command}'",
+                        transfer="cp {file} {dest}")
+        self.config = dict(user="jdoe", host="localhost", buffer="/tmp",
+                           commands=commands)
+
+    def testDefault(self):
+        """Test if the shell transport is used by default.
+        """
+        transport = get_transport(self.config)
+        self.assertIsInstance(transport, ShellTransport)
+        self.assertFalse(transport.batch_mode)
+
+    def testByName(self):
+        """Test if a built-in transport can be selected by name.
+        """
+        self.config["transport"] = "local"
+        transport = get_transport(self.config)
+        self.assertIsInstance(transport, LocalTransport)
+
+    def testByPath(self):
+        """Test if a transport can be selected by its fully qualified name.
+        """
+        name = "lsst.dbb.buffmngrs.handoff.transports.LocalTransport"
+        self.config["transport"] = name
+        transport = get_transport(self.config)
+        self.assertIsInstance(transport, LocalTransport)
+
+    def testInvalid(self):
+        """Test if unknown or invalid transports are rejected.
+        """
+        for name in ("foo", "os.path", "lsst.dbb.buffmngrs.handoff.Porter"):
+            self.config["transport"] = name
+            self.assertRaises(ValueError, get_transport, self.config)
+
+
+class ShellTransportTestCase(unittest.TestCase):
+    """Test the transport delivering files with shell commands.
+    """
+
+    def setUp(self):
+        fd, self.src = tempfile.mkstemp()
+        os.write(fd, os.urandom(2 * 1024 * 1024))
+        os.close(fd)
+        self.dst = tempfile.mkdtemp()
+        commands = dict(remote="sh -c '{command}'",
+                        transfer="sh -c 'echo 0% >&2; sleep 30'")
+        self.config = dict(user="jdoe", host="localhost", buffer=self.dst,
+                           commands=commands)
+
+    def tearDown(self):
+        os.remove(self.src)
+        shutil.rmtree(self.dst)
+
+    def testInvalidConfig(self):
+        """Test if an invalid progress pattern is rejected.
+        """
+        self.config["progress"] = "("
+        self.assertRaises(ValueError, ShellTransport, self.config)
+
+    def testLimit(self):
+        """Test if the timeout grows with the amount of data to transfer.
+        """
+        transport = ShellTransport(self.config, timeout=10)
+        self.assertEqual(transport.limit(1024), 10)
+        self.config["min_rate"] = 1
+        transport = ShellTransport(self.config, timeout=10)
+        self.assertEqual(transport.limit(2 * 1024 * 1024), 12)
+
+    def testStall(self):
+        """Test if a transfer making no progress is terminated.
+        """
+        self.config.update(stall_timeout=0.5, progress=r"(\d+)%")
+        transport = ShellTransport(self.config)
+        start = time.time()
+        coro = transport.send_batch([self.src], self.dst)
+        status, *_ = asyncio.run(coro)
+        self.assertEqual(status, errno.ETIMEDOUT)
+        self.assertLess(time.time() - start, 10)
+
+
+class TarTransportTestCase(unittest.TestCase):
+    """Test the transport streaming files as tar archives.
+    """
+
+    def setUp(self):
+        self.src = tempfile.mkdtemp()
+        self.dst = tempfile.mkdtemp()
+        self.files = []
+        for i in range(5):
+            path = os.path.join(self.src, f"file{i}")
+            with open(path, "wb") as f:
+                f.write(os.urandom(1024 * (i + 1)))
+            self.files.append(path)
+        commands = dict(remote="sh -c '{command}'")
+        self.config = dict(user="jdoe", host="localhost", buffer=self.dst,
+                           commands=commands, transport="tar")
+
+    def tearDown(self):
+        shutil.rmtree(self.src)
+        shutil.rmtree(self.dst)
+
+    def testInvalidConfig(self):
+        """Test if unknown compression method is rejected.
+        """
+        self.config["compression"] = "foo"
+        self.assertRaises(ValueError, TarTransport, self.config)
+
+    def testSend(self):
+        """Test if files are streamed with and without compression.
+        """
+        for method in ("none", "gzip"):
+            self.config["compression"] = method
+            transport = get_transport(self.config)
+            msg = TransferMsg()
+            coro = transport.send_batch(self.files, self.dst, msg)
+            status, *_ = asyncio.run(coro)
+            self.assertEqual(status, 0)
+            self.assertIsNone(msg.failures)
+            for path in self.files:
+                name = os.path.basename(path)
+                copy = os.path.join(self.dst, name)
+                self.assertEqual(get_checksum(copy), get_checksum(path))
+                self.assertEqual(msg.checksums[name], get_checksum(path))
+
+    def testChecksumMismatch(self):
+        """Test if files not matching expected checksums are reported.
+        """
+        transport = get_transport(self.config)
+        names = [os.path.basename(path) for path in self.files]
+        expected = {name: get_checksum(path)
+                    for name, path in zip(names, self.files)}
+        expected[names[0]] = "foo"
+        msg = TransferMsg(checksums=expected)
+        coro = transport.send_batch(self.files, self.dst, msg)
+        status, *_ = asyncio.run(coro)
+        self.assertEqual(status, 0)
+        self.assertEqual(list(msg.failures), [names[0]])
+        self.assertIn("checksum mismatch", msg.failures[names[0]])
+        self.assertEqual(set(msg.checksums), set(names[1:]))
+
+        msg = TransferMsg(checksums={names[0]: "foo"})
+        coro = transport.send_batch(self.files[:1], self.dst, msg)
+        status, _, stderr, _ = asyncio.run(coro)
+        self.assertNotEqual(status, 0)
+        self.assertIn("checksum mismatch", stderr)
+
+    def testFailure(self):
+        """Test if a failed extraction is reported.
+        """
+        transport = get_transport(self.config)
+        dest = os.path.join(self.dst, "missing")
+        coro = transport.send_batch(self.files, dest, TransferMsg())
+        status, *_ = asyncio.run(coro)
+        self.assertNotEqual(status, 0)
+
+    def testAutoCompression(self):
+        """Test if compression is used only for compressible batches.
+        """
+        self.config["compression"] = "auto"
+        transport = get_transport(self.config)
+
+        msg = TransferMsg()
+        coro = transport.send_batch(self.files, self.dst, msg)
+        status, *_ = asyncio.run(coro)
+        self.assertEqual(status, 0)
+        self.assertEqual(msg.compression, "none")
+        self.assertGreater(msg.wire_size, 0)
+
+        path = os.path.join(self.src, "zeros")
+        with open(path, "wb") as f:
+            f.write(bytes(1024 * 1024))
+        msg = TransferMsg()
+        coro = transport.send_batch([path], self.dst, msg)
+        status, *_ = asyncio.run(coro)
+        self.assertEqual(status, 0)
+        self.assertNotEqual(msg.compression, "none")
+        self.assertLess(msg.wire_size, 1024 * 1024 // 10)
+        copy = os.path.join(self.dst, "zeros")
+        self.assertEqual(get_checksum(copy), get_checksum(path))
+
+    def testRanges(self):
+        """Test if a file can be assembled from byte ranges.
+        """
+        async def run(transport, src, dst, size):
+            await transport.allocate(dst, size)
+            half = size // 2
+            results = await asyncio.gather(
+                transport.send_range(src, dst, half, size - half),
+                transport.send_range(src, dst, 0, half))
+            return results, await transport.checksums([dst])
+
+        src = self.files[-1]
+        dst = os.path.join(self.dst, "assembled")
+        size = os.stat(src).st_size
+        transport = get_transport(self.config)
+        results, (status, sums, _, _) = \
+            asyncio.run(run(transport, src, dst, size))
+        self.assertTrue(all(result[0] == 0 for result in results))
+        self.assertEqual(status, 0)
+        self.assertEqual(sums[dst], get_checksum(src))
+
+    def testPartialCopy(self):
+        """Test if a partial copy of a file can be inspected.
+        """
+        src = self.files[-1]
+        dst = os.path.join(self.dst, "partial")
+        with open(src, "rb") as f:
+            data = f.read(3000)
+        with open(dst, "wb") as f:
+            f.write(data)
+        missing = os.path.join(self.dst, "missing")
+
+        transport = get_transport(self.config)
+        status, sizes, _, _ = asyncio.run(transport.sizes([dst, missing]))
+        self.assertEqual(status, 0)
+        self.assertEqual(sizes, {dst: 3000})
+
+        coro = transport.range_checksum(dst, 1000, 2000)
+        status, value, _, _ = asyncio.run(coro)
+        self.assertEqual(status, 0)
+        self.assertEqual(value, get_checksum(src, offset=1000, length=2000))
+
+    def testLink(self):
+        """Test if files are copied within the endpoint site.
+        """
+        transport = get_transport(self.config)
+        src = self.files[0]
+        dst = os.path.join(self.dst, "sub", "copy")
+        missing = os.path.join(self.dst, "missing")
+        pairs = [(src, dst), (src, src), (missing, missing + ".copy")]
+        status, linked, _, _ = asyncio.run(transport.link(pairs))
+        self.assertEqual(linked, {dst, src})
+        self.assertTrue(os.path.samefile(src, dst))
+
+    def testLinkChunks(self):
+        """Test if copies are made by several commands.
+        """
+        self.config["link_chunk_size"] = 2
+        for method in ("tar", "local"):
+            self.config["transport"] = method
+            transport = get_transport(self.config)
+            dsts = [os.path.join(self.dst, method, f"copy{i}")
+                    for i in range(5)]
+            pairs = [(self.files[0], dst) for dst in dsts]
+            if method == "local":
+                status, linked, _, _ = asyncio.run(transport.link(pairs))
+            else:
+                with mock.patch.object(transport, "remote",
+                                       wraps=transport.remote) as remote:
+                    status, linked, _, _ = asyncio.run(transport.link(pairs))
+                self.assertEqual(remote.call_count, 3)
+            self.assertEqual(status, 0)
+            self.assertEqual(linked, set(dsts))
+
+    def testInventory(self):
+        """Test if files in directories on the endpoint site are listed.
+        """
+        transport = get_transport(self.config)
+        missing = os.path.join(self.dst, "missing")
+        coro = transport.inventory([self.src, missing])
+        status, files, _, _ = asyncio.run(coro)
+        self.assertEqual(status, 0)
+        self.assertEqual(set(files), set(self.files))
+        for path in self.files:
+            self.assertEqual(files[path][0], os.stat(path).st_size)
@@ -21,6 +21,7 @@
 
 import getpass
 import os
+import queue
 import shutil
 import tempfile
 import unittest
@@ -79,3 +80,40 @@ class WiperTestCase(unittest.TestCase):
             for d in subs:
                 dirs.append(d)
         self.assertEqual(len(dirs), 1)
+
+    def testLocal(self):
+        """Test if Wiper removes empty directories on a local endpoint.
+        """
+        empty = tempfile.mkdtemp(dir=self.dir)
+        tempfile.mkdtemp(dir=empty)
+        full = tempfile.mkdtemp(dir=self.dir)
+        fd, fn = tempfile.mkstemp(dir=full)
+        os.close(fd)
+
+        config = dict(staging=self.dir, transport="local")
+        cmd = Wiper(config)
+        cmd.run()
+
+        dirs = []
+        for top, subs, files in os.walk(self.dir):
+            for d in subs:
+                dirs.append(os.path.join(top, d))
+        self.assertEqual(dirs, [full])
+
+    def testTargeted(self):
+        """Test if Wiper removes only directories used during transfers.
+        """
+        used = os.path.join(self.dir, "a", "b", "c")
+        os.makedirs(used)
+        other = tempfile.mkdtemp(dir=self.dir)
+
+        staged = queue.Queue()
+        config = dict(staging=self.dir, transport="local")
+        cmd = Wiper(config, staged=staged)
+        cmd.last_sweep = 0.0
+        cmd.sweep_interval = float("inf")
+        staged.put(used)
+        cmd.run()
+
+        self.assertTrue(staged.empty())
+        self.assertEqual(os.listdir(self.dir), [os.path.basename(other)])